@@ -12,6 +12,8 @@ import traceback
 #import re
 #import ast
 from fastapi.responses import JSONResponse
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
 from urllib.parse import quote
 
 # Internal packages
@@ -23,6 +25,24 @@ logging.getLogger("urllib3").setLevel(logging.CRITICAL)
 os.environ['no_proxy'] = '*'
 
 
+def create_session() -> requests.Session:
+    """
+    Keycloak等へのリクエストに使用するセッションを作成する
+    接続先毎にkeep-alive接続を保持し、全リクエストスレッドで共有する
+    複数の利用者のリクエストで共有するため、Cookieは保持しない
+    """
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_maxsize=settings.http_pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+session = create_session()
+
+
 def get_token_using_authorization_code(authorization_header_value: str, code: str, redirect_uri: str) -> requests.models.Response:
     """
     service.get_token_using_authorization_codeから呼び出し
@@ -42,7 +62,7 @@ def get_token_using_authorization_code(authorization_header_value: str, code: st
         'redirect_uri': redirect_uri
     }
 
-    return requests.post(url, headers=headers, data=data)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, data=data)
 
 
 def federate(authorization_header_value: str, realm_name: str, access_token: str) -> requests.models.Response:
@@ -66,7 +86,7 @@ def federate(authorization_header_value: str, realm_name: str, access_token: str
         'requested_token_type': 'urn:ietf:params:oauth:token-type:access_token'
     }
 
-    return requests.post(url, headers=headers, data=data)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, data=data)
 
 
 def obtain_pat(authorization_header_value: str, realm_name: str) -> requests.models.Response:
@@ -86,7 +106,7 @@ def obtain_pat(authorization_header_value: str, realm_name: str) -> requests.mod
         'grant_type': 'client_credentials',
     }
 
-    return requests.post(url, headers=headers, data=data)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, data=data)
 
 
 def get_resource_id(pat: str, realm_name: str, resource_url: str) -> requests.models.Response:
@@ -109,7 +129,7 @@ def get_resource_id(pat: str, realm_name: str, resource_url: str) -> requests.mo
         'Content-Type': 'application/x-www-form-urlencoded'
     }
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def confirm_authorization(access_token: str, realm_name: str, client_id: str, resource_id: str) -> requests.models.Response:
@@ -131,7 +151,7 @@ def confirm_authorization(access_token: str, realm_name: str, client_id: str, re
         'audience': client_id
     }
 
-    return requests.post(url, headers=headers, data=data)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, data=data)
 
 
 def evaluate_authorization(admin_access_token: str, realm_name: str, client_uuid: str, user_uuid: str, resource_url: str, resource_id: str) -> requests.models.Response:
@@ -159,7 +179,7 @@ def evaluate_authorization(admin_access_token: str, realm_name: str, client_uuid
         ]
     }
 
-    return requests.post(url, headers=headers, json=json)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, json=json)
 
 
 def get_admin_access_token() -> requests.models.Response:
@@ -179,7 +199,27 @@ def get_admin_access_token() -> requests.models.Response:
         'grant_type': 'password'
     }
 
-    return requests.post(url, headers=headers, data=data)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, data=data)
+
+
+def refresh_admin_access_token(refresh_token: str) -> requests.models.Response:
+    """
+    token_manager.AdminTokenManagerから呼び出し
+    リフレッシュトークンによりAdminのアクセストークンを更新
+    """
+    logger.debug(sys._getframe().f_code.co_name)
+
+    url = settings.authz_keycloak_url + '/realms/master/protocol/openid-connect/token'
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
+    data = {
+        'client_id': settings.admin_client_id,
+        'refresh_token': refresh_token,
+        'grant_type': 'refresh_token'
+    }
+
+    return session.post(url, timeout=settings.http_timeout, headers=headers, data=data)
 
 
 def get_clients(admin_access_token: str, realm_name: str) -> requests.models.Response:
@@ -195,7 +235,43 @@ def get_clients(admin_access_token: str, realm_name: str) -> requests.models.Res
     }
     url = settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients'
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
+
+
+def get_realms(admin_access_token: str) -> requests.models.Response:
+    """
+    service.warm_up_resource_id_cacheから呼び出し
+    レルム一覧を取得
+    """
+    logger.debug(sys._getframe().f_code.co_name)
+
+    headers = {
+        'Authorization': f'Bearer {admin_access_token}',
+        'Content-Type': 'application/json'
+    }
+    url = settings.authz_keycloak_url + '/admin/realms'
+
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
+
+
+def get_resources(admin_access_token: str, realm_name: str, client_uuid: str, first: int, max: int) -> requests.models.Response:
+    """
+    service.warm_up_resource_id_cacheから呼び出し
+    クライアントのリソース一覧を取得
+    """
+    logger.debug(sys._getframe().f_code.co_name)
+
+    headers = {
+        'Authorization': f'Bearer {admin_access_token}',
+        'Content-Type': 'application/json'
+    }
+    url = settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients/{client_uuid}/authz/resource-server/resource'
+    params = {
+        'first': first,
+        'max': max
+    }
+
+    return session.get(url, timeout=settings.http_timeout, headers=headers, params=params)
 
 
 def get_permissions(admin_access_token:str, realm_name: str, client_uuid: str) -> requests.models.Response:
@@ -212,7 +288,7 @@ def get_permissions(admin_access_token:str, realm_name: str, client_uuid: str) -
 
     params = {'max': 10000}
 
-    return requests.get(url, headers=headers, params=params)
+    return session.get(url, timeout=settings.http_timeout, headers=headers, params=params)
 
 
 def get_realm_settings(admin_access_token: str, realm_name: str) -> requests.models.Response:
@@ -229,7 +305,7 @@ def get_realm_settings(admin_access_token: str, realm_name: str) -> requests.mod
         'Content-Type': 'application/json'
     }
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def update_realm_settings(admin_access_token: str, realm_name: str, realm_settings: dict) -> requests.models.Response:
@@ -245,7 +321,7 @@ def update_realm_settings(admin_access_token: str, realm_name: str, realm_settin
     }
     url = settings.authz_keycloak_url + f'/admin/realms/{realm_name}'
 
-    return requests.put(url, headers=headers, json=realm_settings)
+    return session.put(url, timeout=settings.http_timeout, headers=headers, json=realm_settings)
 
 
 def get_client_secret(admin_access_token: str, realm_name: str, client_uuid: str) -> requests.models.Response:
@@ -260,7 +336,7 @@ def get_client_secret(admin_access_token: str, realm_name: str, client_uuid: str
     }
     url = settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients/{client_uuid}/client-secret'
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def get_idp_settings(access_token: str, realm_name: str) -> requests.models.Response:
@@ -275,7 +351,7 @@ def get_idp_settings(access_token: str, realm_name: str) -> requests.models.Resp
     }
     url = settings.authz_keycloak_url + f'/admin/realms/{realm_name}/identity-provider/instances/authentication'
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def update_idp_settings(admin_access_token: str, realm_name: str, idp_settings: dict) -> requests.models.Response:
@@ -292,7 +368,7 @@ def update_idp_settings(admin_access_token: str, realm_name: str, idp_settings:
 
     url  = settings.authz_keycloak_url + f'/admin/realms/{realm_name}/identity-provider/instances/authentication'
 
-    return requests.put(url, headers=headers, json=idp_settings)
+    return session.put(url, timeout=settings.http_timeout, headers=headers, json=idp_settings)
 
 
 def update_client_secret(admin_access_token: str, realm_name: str, client_uuid: str) -> requests.models.Response:
@@ -312,7 +388,7 @@ def update_client_secret(admin_access_token: str, realm_name: str, client_uuid:
     }
     url = settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients/{client_uuid}/client-secret'
 
-    return requests.post(url, headers=headers, json=json)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, json=json)
 
 
 def search_resources(admin_access_token:str, realm_name: str, client_uuid: str, resource_url:str) -> requests.models.Response:
@@ -333,7 +409,7 @@ def search_resources(admin_access_token:str, realm_name: str, client_uuid: str,
         'Content-Type': 'application/json'
     }
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def create_resource(admin_access_token:str, realm_name:str, client_uuid:str, resource_url:str) -> requests.models.Response:
@@ -353,7 +429,7 @@ def create_resource(admin_access_token:str, realm_name:str, client_uuid:str, res
         'uris': [resource_url]
     }
 
-    return requests.post(url, headers=headers, json=json)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, json=json)
 
 
 def search_policy(admin_access_token: str, realm_name: str, client_uuid: str, policy_type: str, policy_name: str) -> requests.models.Response:
@@ -369,7 +445,7 @@ def search_policy(admin_access_token: str, realm_name: str, client_uuid: str, po
         'Content-Type': 'application/json'
     }
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def create_regex_policy(admin_access_token: str, realm_name: str, client_uuid: str, policy_name: str, policy_claim: str, policy_pattern: str) -> requests.models.Response:
@@ -394,7 +470,7 @@ def create_regex_policy(admin_access_token: str, realm_name: str, client_uuid: s
         'logic': 'POSITIVE'
     }
 
-    return requests.post(url, headers=headers, json=json)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, json=json)
 
 
 def create_aggregated_policy(admin_access_token: str, realm_name: str, client_uuid: str, policy_uuid_list: list, aggregated_policy_name: str, policies: dict, contract: str) -> requests.models.Response:
@@ -418,7 +494,7 @@ def create_aggregated_policy(admin_access_token: str, realm_name: str, client_uu
         'logic': 'POSITIVE'
     }
 
-    return requests.post(url, headers=headers, json=json)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, json=json)
 
 
 def search_permission(admin_access_token: str, realm_name: str, client_uuid: str, resource_url: str) -> requests.models.Response:
@@ -441,7 +517,7 @@ def search_permission(admin_access_token: str, realm_name: str, client_uuid: str
         'Content-Type': 'application/json'
     }
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def get_policies_in_permission(admin_access_token: str, realm_name: str, client_uuid: str, permission_uuid: str) -> requests.models.Response:
@@ -462,7 +538,7 @@ def get_policies_in_permission(admin_access_token: str, realm_name: str, client_
         'Content-Type': 'application/json'
     }
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def get_policies_in_policy(admin_access_token: str, realm_name: str, client_uuid: str, policy_uuid: str) -> requests.models.Response:
@@ -479,7 +555,7 @@ def get_policies_in_policy(admin_access_token: str, realm_name: str, client_uuid
         'Content-Type': 'application/json'
     }
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def get_resource_in_permission(admin_access_token: str, realm_name: str, client_uuid: str, permission_uuid: str) -> requests.models.Response:
@@ -499,7 +575,7 @@ def get_resource_in_permission(admin_access_token: str, realm_name: str, client_
         'Content-Type': 'application/json'
     }
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def create_permission(admin_access_token: str, realm_name: str, client_uuid: str, resource_url: str, resource_uuid: str, policy_uuid: str) -> requests.models.Response:
@@ -523,7 +599,7 @@ def create_permission(admin_access_token: str, realm_name: str, client_uuid: str
         'decisionStrategy': 'AFFIRMATIVE' # 論理和
     }
 
-    return requests.post(url, headers=headers, json=json)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, json=json)
 
 
 def update_permission(admin_access_token: str, realm_name: str, client_uuid: str, permission_uuid: str, resource_url: str, resource_id: str, policies: list) -> requests.models.Response:
@@ -550,7 +626,7 @@ def update_permission(admin_access_token: str, realm_name: str, client_uuid: str
         'decisionStrategy': 'AFFIRMATIVE' # 論理和
     }
 
-    return requests.put(url, headers=headers, json=json)
+    return session.put(url, timeout=settings.http_timeout, headers=headers, json=json)
 
 
 def confirm_policy_dependency(admin_access_token:str, realm_name:str, client_uuid:str, policy_uuid:str) -> requests.models.Response:
@@ -567,7 +643,7 @@ def confirm_policy_dependency(admin_access_token:str, realm_name:str, client_uui
     }
     url =  settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients/{client_uuid}/authz/resource-server/policy/{policy_uuid}/dependentPolicies'
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def confirm_resource_dependency(admin_access_token:str, realm_name:str, client_uuid:str, resource_uuid:str) -> requests.models.Response:
@@ -584,7 +660,7 @@ def confirm_resource_dependency(admin_access_token:str, realm_name:str, client_u
     }
     url =  settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients/{client_uuid}/authz/resource-server/resource/{resource_uuid}/permissions'
 
-    return requests.get(url, headers=headers)
+    return session.get(url, timeout=settings.http_timeout, headers=headers)
 
 
 def delete_permission(admin_access_token:str, realm_name:str, client_uuid:str, permission_uuid:str) -> requests.models.Response:
@@ -599,7 +675,7 @@ def delete_permission(admin_access_token:str, realm_name:str, client_uuid:str, p
     }
     url =  settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients/{client_uuid}/authz/resource-server/policy/{permission_uuid}'
 
-    return requests.delete(url, headers=headers)
+    return session.delete(url, timeout=settings.http_timeout, headers=headers)
 
 
 def delete_policy(admin_access_token:str, realm_name:str, client_uuid:str, policy_uuid:str) -> requests.models.Response:
@@ -615,7 +691,7 @@ def delete_policy(admin_access_token:str, realm_name:str, client_uuid:str, polic
     }
     url =  settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients/{client_uuid}/authz/resource-server/policy/{policy_uuid}'
 
-    return requests.delete(url, headers=headers)
+    return session.delete(url, timeout=settings.http_timeout, headers=headers)
 
 
 def delete_resource(admin_access_token:str, realm_name:str, client_uuid:str, resource_uuid: str) -> requests.models.Response:
@@ -633,7 +709,7 @@ def delete_resource(admin_access_token:str, realm_name:str, client_uuid:str, res
     }
     url = settings.authz_keycloak_url + f'/admin/realms/{realm_name}/clients/{client_uuid}/authz/resource-server/resource/{resource_uuid}'
 
-    return requests.delete(url, headers=headers)
+    return session.delete(url, timeout=settings.http_timeout, headers=headers)
 
 
 def logout_from_keycloak(authorization_header_value: str, refresh_token: str) -> requests.models.Response:
@@ -652,4 +728,4 @@ def logout_from_keycloak(authorization_header_value: str, refresh_token: str) ->
         'refresh_token': refresh_token
     }
 
-    return requests.post(url, headers=headers, data=data)
+    return session.post(url, timeout=settings.http_timeout, headers=headers, data=data)
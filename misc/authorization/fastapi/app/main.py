@@ -12,17 +12,20 @@ from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from typing import List, Union
 import uvicorn
+import anyio
 import requests
 import base64
 import string
 import random
 import urllib
 import traceback
+import threading
 
 # Internal packages
 from settings import settings
 import schemas
 import service
+import keycloak
 
 # Logging settings
 logging.basicConfig(level=settings.log_level)
@@ -43,6 +46,24 @@ app = FastAPI(
     openapi_tags = settings.tags_metadata
 )
 
+@app.on_event('startup')
+async def configure_threadpool():
+    """
+    同期エンドポイント(def)はスレッドプールで実行されるため、同時に処理するリクエスト数をスレッド数で制限する
+    Keycloakへのリクエストはイベントループを停止させず、スレッドプール内で並行に処理される
+    """
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+
+
+@app.on_event('startup')
+async def warm_up_resource_id_cache():
+    """
+    認可確認で使用するリソースID対応表を作成する
+    Keycloakの起動を待たずにAPIを開始するため、バックグラウンドで作成する
+    """
+    threading.Thread(target=service.warm_up_resource_id_cache, daemon=True).start()
+
+
 @app.exception_handler(HTTPException)
 async def validation_exception_handler(request, exc):
     return JSONResponse(
@@ -73,7 +94,7 @@ def verify_access_token(authorization: str = Header(...)):
         'access_token': authorization[len('Bearer '):]
     }
     try:
-        response = requests.post(url, headers=headers, json=json)
+        response = keycloak.session.post(url, headers=headers, json=json, timeout=settings.http_timeout)
         response.raise_for_status()
         return
     except requests.exceptions.RequestException as e:
@@ -125,7 +146,7 @@ def get_cadde_user_id_from_token(token):
         403: {'model': schemas.ErrorResponse}
     }
 )
-async def federate(request: schemas.FederateRequest, authorization: str = Header(...)):
+def federate(request: schemas.FederateRequest, authorization: str = Header(...)):
     """
     # 認証機能連携(トークン交換)API\n
     提供者コネクタからアクセス\n
@@ -164,7 +185,7 @@ async def federate(request: schemas.FederateRequest, authorization: str = Header
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def confirm_authorization(request: schemas.ConfirmAuthorizationRequest, authorization: str = Header(...)):
+def confirm_authorization(request: schemas.ConfirmAuthorizationRequest, authorization: str = Header(...)):
     """
     # 認可確認API\n
     提供者コネクタからアクセス\n
@@ -208,7 +229,7 @@ async def confirm_authorization(request: schemas.ConfirmAuthorizationRequest, au
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def get_authorization_list(assigner: str):
+def get_authorization_list(assigner: str):
     """
     # 認可情報一覧取得API
     認可情報一覧を取得する\n
@@ -261,7 +282,7 @@ async def get_authorization_list(assigner: str):
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def get_authorization(assigner: str, target: str):
+def get_authorization(assigner: str, target: str):
     """
     # 認可情報取得API
     指定したリソースURLの認可情報を取得する\n
@@ -316,7 +337,7 @@ async def get_authorization(assigner: str, target: str):
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def register_authorization(request: schemas.RegisterAuthorizationRequest):
+def register_authorization(request: schemas.RegisterAuthorizationRequest):
     """
     # 認可情報登録API\n
     認可情報を登録する\n
@@ -385,7 +406,7 @@ async def register_authorization(request: schemas.RegisterAuthorizationRequest):
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def delete_authorization(request: schemas.DeleteAuthorizationRequest):
+def delete_authorization(request: schemas.DeleteAuthorizationRequest):
     """
     # 認可情報削除API
     認可情報を削除する\n
@@ -445,7 +466,7 @@ async def delete_authorization(request: schemas.DeleteAuthorizationRequest):
         401: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_get_authentication_request_url(request: schemas.GetAuthenticationRequestUrlRequest):
+def ui_get_authentication_request_url(request: schemas.GetAuthenticationRequestUrlRequest):
     """
     # 認証リクエストURL取得API\n
     認可画面からアクセス\n
@@ -504,7 +525,7 @@ async def ui_get_authentication_request_url(request: schemas.GetAuthenticationRe
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_get_token_using_authorization_code(request: schemas.GetTokenUsingAuthorizationCodeRequest):
+def ui_get_token_using_authorization_code(request: schemas.GetTokenUsingAuthorizationCodeRequest):
     """
     # 認可コードグラントによるトークン取得API\n
     認可機能画面からアクセス\n
@@ -522,9 +543,10 @@ async def ui_get_token_using_authorization_code(request: schemas.GetTokenUsingAu
 
     # state検証
     state = request.state
-    if state in auth_state_list:
+    # 複数のスレッドで同時に処理されるため、確認と削除を1回の操作で行う
+    try:
         auth_state_list.remove(state)
-    else:
+    except ValueError:
         return JSONResponse(
             status_code = 400,
             content = {'message': 'Request parameter error (state)'}
@@ -580,7 +602,7 @@ async def ui_get_token_using_authorization_code(request: schemas.GetTokenUsingAu
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_logout(request: Request):
+def ui_logout(request: Request):
     """
     # データ提供者用 ログアウトAPI
     """
@@ -611,7 +633,7 @@ async def ui_logout(request: Request):
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_get_settings(cadde_user_id: str = Depends(verify_session)):
+def ui_get_settings(cadde_user_id: str = Depends(verify_session)):
     """
     # データ提供者用 設定取得API\n
     認可機能画面からアクセス\n
@@ -639,7 +661,7 @@ async def ui_get_settings(cadde_user_id: str = Depends(verify_session)):
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_update_realm_settings(request: schemas.UpdateRealmSettingsRequest, cadde_user_id: str = Depends(verify_session)):
+def ui_update_realm_settings(request: schemas.UpdateRealmSettingsRequest, cadde_user_id: str = Depends(verify_session)):
     """
     # 提供者用 レルム設定更新API
     認可機能画面からアクセス\n
@@ -671,7 +693,7 @@ async def ui_update_realm_settings(request: schemas.UpdateRealmSettingsRequest,
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_update_idp_settings(request: schemas.UpdateIdpSettingsRequest, cadde_user_id: str = Depends(verify_session)):
+def ui_update_idp_settings(request: schemas.UpdateIdpSettingsRequest, cadde_user_id: str = Depends(verify_session)):
     """
     # データ提供者用 アイデンティティプロバイダー設定更新API
     認可機能画面からアクセス\n
@@ -710,7 +732,7 @@ async def ui_update_idp_settings(request: schemas.UpdateIdpSettingsRequest, cadd
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_update_client_secret(cadde_user_id: str = Depends(verify_session)):
+def ui_update_client_secret(cadde_user_id: str = Depends(verify_session)):
     """
     # データ提供者用 クライアントシークレット更新API
     認可機能画面からアクセス\n
@@ -739,7 +761,7 @@ async def ui_update_client_secret(cadde_user_id: str = Depends(verify_session)):
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_get_authorization_list(cadde_user_id: str = Depends(verify_session)):
+def ui_get_authorization_list(cadde_user_id: str = Depends(verify_session)):
     """
     # 認可情報一覧取得API
     認可情報一覧を取得する\n
@@ -788,7 +810,7 @@ async def ui_get_authorization_list(cadde_user_id: str = Depends(verify_session)
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_get_authorization(target: str, cadde_user_id: str = Depends(verify_session)):
+def ui_get_authorization(target: str, cadde_user_id: str = Depends(verify_session)):
     """
     # 認可情報取得API
     指定したリソースURLの認可情報を取得する\n
@@ -839,7 +861,7 @@ async def ui_get_authorization(target: str, cadde_user_id: str = Depends(verify_
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_register_authorization(request: schemas.RegisterAuthorizationRequest, cadde_user_id: str = Depends(verify_session)):
+def ui_register_authorization(request: schemas.RegisterAuthorizationRequest, cadde_user_id: str = Depends(verify_session)):
     """
     # 認可情報登録API\n
     認可情報を登録する\n
@@ -904,7 +926,7 @@ async def ui_register_authorization(request: schemas.RegisterAuthorizationReques
         500: {'model': schemas.ErrorResponse}
     }
 )
-async def ui_delete_authorization(request: schemas.DeleteAuthorizationRequest, cadde_user_id: str = Depends(verify_session)):
+def ui_delete_authorization(request: schemas.DeleteAuthorizationRequest, cadde_user_id: str = Depends(verify_session)):
     """
     # 認可情報削除API
     認可情報を削除する\n
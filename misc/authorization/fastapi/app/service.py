@@ -8,6 +8,7 @@ import logging
 import json
 import re
 import datetime
+import time
 import requests
 import base64
 from requests.models import Response
@@ -19,9 +20,20 @@ from urllib.parse import quote, unquote
 from settings import settings
 import main
 import keycloak
+import token_manager
 
 logger = logging.getLogger(__name__)
 
+# キー: {レルム名}
+# バリュー: ({クライアントUUID}, {保持期限})
+client_uuid_cache = {}
+
+# キー: {レルム名}
+# バリュー: {{URLエンコードしたリソースURL}: {リソースID}}
+# 起動時に全レルムのリソースから作成し、認可登録・削除時に更新する
+resource_id_cache = {}
+
+
 def federate(authorization_header_value: str, realm_name: str, access_token: str) -> dict:
     """
     main.federate_tokenから呼び出し
@@ -103,13 +115,10 @@ def confirm_authorization(authorization_header_value: str, realm_name: str, clie
     # PAT取得
     response = initialization_response()
     try:
-        response = keycloak.obtain_pat(authorization_header_value, realm_name)
-        response.raise_for_status()
-        if access_token := response.json().get('access_token', ''):
-            pat = access_token
-        else:
-            requests.exceptions.RequestException
+        pat = token_manager.pat_cache.get_pat(authorization_header_value, realm_name)
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -126,15 +135,20 @@ def confirm_authorization(authorization_header_value: str, realm_name: str, clie
     logger.debug(decoded_payload)
 
     # リソースID取得
+    # リソースID対応表にない場合はProtection APIで検索する
     response = initialization_response()
     try:
-        response = keycloak.get_resource_id(pat, realm_name, resource_url)
-        response.raise_for_status()
-        logger.info(response.json())
-        if response.json():
-            resource_id = response.json()[0]
+        if resource_id := resource_id_cache.get(realm_name, {}).get(resource_url, ''):
+            logger.debug("cached resource_id: {}".format(resource_id))
         else:
-            raise requests.exceptions.RequestException
+            response = keycloak.get_resource_id(pat, realm_name, resource_url)
+            response.raise_for_status()
+            logger.info(response.json())
+            if response.json():
+                resource_id = response.json()[0]
+                resource_id_cache.setdefault(realm_name, {})[resource_url] = resource_id
+            else:
+                raise requests.exceptions.RequestException
     except requests.exceptions.RequestException as e:
         result['status_code'] = 500 if response.status_code == 500 else 404
         text = response.text if response.text else response.code
@@ -151,6 +165,9 @@ def confirm_authorization(authorization_header_value: str, realm_name: str, clie
         response.raise_for_status()
         rpt = response.json()['access_token']
     except requests.exceptions.RequestException as e:
+        # 認可されなかった場合(403)以外は、リソースID対応表が古い可能性があるため破棄する
+        if response.status_code != 403:
+            resource_id_cache.get(realm_name, {}).pop(resource_url, None)
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -175,13 +192,10 @@ def confirm_authorization(authorization_header_value: str, realm_name: str, clie
     # アドミンのアクセストークン取得(クライアント一覧取得、評価実行のため)
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        if access_token := response.json().get('access_token', ''):
-            admin_access_token = access_token
-        else:
-            raise requests.exceptions.RequestException
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -282,10 +296,10 @@ def get_authorization_list(realm_name: str) -> dict:
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -379,10 +393,10 @@ def get_authorization(realm_name: str, resource_url: str) -> dict:
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -475,10 +489,10 @@ def register_authorization(realm_name: str, resource_url: str, policies: dict, c
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -531,6 +545,9 @@ def register_authorization(realm_name: str, resource_url: str, policies: dict, c
             }
             return result
 
+    # リソースID対応表を更新
+    resource_id_cache.setdefault(realm_name, {})[resource_url] = resource_uuid
+
     regex_policy_uuid_list = []
     for policy_claim, policy_pattern in policies.items():
         if policy_pattern is not None:
@@ -736,10 +753,10 @@ def delete_authorization_by_trade_id(realm_name: str, resource_url: str, trade_i
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -853,6 +870,9 @@ def delete_authorization_by_trade_id(realm_name: str, resource_url: str, trade_i
                 'message': 'delete permissions error',
                 'detail': f'{response.status_code}: {text}'
             }
+        finally:
+            # リソースID対応表から削除
+            resource_id_cache.get(realm_name, {}).pop(resource_url, None)
     # Aggregatedポリシーが残っている場合はパーミッションを更新
     else:
         response = initialization_response()
@@ -893,10 +913,10 @@ def delete_authorization_by_policies(realm_name: str, resource_url: str, policie
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         #result['status_code'] = 403
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
@@ -1020,6 +1040,9 @@ def delete_authorization_by_policies(realm_name: str, resource_url: str, policie
                 'message': 'delete permissions error',
                 'detail': f'{response.status_code}: {text}'
             }
+        finally:
+            # リソースID対応表から削除
+            resource_id_cache.get(realm_name, {}).pop(resource_url, None)
     # Aggregatedポリシーが残っている場合はパーミッションを更新
     else:
         response = initialization_response()
@@ -1115,7 +1138,7 @@ def logout_from_keycloak(session_id: str) -> dict:
         return result
 
     # サーバが保存しているトークン削除
-    deleted_tokens = main.token_dict.pop(session_id)
+    deleted_tokens = main.token_dict.pop(session_id, None)
     logger.debug("deleted_tokens: {}".format(deleted_tokens))
 
     return result
@@ -1139,10 +1162,10 @@ def get_settings(realm_name: str) -> dict:
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -1238,10 +1261,10 @@ def update_realm_settings(realm_name: str, realm_settings_request: dict) -> dict
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -1296,10 +1319,10 @@ def update_idp_settings(realm_name: str, idp_settings_request: dict) -> dict:
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -1356,10 +1379,10 @@ def update_client_secret(realm_name: str) -> dict:
     # アドミントークン取得
     response = initialization_response()
     try:
-        response = keycloak.get_admin_access_token()
-        response.raise_for_status()
-        admin_access_token = response.json()['access_token']
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
     except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            response = e.response
         result['status_code'] = 500 if response.status_code == 500 else 403
         text = response.text if response.text else response.code
         result['content'] = {
@@ -1380,6 +1403,7 @@ def update_client_secret(realm_name: str) -> dict:
     try:
         response = keycloak.update_client_secret(admin_access_token, realm_name, client_uuid)
         response.raise_for_status()
+        token_manager.pat_cache.invalidate(realm_name)
     except requests.exceptions.RequestException as e:
         result['status_code'] = 500
         text = response.text if response.text else response.code
@@ -1395,10 +1419,15 @@ def get_client_uuid(admin_access_token, realm_name) -> Union[dict, str]:
     """
     本ファイル内の関数から呼ばれるサブルーチン
     クライアントのUUIDを取得する
+    取得したUUIDはレルム毎にclient_uuid_cache_ttl秒の間保持する
     """
 
     logger.debug(sys._getframe().f_code.co_name)
 
+    client_uuid, expires_at = client_uuid_cache.get(realm_name, ('', 0))
+    if client_uuid and time.monotonic() < expires_at:
+        return client_uuid
+
     response = initialization_response()
     try:
         response = keycloak.get_clients(admin_access_token, realm_name)
@@ -1410,6 +1439,7 @@ def get_client_uuid(admin_access_token, realm_name) -> Union[dict, str]:
         # 設定ファイル記載のクライアントIDがあるかを確認
         for client in clients:
             if client['clientId'] == settings.provider_connector_id:
+                client_uuid_cache[realm_name] = (client['id'], time.monotonic() + settings.client_uuid_cache_ttl)
                 return client['id'] # Client UUID
 
         raise requests.exceptions.RequestException
@@ -1425,6 +1455,53 @@ def get_client_uuid(admin_access_token, realm_name) -> Union[dict, str]:
         return result
 
 
+def warm_up_resource_id_cache() -> None:
+    """
+    main.warm_up_resource_id_cacheから呼び出し
+    全レルムのリソースを取得し、リソースID対応表を作成する
+    提供者コネクタのクライアントがないレルム、取得に失敗したレルムはconfirm_authorization時に検索する
+    """
+
+    logger.debug(sys._getframe().f_code.co_name)
+
+    try:
+        admin_access_token = token_manager.admin_token_manager.get_access_token()
+        response = keycloak.get_realms(admin_access_token)
+        response.raise_for_status()
+        realm_names = [realm['realm'] for realm in response.json() if realm['realm'] != 'master']
+    except requests.exceptions.RequestException as e:
+        logger.warning(f'warm up resource id cache error: {e}')
+        return
+
+    for realm_name in realm_names:
+        get_client_uuid_result = get_client_uuid(admin_access_token, realm_name)
+        if isinstance(get_client_uuid_result, dict):
+            continue
+        client_uuid = get_client_uuid_result
+
+        resource_ids = {}
+        first = 0
+        try:
+            while True:
+                response = keycloak.get_resources(admin_access_token, realm_name, client_uuid, first, settings.resource_id_cache_page_size)
+                response.raise_for_status()
+                resources = response.json()
+                for resource in resources:
+                    for uri in resource.get('uris', []):
+                        resource_ids[uri] = resource['_id']
+                if len(resources) < settings.resource_id_cache_page_size:
+                    break
+                first += len(resources)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f'warm up resource id cache error: {realm_name}: {e}')
+            continue
+
+        # 作成中に認可登録された分を残す
+        resource_ids.update(resource_id_cache.get(realm_name, {}))
+        resource_id_cache[realm_name] = resource_ids
+        logger.info(f'resource id cache: {realm_name}: {len(resource_ids)}')
+
+
 def delete_permission(admin_access_token:str, realm_name:str, client_uuid:str, permission_uuid:str, permission_name:str, resource_uuid:str) -> None:
     """
     本ファイル内の関数から呼ばれるサブルーチン
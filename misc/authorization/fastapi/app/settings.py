@@ -52,6 +52,30 @@ class Settings():
     admin_client_id = 'admin-cli'
     ui_redirect_path = 'load/?'
 
+    # 同期エンドポイントを実行するスレッドプールのスレッド数(同時に処理するリクエスト数)
+    threadpool_size = 40
+    # Keycloak等への接続先毎に保持するkeep-alive接続の最大数
+    http_pool_maxsize = 40
+    # Keycloak等へのリクエストのタイムアウト(接続, 読み込み)(秒)
+    http_timeout = (10, 60)
+    # Adminのアクセストークンの保持設定(秒)
+    # 有効期限までの残り時間がexpiry_margin未満のトークンは使用せず、refresh_marginになった時点でバックグラウンドで更新する
+    # 更新に失敗した場合はretry_interval後に再試行し、idle_timeoutの間使用されなかった場合はバックグラウンドでの更新を止める
+    admin_token_expiry_margin = 5
+    admin_token_refresh_margin = 20
+    admin_token_retry_interval = 5
+    admin_token_idle_timeout = 600
+    # PATの保持設定 有効期限までの残り時間がexpiry_margin(秒)未満のPATは使用しない
+    # 保持時間はcache_ttl(秒)までとし、Keycloakの管理画面でクライアントシークレットを変更した場合に
+    # 古いシークレットで認可確認できる期間をこの時間までに制限する(PATの有効期限よりも十分短くすること)
+    pat_expiry_margin = 5
+    pat_cache_ttl = 30
+    pat_cache_max_size = 1000
+    # クライアントUUIDの保持時間(秒)
+    client_uuid_cache_ttl = 300
+    # 起動時にリソースID対応表を作成する際の1回あたりのリソース取得件数
+    resource_id_cache_page_size = 1000
+
     # デバッグ用設定項目
     public_api_docs_enabled = True # OpenAPIドキュメント表示/非表示
     private_api_docs_enabled = False # OpenAPIドキュメント表示/非表示
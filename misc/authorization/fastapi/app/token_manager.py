@@ -0,0 +1,171 @@
+# token_manager.py
+# Keycloakから取得したトークンの保持処理
+
+# External packages
+import hashlib
+import logging
+import threading
+import time
+import requests
+
+# Internal packages
+from settings import settings
+import keycloak
+
+logger = logging.getLogger(__name__)
+
+
+class AdminTokenManager():
+    """
+    Adminのアクセストークンとリフレッシュトークンを保持し、全リクエストスレッドに返却する
+    有効期限の前にバックグラウンドでリフレッシュトークンにより更新し、
+    リフレッシュトークンが使用できない場合はパスワードグラントで取得し直す
+    一定時間使用されなかった場合はバックグラウンドでの更新を止め、次回の使用時に取得する
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.access_token = ''
+        self.access_token_expires_at = 0
+        self.refresh_token = ''
+        self.refresh_token_expires_at = 0
+        self.last_used_at = 0
+        self.refresher = None
+
+    def get_access_token(self) -> str:
+        """
+        有効なAdminのアクセストークンを返却する
+        保持しているトークンの有効期限が近い場合は、呼び出し元のスレッドで取得する
+        取得に失敗した場合はrequests.exceptions.RequestExceptionを送出する(responseにKeycloakのレスポンスを設定)
+        """
+        self.last_used_at = time.monotonic()
+
+        access_token, expires_at = self.access_token, self.access_token_expires_at
+        if access_token and time.monotonic() + settings.admin_token_expiry_margin < expires_at:
+            return access_token
+
+        with self.lock:
+            if not (self.access_token and time.monotonic() + settings.admin_token_expiry_margin < self.access_token_expires_at):
+                self.update()
+            access_token = self.access_token
+            self.start_refresher()
+
+        return access_token
+
+    def update(self) -> None:
+        """
+        トークンを取得し直す 呼び出し元でlockを取得していること
+        """
+        logger.debug('update admin access token')
+
+        response = None
+        if self.refresh_token and time.monotonic() + settings.admin_token_expiry_margin < self.refresh_token_expires_at:
+            try:
+                response = keycloak.refresh_admin_access_token(self.refresh_token)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logger.warning(f'refresh admin access token error: {e}')
+                response = None
+
+        if response is None:
+            response = keycloak.get_admin_access_token()
+            response.raise_for_status()
+
+        tokens = response.json()
+        if not tokens.get('access_token', ''):
+            raise requests.exceptions.RequestException('admin access token not found', response=response)
+
+        now = time.monotonic()
+        self.access_token = tokens['access_token']
+        self.access_token_expires_at = now + tokens.get('expires_in', 0)
+        self.refresh_token = tokens.get('refresh_token', '')
+        self.refresh_token_expires_at = now + tokens.get('refresh_expires_in', 0)
+
+    def start_refresher(self) -> None:
+        """
+        バックグラウンドでの更新を開始する 呼び出し元でlockを取得していること
+        """
+        if self.refresher is not None and self.refresher.is_alive():
+            return
+
+        self.refresher = threading.Thread(target=self.refresh_in_background, name='admin_token_refresher', daemon=True)
+        self.refresher.start()
+
+    def refresh_in_background(self) -> None:
+        """
+        有効期限のadmin_token_refresh_margin秒前にトークンを更新する
+        失敗した場合はadmin_token_retry_interval秒後に再試行する
+        admin_token_idle_timeout秒の間使用されなかった場合は終了する
+        """
+        while True:
+            wait_time = self.access_token_expires_at - settings.admin_token_refresh_margin - time.monotonic()
+            time.sleep(max(wait_time, settings.admin_token_retry_interval))
+
+            with self.lock:
+                if settings.admin_token_idle_timeout < time.monotonic() - self.last_used_at:
+                    logger.debug('stop refreshing admin access token')
+                    self.refresher = None
+                    return
+
+                # 呼び出し元のスレッドで更新済みの場合
+                if time.monotonic() + settings.admin_token_refresh_margin < self.access_token_expires_at:
+                    continue
+
+                try:
+                    self.update()
+                except Exception as e:
+                    logger.warning(f'update admin access token error: {e}')
+
+
+class PatCache():
+    """
+    Protection API Token(PAT)を(レルム, クライアント認証情報)毎に保持する
+    クライアント認証情報はハッシュ値をキーとし、取得に成功したPATのみ保持する
+    PATの取得は認可確認におけるクライアント認証情報の唯一の確認であるため、
+    Keycloakの管理画面でクライアントシークレットを変更した場合も古いシークレットで認可確認できてしまう期間を
+    pat_cache_ttl秒(PATの有効期限の方が短い場合は有効期限)までに制限する
+    update_client_secretで変更した場合は即時に破棄する
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # {(レルム名, クライアント認証情報のハッシュ値): (PAT, 有効期限)}
+        self.pats = {}
+
+    def get_pat(self, authorization_header_value: str, realm_name: str) -> str:
+        """
+        有効なPATを返却する 保持していない場合、有効期限が近い場合はKeycloakから取得する
+        取得に失敗した場合はrequests.exceptions.RequestExceptionを送出する(responseにKeycloakのレスポンスを設定)
+        """
+        key = (realm_name, hashlib.sha256(authorization_header_value.encode()).hexdigest())
+
+        pat, expires_at = self.pats.get(key, ('', 0))
+        if pat and time.monotonic() + settings.pat_expiry_margin < expires_at:
+            return pat
+
+        response = keycloak.obtain_pat(authorization_header_value, realm_name)
+        response.raise_for_status()
+        tokens = response.json()
+        if not tokens.get('access_token', ''):
+            raise requests.exceptions.RequestException('pat not found', response=response)
+
+        now = time.monotonic()
+        with self.lock:
+            if settings.pat_cache_max_size <= len(self.pats):
+                self.pats = {k: v for k, v in self.pats.items() if now < v[1]}
+                if settings.pat_cache_max_size <= len(self.pats):
+                    self.pats.clear()
+            self.pats[key] = (tokens['access_token'], now + min(tokens.get('expires_in', 0), settings.pat_cache_ttl))
+
+        return tokens['access_token']
+
+    def invalidate(self, realm_name: str) -> None:
+        """
+        レルムのPATを破棄する(クライアントシークレット更新時)
+        """
+        with self.lock:
+            self.pats = {k: v for k, v in self.pats.items() if k[0] != realm_name}
+
+
+admin_token_manager = AdminTokenManager()
+pat_cache = PatCache()
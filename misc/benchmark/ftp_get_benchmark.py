@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+FTPのファイル取得(ExternalInterface.ftp_get)の1リクエストあたりの処理時間を、
+変更前(timeout_decoratorによる子プロセスでの取得)と変更後(プロセス内での制限時間管理、接続の再利用)で比較する。
+
+ローカルに起動したFTPサーバ(pyftpdlib)から、小さいファイルと大きいファイルをそれぞれ取得する。
+変更前の処理は、変更前のExternalInterface.ftp_getと同じ処理をこのスクリプト内に再現して計測する。
+
+実行方法(リポジトリのルートで実行):
+    pip install timeout-decorator pyftpdlib requests
+    python misc/benchmark/ftp_get_benchmark.py
+
+計測結果の例(Python 3.11.7、Linux、1 CPU、ローカルFTPサーバ、各50回の中央値 / 90パーセンタイル(ms)):
+    file                before median/p90(ms)         after(new conn.)      after(reused conn.)
+    small (1 KiB)               12.76 / 16.12              1.10 / 1.29              0.90 / 1.06
+    large (32 MiB)            213.68 / 235.77            44.95 / 51.22            50.06 / 57.24
+    変更前は子プロセスの起動と、取得したファイルの子プロセスから親プロセスへの転送が1リクエスト毎に発生する。
+    接続の再利用による短縮はローカルのFTPサーバでは小さく、ログインに時間がかかるサーバほど大きくなる。
+"""
+import argparse
+import ftplib
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import FTPServer
+from timeout_decorator import timeout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'common'))
+from swagger_server.utilities.external_interface import ExternalInterface  # noqa: E402
+
+__FTP_USER = 'benchmark'
+__FTP_PASSWORD = 'benchmark'
+__FTP_TIMEOUT = 10
+
+# (表示名, ファイル名, サイズ(バイト))
+__FILES = [
+    ('small (1 KiB)', 'small.bin', 1024),
+    ('large (32 MiB)', 'large.bin', 32 * 1024 * 1024),
+]
+
+
+class FTP_IgnoreHost(ftplib.FTP):
+    def makepasv(self):
+        _, port = super().makepasv()
+        return self.host, port
+
+
+@timeout(60, use_signals=False)
+def ftp_get_before(parsed_resource_url: dict, ftp_id: str, ftp_pass: str) -> BytesIO:
+    """
+    変更前のExternalInterface.ftp_getと同じ処理
+    """
+
+    file_byte = BytesIO()
+
+    with FTP_IgnoreHost() as ftp:
+        ftp.connect(
+            parsed_resource_url['access_point'],
+            parsed_resource_url['port_no'],
+            __FTP_TIMEOUT)
+        ftp.login(user=ftp_id, passwd=ftp_pass)
+
+        if len(parsed_resource_url['directory']) > 0:
+            ftp.cwd(parsed_resource_url['directory'])
+        ftp.retrbinary(
+            'RETR ' + parsed_resource_url['file_name'],
+            file_byte.write)
+
+    file_byte.seek(0)
+
+    return file_byte
+
+
+def ftp_get_after(parsed_resource_url: dict, ftp_id: str, ftp_pass: str) -> BytesIO:
+    """
+    変更後のExternalInterface.ftp_get(ログイン済みの接続を再利用する)
+    """
+
+    return ExternalInterface().ftp_get(parsed_resource_url, ftp_id, ftp_pass)
+
+
+def ftp_get_after_new_connection(parsed_resource_url: dict, ftp_id: str, ftp_pass: str) -> BytesIO:
+    """
+    変更後のExternalInterface.ftp_get(毎回接続、ログインする)
+    制限時間管理の変更のみの効果を計測するため、コネクションプールの待機中の接続を閉じてから取得する。
+    """
+
+    ftp_pool = ExternalInterface._ExternalInterface__ftp_pool
+    for idle_list in ftp_pool.values():
+        for ftp, _ in idle_list:
+            ftp.close()
+    ftp_pool.clear()
+
+    return ExternalInterface().ftp_get(parsed_resource_url, ftp_id, ftp_pass)
+
+
+def start_ftp_server(directory: str) -> int:
+    """
+    ローカルにFTPサーバを起動し、ポート番号を返却する。
+    """
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(__FTP_USER, __FTP_PASSWORD, directory, perm='elr')
+    handler = FTPHandler
+    handler.authorizer = authorizer
+    server = FTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server.socket.getsockname()[1]
+
+
+def measure(ftp_get, parsed_resource_url: dict, size: int, iterations: int) -> list:
+    """
+    ftp_getをiterations回実行し、1回毎の処理時間(ミリ秒)を返却する。
+    """
+
+    # 初回の接続確立、インポート等を計測から除く
+    ftp_get(parsed_resource_url, __FTP_USER, __FTP_PASSWORD)
+
+    elapsed = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        data = ftp_get(parsed_resource_url, __FTP_USER, __FTP_PASSWORD)
+        elapsed.append((time.perf_counter() - start) * 1000)
+        if len(data.getbuffer()) != size:
+            raise RuntimeError('取得したファイルのサイズが一致しません。')
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50, help='ファイル毎の計測回数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for _, file_name, size in __FILES:
+            with open(os.path.join(directory, file_name), 'wb') as f:
+                f.write(os.urandom(size))
+
+        port = start_ftp_server(directory)
+
+        print('{:<16} {:>24} {:>24} {:>24}'.format(
+            'file', 'before median/p90(ms)', 'after(new conn.)', 'after(reused conn.)'))
+        for label, file_name, size in __FILES:
+            parsed_resource_url = {
+                'access_point': '127.0.0.1',
+                'port_no': port,
+                'directory': '',
+                'file_name': file_name
+            }
+            results = []
+            for ftp_get in (ftp_get_before, ftp_get_after_new_connection, ftp_get_after):
+                elapsed = sorted(measure(ftp_get, parsed_resource_url, size, args.iterations))
+                results.append('{:.2f} / {:.2f}'.format(
+                    statistics.median(elapsed), elapsed[int(len(elapsed) * 0.9) - 1]))
+            print('{:<16} {:>24} {:>24} {:>24}'.format(label, *results))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,13 @@
 
 from logging import getLogger
 from io import BytesIO
-from timeout_decorator import TimeoutError
+from typing import Union
 
 from swagger_server.utilities.message_map import get_message
 from swagger_server.utilities.cadde_exception import CaddeException
-from swagger_server.utilities.external_interface import ExternalInterface
+from swagger_server.utilities.external_interface import ExternalInterface, ChunkStream, FtpTransferTimeoutError
 from swagger_server.utilities.internal_interface import InternalInterface
+from swagger_server.utilities.origin_cache import OriginCache
 
 logger = getLogger(__name__)
 
@@ -24,22 +25,29 @@ __URL_SPLIT_CHR = '/'
 __ACCESS_POINT_SPLIT_CHR = ':'
 __FTP_DEFAULT_PORT = 21
 
+# オリジンキャッシュ(ftp.jsonのorigin_cache)のキャッシュ用ディレクトリのデフォルト値
+__ORIGIN_CACHE_DEFAULT_DIRECTORY = '/tmp/cadde_origin_cache/ftp'
+
 
 def provide_data_ftp(
         resource_url: str,
         file_get_interface: ExternalInterface = ExternalInterface(),
-        config_get_interface: InternalInterface = InternalInterface()) -> BytesIO:
+        config_get_interface: InternalInterface = InternalInterface(),
+        stream: bool = False) -> Union[BytesIO, ChunkStream]:
     """
     FTPサーバからファイルを取得して返却する。
     ※リソースURLに対して、ファイル取得を行う。接続方法はFTPのみとし、SFTPを用いた認証は行わない。
+    ftp.jsonでオリジンキャッシュが有効な場合は、キャッシュの有効期間内であればキャッシュから返却し、
+    有効期間を過ぎている場合はMDTM、SIZEコマンドで取得した最終更新日時とサイズでFTPサーバに更新を確認する。
 
     Args:
         resource_url str : ファイル取得を行うリソースURL
         file_get_interface ExternalInterface : ファイル取得処理を行うインタフェース
         config_get_interface InternalInterface : コンフィグ情報取得処理を行うインタフェース
+        stream bool : Trueの場合、ファイル全体を読み込まずチャンク単位で返却する
 
     Returns:
-        BytesIO :取得データ
+        BytesIO :取得データ streamがTrueの場合はChunkStream
 
     Raises:
         Cadde_excption: リソースURLが取得できない場合 エラーコード: 000301002E
@@ -63,6 +71,7 @@ def provide_data_ftp(
     except Exception:
         raise CaddeException('000301003E')
 
+    config = {}
     ftp_auth_domain = []
     try:
         config = config_get_interface.config_read(__CONFIG_FILE_PATH)
@@ -92,11 +101,51 @@ def provide_data_ftp(
 
     parsed_resource_url = __url_analysis(resource_url)
 
+    # オリジンキャッシュの確認
+    origin_cache = OriginCache.from_config(
+        config, __ORIGIN_CACHE_DEFAULT_DIRECTORY)
+    cache_key = None
+    cache_entry = None
+    if origin_cache is not None:
+        cache_ttl = origin_cache.get_ttl(resource_url)
+        if cache_ttl is not None:
+            cache_key = OriginCache.make_key('ftp', resource_url, ftp_id)
+            cache_entry = origin_cache.lookup(cache_key)
+
+    if cache_entry is not None and origin_cache.is_fresh(cache_entry, cache_ttl):
+        cached_data = origin_cache.open(cache_key)
+        if cached_data is not None:
+            return __to_return_data(cached_data, stream)
+
     response = None
     try:
-        response = file_get_interface.ftp_get(
-            parsed_resource_url, ftp_id, ftp_pass)
-    except TimeoutError:
+        if cache_key is not None:
+            # 最終更新日時とサイズが取得でき、キャッシュ時から変わっていない場合はキャッシュから返却する
+            validators = file_get_interface.ftp_get_validators(
+                parsed_resource_url, ftp_id, ftp_pass)
+            if cache_entry is not None and \
+                    any(value is not None for value in validators.values()) and \
+                    validators == cache_entry['validators']:
+                response = origin_cache.open(cache_key)
+                if response is not None:
+                    origin_cache.revalidated(cache_key)
+
+            if response is None:
+                response = origin_cache.store(
+                    cache_key,
+                    file_get_interface.ftp_get_stream(
+                        parsed_resource_url, ftp_id, ftp_pass),
+                    validators)
+
+            response = __to_return_data(response, stream)
+
+        elif stream:
+            response = file_get_interface.ftp_get_stream(
+                parsed_resource_url, ftp_id, ftp_pass)
+        else:
+            response = file_get_interface.ftp_get(
+                parsed_resource_url, ftp_id, ftp_pass)
+    except FtpTransferTimeoutError:
         raise CaddeException('000301006E')
     except Exception as e:
         error_message = str(e)
@@ -116,6 +165,28 @@ def provide_data_ftp(
     return response
 
 
+def __to_return_data(data: ChunkStream, stream: bool) -> Union[BytesIO, ChunkStream]:
+    """
+    取得データを呼び出し元に返却する形式に変換する。
+
+    Args:
+        data ChunkStream : 取得データ
+        stream bool : Trueの場合、チャンク単位で返却する
+
+    Returns:
+        BytesIO :取得データ streamがTrueの場合はChunkStream
+
+    """
+
+    if stream:
+        return data
+
+    try:
+        return BytesIO(b''.join(data))
+    finally:
+        data.close()
+
+
 def __url_analysis(url: str) -> dict:
     """
     URLを解析し、接続先、ポート番号、ディレクトリ、ファイル名を取得する。
@@ -3,11 +3,13 @@
 import requests
 from logging import getLogger
 from io import BytesIO
+from typing import Union
 
 from swagger_server.utilities.message_map import get_message
 from swagger_server.utilities.cadde_exception import CaddeException
-from swagger_server.utilities.external_interface import ExternalInterface
+from swagger_server.utilities.external_interface import ExternalInterface, ChunkStream
 from swagger_server.utilities.internal_interface import InternalInterface
+from swagger_server.utilities.origin_cache import OriginCache
 
 logger = getLogger(__name__)
 
@@ -20,25 +22,32 @@ __CONFIG_KEY_BASIC_PASS = 'basic_pass'
 
 __URL_SPLIT_CHAR = '/'
 
+# オリジンキャッシュ(http.jsonのorigin_cache)のキャッシュ用ディレクトリのデフォルト値
+__ORIGIN_CACHE_DEFAULT_DIRECTORY = '/tmp/cadde_origin_cache/http'
+
 
 def provide_data_http(
         resource_url: str,
         headers_dict: dict = None,
         file_get_interface: ExternalInterface = ExternalInterface(),
-        config_get_interface: InternalInterface = InternalInterface()) -> BytesIO:
+        config_get_interface: InternalInterface = InternalInterface(),
+        stream: bool = False) -> Union[BytesIO, ChunkStream]:
     """
     HTTPサーバからファイルを取得して返却する。
     ※2020年9月版ではダイジェスト認証、TLS証明書認証、OAuth等の認証処理は実施せず、
     ※ベーシック認証のみ実施する。
+    http.jsonでオリジンキャッシュが有効な場合は、キャッシュの有効期間内であればキャッシュから返却し、
+    有効期間を過ぎている場合はETag、Last-Modifiedを用いた条件付きGETでHTTPサーバに更新を確認する。
 
     Args:
         resource_url str : ファイル取得を行うリソースURL
         headers_dict : 設定するheader {ヘッダー名:パラメータ}
         file_get_interface object : ファイル取得処理を行うインタフェース
         config_get_interface object : コンフィグファイルからの情報取得を行うインタフェース
+        stream bool : Trueの場合、ファイル全体を読み込まずチャンク単位で返却する
 
     Returns:
-        BytesIO :取得データ
+        BytesIO :取得データ streamがTrueの場合はChunkStream
 
     Raises:
         Cadde_excption: パラメータが正常でない場合 エラーコード: 000201002E
@@ -57,6 +66,7 @@ def provide_data_http(
 
     auth = None
     domain = None
+    http_config = {}
     http_config_domain = []
 
     try:
@@ -89,23 +99,103 @@ def provide_data_http(
             http_config_domain[0][__CONFIG_KEY_BASIC_ID],
             http_config_domain[0][__CONFIG_KEY_BASIC_PASS])
 
-    response = file_get_interface.http_get(resource_url, headers_dict, auth)
+    request_headers = dict(headers_dict) if headers_dict else {}
+
+    # オリジンキャッシュの確認
+    origin_cache = OriginCache.from_config(
+        http_config, __ORIGIN_CACHE_DEFAULT_DIRECTORY)
+    cache_key = None
+    cache_entry = None
+    if origin_cache is not None:
+        cache_ttl = origin_cache.get_ttl(resource_url)
+        if cache_ttl is not None:
+            cache_key = OriginCache.make_key(
+                'http', resource_url, request_headers, auth[0] if auth else None)
+            cache_entry = origin_cache.lookup(cache_key)
+
+    if cache_entry is not None:
+        if origin_cache.is_fresh(cache_entry, cache_ttl):
+            cached_data = origin_cache.open(cache_key)
+            if cached_data is not None:
+                return __to_return_data(cached_data, stream)
+
+        if cache_entry['validators'].get('etag'):
+            request_headers['If-None-Match'] = cache_entry['validators']['etag']
+        if cache_entry['validators'].get('last_modified'):
+            request_headers['If-Modified-Since'] = cache_entry['validators']['last_modified']
+
+    response = file_get_interface.http_get(
+        resource_url, request_headers, auth, stream=stream or cache_key is not None)
+
+    if response.status_code == requests.codes.not_modified and cache_entry is not None:
+        response.close()
+        cached_data = origin_cache.open(cache_key)
+        if cached_data is not None:
+            origin_cache.revalidated(cache_key)
+            return __to_return_data(cached_data, stream)
+
+        # キャッシュしたファイルが削除されていた場合は条件なしで取得し直す
+        request_headers.pop('If-None-Match', None)
+        request_headers.pop('If-Modified-Since', None)
+        response = file_get_interface.http_get(
+            resource_url, request_headers, auth, stream=True)
 
     if response.status_code == requests.codes.ok:
+        if cache_key is not None and \
+                'no-store' not in response.headers.get('Cache-Control', '').lower():
+            data = origin_cache.store(
+                cache_key,
+                file_get_interface.http_iter_content(response),
+                {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                })
+            return __to_return_data(data, stream)
+
+        if cache_key is not None or stream:
+            return __to_return_data(
+                file_get_interface.http_iter_content(response), stream)
         return BytesIO(response.content)
 
+    # ストリーミングで取得した場合は接続を返却するため、エラー送出前にレスポンスを閉じる
     if response.status_code == requests.codes.not_found:
+        response.close()
         raise CaddeException('000201006E')
 
     if response.status_code == requests.codes.unauthorized:
+        response.close()
         raise CaddeException('000201007E')
 
     else:
+        response_text = response.text
+        response.close()
         raise CaddeException(
             '000201008E',
             status_code=None,
             replace_str_list=[
-                response.text])
+                response_text])
+
+
+def __to_return_data(data: ChunkStream, stream: bool) -> Union[BytesIO, ChunkStream]:
+    """
+    取得データを呼び出し元に返却する形式に変換する。
+
+    Args:
+        data ChunkStream : 取得データ
+        stream bool : Trueの場合、チャンク単位で返却する
+
+    Returns:
+        BytesIO :取得データ streamがTrueの場合はChunkStream
+
+    """
+
+    if stream:
+        return data
+
+    try:
+        return BytesIO(b''.join(data))
+    finally:
+        data.close()
 
 
 def __get_domain(resource_url: str) -> str:
@@ -2,13 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import io
-import urllib.request
-import ssl
 from logging import getLogger
 
 from swagger_server.utilities.message_map import get_message
 from swagger_server.utilities.cadde_exception import CaddeException
+from swagger_server.utilities.external_interface import ExternalInterface
 from swagger_server.utilities.internal_interface import InternalInterface
+from swagger_server.utilities.utilities import remove_hop_by_hop_headers
 
 
 logger = getLogger(__name__)
@@ -19,17 +19,27 @@ __CONFIG_KEY_NGSI_DOMAIN = 'domain'
 __CONFIG_KEY_AUTH = 'auth'
 __URL_SPLIT_CHAR = '/'
 
+# ngsi.jsonの内容毎のドメインとアクセストークンの対応 (コンフィグファイルの内容, {ドメイン: 設定})
+__ACCESS_TOKEN_MAP_CACHE = [None, {}]
 
-def provide_data_ngsi(resource_url, options={}):
+
+def provide_data_ngsi(
+        resource_url,
+        options={},
+        stream=False,
+        external_interface: ExternalInterface = ExternalInterface()):
     """
    データ管理サーバ（NGSI）からコンテキスト情報を取得して返却する。
 
     Args:
         resource_url str  : コンテキスト情報取得を行うリソースURL
         options      dict : リクエストヘッダ情報 key:ヘッダ名 value:パラメータ
+        stream       bool : Trueの場合、取得データを全て読み込まずチャンク単位で返却する
+        external_interface ExternalInterface : 外部リクエストを行うインタフェース
+                                               (接続先毎のkeep-alive接続を再利用する)
 
     Returns:
-        BytesIO : 取得データ
+        BytesIO : 取得データ streamがTrueの場合はChunkStream
         dict    : レスポンスヘッダ情報 key:ヘッダ名 value:パラメータ レスポンスヘッダがない場合は空のdictを返す
 
     Raises:
@@ -55,67 +65,72 @@ def provide_data_ngsi(resource_url, options={}):
 
     logger.debug(get_message('000401001N', [resource_url]))
 
-    context = ssl.SSLContext(ssl.PROTOCOL_TLS)
-
-    # リソースURLに対してHTTPリクエストをGETメソッドで実行
-    req = urllib.request.Request('{}'.format(resource_url))
+    # リクエスト時のヘッダにその他のオプションを追加
+    headers_dict = dict(options)
 
     # リクエスト時のヘッダにアクセストークン（Authorization）を追加
     if ngsi_auth:
-        req.add_header('Authorization', ngsi_auth)
+        headers_dict['Authorization'] = ngsi_auth
 
-    # リクエスト時のヘッダにその他のオプションを追加
-    for key, value in options.items():
-        req.add_header(key, value)
+    # 取得データはデータ管理サーバの応答のまま返却するため、圧縮を要求しない
+    if not any(key.lower() == 'accept-encoding' for key in headers_dict):
+        headers_dict['Accept-Encoding'] = 'identity'
 
+    # リソースURLに対してHTTPリクエストをGETメソッドで実行
+    # 従来通りサーバ証明書の検証は行わない
     try:
-        # HTTPリクエストする。
-        with urllib.request.urlopen(req, context=context, timeout=10) as res:
-            data = io.BytesIO(res.read())
-            headers = {}
-            headers = dict(res.getheaders())
-            # Flaskが返却するレスポンスヘッダにContent-Lengthが追加されるため、
-            # Transfer-Encoding削除
-            if 'Transfer-Encoding' in headers:
-                logger.debug('Transfer-Encodingを削除しました。')
-                del headers['Transfer-Encoding']
+        res = external_interface.http_get(
+            resource_url, headers_dict, stream=True, verify=False)
+    except CaddeException as err:
+        logger.debug(get_message('000401007E', [err.error_message]))
+        raise CaddeException(
+            '000401007E',
+            status_code=500,
+            replace_str_list=[
+                err.error_message])
 
     # HTTPリクエストでエラーした場合
-    except urllib.error.HTTPError as err:
-        if err.code == 400:
+    if 400 <= res.status_code:
+        res.close()
+        if res.status_code == 400:
             # Bad Request
             logger.debug('リクエストにエラーがありました。')
-            raise CaddeException('000401003E', status_code=err.code)
-        elif err.code == 401:
+            raise CaddeException('000401003E', status_code=res.status_code)
+        elif res.status_code == 401:
             # Unauthorized
             logger.debug(get_message('000401004E'))
-            raise CaddeException('000401004E', status_code=err.code)
-        elif err.code == 404:
+            raise CaddeException('000401004E', status_code=res.status_code)
+        elif res.status_code == 404:
             # Not Found
             logger.debug(get_message('000401005E'))
-            raise CaddeException('000401005E', status_code=err.code)
-        elif err.code == 409:
+            raise CaddeException('000401005E', status_code=res.status_code)
+        elif res.status_code == 409:
             # Conflict
             logger.debug(get_message('000401006E'))
-            raise CaddeException('000401006E', status_code=err.code)
+            raise CaddeException('000401006E', status_code=res.status_code)
         else:
             # Other errors
-            logger.debug(get_message('000401007E', [err.reason]))
+            logger.debug(get_message('000401007E', [res.reason]))
             raise CaddeException(
                 '000401007E',
                 status_code=500,
                 replace_str_list=[
-                    err.reason])
+                    res.reason])
 
-    except urllib.error.URLError as err:
-        logger.debug(get_message('000401007E', [err.reason]))
-        raise CaddeException(
-            '000401007E',
-            status_code=500,
-            replace_str_list=[
-                err.reason])
+    try:
+        # Flaskが返却するレスポンスヘッダにContent-Lengthが追加されるため、
+        # Transfer-Encoding等の接続に関するヘッダを削除
+        headers = remove_hop_by_hop_headers(res.headers)
+
+        if stream:
+            # ボディは呼び出し元での読み込み時に取得し、読み込み完了時に接続をプールに返却する
+            data = external_interface.http_iter_content(res)
+        else:
+            with res:
+                data = io.BytesIO(res.content)
 
     except Exception as err:
+        res.close()
         logger.debug(get_message('000401007E', [err]))
         raise CaddeException(
             '000401007E',
@@ -157,10 +172,7 @@ def __get_accesstoken_ngsi(resource_url):
         ngsi_config = config_get_interface.config_read(__CONFIG_FILE_PATH)
 
         # コンフィグファイルのドメインに一致した情報を取得
-        for e in ngsi_config[__CONFIG_KEY_NGSI_NGSIAUTH]:
-            if e[__CONFIG_KEY_NGSI_DOMAIN] == domain:
-                ngsi_config_domain = e
-                break
+        ngsi_config_domain = __get_access_token_map(ngsi_config).get(domain, {})
 
     except Exception:
         # コンフィグファイルから指定したドメインの情報が取得できない場合は何もしない
@@ -175,6 +187,37 @@ def __get_accesstoken_ngsi(resource_url):
     return ngsi_auth
 
 
+def __get_access_token_map(ngsi_config):
+    """
+    ngsi.jsonの内容から、ドメインと設定の対応を取得する。
+    コンフィグファイルが再読み込みされた場合(内容のオブジェクトが変わった場合)のみ作成し直す。
+    同じドメインの設定が複数ある場合は先に記載された設定を使用する。
+    ドメインが設定されていない設定があった場合、それ以降の設定は使用しない。
+
+    Args:
+        ngsi_config dict : ngsi.jsonの内容
+
+    Returns:
+        dict : ドメインと設定の対応 {ドメイン: 設定}
+
+    """
+
+    cached_config, access_token_map = __ACCESS_TOKEN_MAP_CACHE
+    if cached_config is ngsi_config:
+        return access_token_map
+
+    access_token_map = {}
+    try:
+        for e in ngsi_config[__CONFIG_KEY_NGSI_NGSIAUTH]:
+            access_token_map.setdefault(e[__CONFIG_KEY_NGSI_DOMAIN], e)
+    except Exception:
+        pass
+
+    __ACCESS_TOKEN_MAP_CACHE[:] = [ngsi_config, access_token_map]
+
+    return access_token_map
+
+
 def __get_domain(resource_url):
     """
     URLを解析し、ドメインを取得する。ポート番号が設定されている場合は、ポート番号も含む。
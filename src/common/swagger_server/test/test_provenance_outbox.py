@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from swagger_server.utilities import provenance_outbox
+from swagger_server.utilities.cadde_exception import CaddeException
+from swagger_server.utilities.provenance_outbox import ProvenanceOutbox
+
+
+class TestProvenanceOutbox(unittest.TestCase):
+    """
+    ProvenanceOutboxの送信順序、再送間隔、後続イベントの待機、送信中止、削除のテスト
+    送信スレッドは開始せず、送信処理を直接呼び出す。
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'provenance.sqlite3')
+        self.now = 1000.0
+        patcher = mock.patch.object(
+            provenance_outbox.time, 'time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.sent = []
+        self.failures = {}
+        self.outbox = ProvenanceOutbox(self.path, self.send)
+        self.outbox._ProvenanceOutbox__settings = {
+            'max_attempts': 3,
+            'retry_base_interval': 1,
+            'retry_max_interval': 4,
+            'metrics_interval': 60,
+            'retention': 100
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def send(self, url, headers, body):
+        self.sent.append(body)
+        failure = self.failures.get(body)
+        if failure is not None:
+            raise failure
+        return 'event-' + body.decode()
+
+    def flush(self):
+        return self.outbox._ProvenanceOutbox__flush()
+
+    def rows(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(
+                'SELECT local_id, body, status, attempts, next_attempt_at, event_id '
+                'FROM outbox ORDER BY seq').fetchall()
+        finally:
+            connection.close()
+
+    def test_send_in_order(self):
+        local_ids = [self.outbox.enqueue('http://example.com', {'Accept': 'application/json'}, body)
+                     for body in (b'1', b'2', b'3')]
+
+        self.flush()
+
+        self.assertEqual(self.sent, [b'1', b'2', b'3'])
+        rows = self.rows()
+        self.assertEqual([row[0] for row in rows], local_ids)
+        self.assertEqual([row[2] for row in rows], ['sent'] * 3)
+        self.assertEqual([row[5] for row in rows], ['event-1', 'event-2', 'event-3'])
+
+    def test_backoff(self):
+        self.outbox._ProvenanceOutbox__settings['max_attempts'] = 10
+        self.failures[b'1'] = CaddeException('020301002E', status_code=503)
+        self.outbox.enqueue('http://example.com', {}, b'1')
+
+        intervals = []
+        for _ in range(4):
+            intervals.append(self.flush())
+            self.now = self.rows()[0][4]
+
+        self.assertEqual(intervals, [1, 2, 4, 4])
+        self.assertEqual(self.rows()[0][2:4], ('pending', 4))
+
+    def test_head_of_line_blocking(self):
+        self.failures[b'1'] = CaddeException('020301002E', status_code=503)
+        for body in (b'1', b'2'):
+            self.outbox.enqueue('http://example.com', {}, body)
+
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(self.sent, [b'1'])
+
+        # 再送時刻までは後続のイベントも送信しない
+        self.now += 0.5
+        self.assertEqual(self.flush(), 0.5)
+        self.assertEqual(self.sent, [b'1'])
+
+        del self.failures[b'1']
+        self.now += 0.5
+        self.flush()
+        self.assertEqual(self.sent, [b'1', b'1', b'2'])
+        self.assertEqual([row[2] for row in self.rows()], ['sent', 'sent'])
+
+    def test_max_attempts(self):
+        self.failures[b'1'] = CaddeException('020301002E', status_code=503)
+        for body in (b'1', b'2'):
+            self.outbox.enqueue('http://example.com', {}, body)
+
+        for _ in range(3):
+            self.flush()
+            self.now = self.outbox._ProvenanceOutbox__blocked_until
+
+        self.flush()
+
+        self.assertEqual(self.sent, [b'1', b'1', b'1', b'2'])
+        rows = self.rows()
+        self.assertEqual(rows[0][2:4], ('failed', 3))
+        self.assertEqual(rows[1][2], 'sent')
+
+    def test_unauthorized(self):
+        self.failures[b'1'] = CaddeException('020301002E', status_code=401)
+        for body in (b'1', b'2'):
+            self.outbox.enqueue('http://example.com', {}, body)
+
+        self.flush()
+
+        # 再送せず、後続のイベントも待たせない
+        self.assertEqual(self.sent, [b'1', b'2'])
+        rows = self.rows()
+        self.assertEqual(rows[0][2:4], ('unauthorized', 1))
+        self.assertEqual(rows[1][2], 'sent')
+
+    def test_purge(self):
+        self.failures[b'2'] = CaddeException('020301002E', status_code=503)
+        self.outbox.enqueue('http://example.com', {}, b'1')
+        self.outbox.enqueue('http://example.com', {}, b'2')
+        self.flush()
+
+        self.now += 101
+        self.outbox._ProvenanceOutbox__purge()
+
+        # 送信済みは削除し、未送信は保持する
+        self.assertEqual([(row[1], row[2]) for row in self.rows()], [(b'2', 'pending')])
+
+
+if __name__ == '__main__':
+    unittest.main()
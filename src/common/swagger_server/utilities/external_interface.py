@@ -2,39 +2,226 @@
 import requests
 from io import BytesIO
 import ftplib
-
+import os
+import socket
+import ssl
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Callable, Iterable
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
 from requests.exceptions import Timeout
-from timeout_decorator import timeout
 
 from .cadde_exception import CaddeException
 
 
+class FtpTransferTimeoutError(Exception):
+    """
+    FTP通信が全体の制限時間内に完了しなかった場合に発生する例外。
+    """
+    pass
+
+
+class UnverifiedContextAdapter(HTTPAdapter):
+    """
+    サーバ証明書の検証を行わない接続で、プロセス内で共有するSSLContextを使用するアダプタ。
+    接続毎にSSLContextを生成しない。
+    """
+
+    __ssl_context = None
+    __ssl_context_lock = threading.Lock()
+
+    @classmethod
+    def __get_ssl_context(cls) -> ssl.SSLContext:
+        with cls.__ssl_context_lock:
+            if cls.__ssl_context is None:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+                cls.__ssl_context = context
+        return cls.__ssl_context
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.__get_ssl_context()
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.__get_ssl_context()
+        return super().proxy_manager_for(*args, **kwargs)
+
+
 class FTP_IgnoreHost(ftplib.FTP):
+    # ログイン直後のディレクトリ(コネクションプールで再利用する際の移動先)
+    home_directory = None
+
     def makepasv(self):
         _, port = super().makepasv()
         return self.host, port
 
 
+class ChunkStream:
+    """
+    取得データをチャンク単位で返却するイテレータ。
+    最後まで読み込んだ場合、読み込み中にエラーが発生した場合、closeが呼び出された場合に接続を解放する。
+    Flaskのレスポンスに設定した場合は、レスポンス送信完了時にcloseが呼び出される。
+    """
+
+    def __init__(self, chunks: Iterable, release: Callable = None):
+        """
+        コンストラクタ
+
+        Args:
+            chunks Iterable : チャンク(bytes)を返却するイテラブル
+            release Callable : 接続を解放する処理 不要な場合はNone
+        """
+        self.__chunks = iter(chunks)
+        self.__release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            return next(self.__chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """
+        接続を解放する。複数回呼び出された場合は2回目以降何もしない。
+        """
+        release = self.__release
+        self.__release = None
+        if release is not None:
+            release()
+
+
 class ExternalInterface:
 
     __HTTP_CONNECT_TIMEOUT = 10
     __HTTP_READ_TIMEOUT = 60
     __FTP_TIMEOUT = 10
+    __FTP_TRANSFER_TIMEOUT = 60
+    __STREAM_CHUNK_SIZE = 64 * 1024
+
+    # 接続先毎のコネクションプール設定
+    # 環境変数で変更でき、プロセス内で最初のセッションを生成する際に読み込む
+    # セッションは全インスタンスで共有するため、インスタンス毎には変更できない
+    __ENV_HTTP_POOL_MAXSIZE = 'CADDE_HTTP_POOL_MAXSIZE'
+    __ENV_HTTP_POOL_BLOCK = 'CADDE_HTTP_POOL_BLOCK'
+    __DEFAULT_HTTP_POOL_MAXSIZE = 20
+    __DEFAULT_HTTP_POOL_BLOCK = False
+    __http_pool_settings = None
+
+    # FTPのコネクションプール設定
+    # 接続先毎の待機させる接続の最大数、待機時間の上限(秒)
+    # 使用中(転送中)の接続数は制限しない
+    __FTP_POOL_MAX_IDLE = 2
+    __FTP_POOL_IDLE_TIMEOUT = 30
+
+    # 接続先(ホスト, ポート番号, FTP接続ID, FTP接続パスワード)毎の待機中のFTP接続
+    # 全インスタンス・全リクエストスレッドで共有する
+    __ftp_pool = {}
+    __ftp_pool_lock = threading.Lock()
+
+    # 接続先(スキーム, ホスト:ポート, 証明書検証有無)毎のセッション
+    # 全インスタンス・全リクエストスレッドで共有する
+    __sessions = {}
+    __sessions_lock = threading.Lock()
+
+    @classmethod
+    def __get_http_pool_settings(cls) -> tuple:
+        """
+        環境変数からコネクションプールの設定を取得する。
+        初回のみ環境変数を読み込み、以降はプロセス内で同じ設定を使用する。
+        設定値が不正な場合は既定値を使用する。
+
+        Returns:
+            tuple : (接続先毎に保持する接続の最大数, 最大数に達した場合に接続の返却を待つか否か)
+        """
+
+        if cls.__http_pool_settings is None:
+            try:
+                pool_maxsize = max(int(os.environ.get(
+                    cls.__ENV_HTTP_POOL_MAXSIZE, cls.__DEFAULT_HTTP_POOL_MAXSIZE)), 1)
+            except ValueError:
+                pool_maxsize = cls.__DEFAULT_HTTP_POOL_MAXSIZE
+
+            pool_block = os.environ.get(cls.__ENV_HTTP_POOL_BLOCK)
+            if pool_block is None or pool_block.strip().lower() not in ('true', 'false'):
+                pool_block = cls.__DEFAULT_HTTP_POOL_BLOCK
+            else:
+                pool_block = pool_block.strip().lower() == 'true'
+
+            cls.__http_pool_settings = (pool_maxsize, pool_block)
+
+        return cls.__http_pool_settings
+
+    def __get_session(self, target_url: str, verify: bool = True) -> requests.Session:
+        """
+        接続先に対応するkeep-alive接続を保持したセッションを取得する。
+        初回アクセス時にセッションを生成し、以降は同じ接続先へのリクエストで再利用する。
+        セッションは複数の利用者のリクエストで共有するため、Cookieは保持しない。
+        サーバ証明書の検証を行わない場合は、プロセス内で共有するSSLContextを使用する。
+        session.verifyは環境変数REQUESTS_CA_BUNDLEで上書きされるため、リクエスト毎にverifyを指定すること。
+
+        Args:
+            target_url str : 接続するURL
+            verify bool : サーバ証明書の検証を行うか否か
+
+        Returns:
+            requests.Session : 接続先のセッション
+        """
+
+        parsed_url = urlsplit(target_url)
+        key = (parsed_url.scheme.lower(), parsed_url.netloc.lower(), verify)
+
+        session = self.__sessions.get(key)
+        if session is not None:
+            return session
+
+        with self.__sessions_lock:
+            session = self.__sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.verify = verify
+                session.cookies.set_policy(
+                    DefaultCookiePolicy(allowed_domains=[]))
+                pool_maxsize, pool_block = self.__get_http_pool_settings()
+                adapter_class = HTTPAdapter if verify else UnverifiedContextAdapter
+                adapter = adapter_class(
+                    pool_connections=1,
+                    pool_maxsize=pool_maxsize,
+                    pool_block=pool_block)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.__sessions[key] = session
+
+        return session
 
     def http_get(
             self,
             target_url: str,
             headers: dict = None,
             auth: tuple = None,
-            post_body: dict = None):
+            post_body: dict = None,
+            stream: bool = False,
+            verify: bool = True):
         """
         対象URLに対してhttp(get)通信を行ってレスポンスを取得する。
+        接続先毎のセッションを利用し、keep-alive接続を再利用する。
+        streamがTrueの場合はレスポンスヘッダ受信時点で返却し、ボディはhttp_iter_contentで読み込む。
 
         Args:
             target_url str : 接続するURL
             headers : 設定するheader {ヘッダー名:パラメータ}
             auth : ベーシック認証時のidとpass
             post_body : 設定するbody部
+            stream : ボディを逐次読み込みとするか否か
+            verify : サーバ証明書の検証を行うか否か
 
         Returns:
             response : get通信のレスポンス
@@ -51,14 +238,16 @@ class ExternalInterface:
         headers['Cache-Control'] = 'no-cache'
 
         try:
-            response = requests.get(
+            response = self.__get_session(target_url, verify).get(
                 target_url,
                 headers=headers,
                 timeout=(
                     self.__HTTP_CONNECT_TIMEOUT,
                     self.__HTTP_READ_TIMEOUT),
                 auth=auth,
-                params=post_body)
+                params=post_body,
+                stream=stream,
+                verify=verify)
 
         except Timeout:
             raise CaddeException('000001001E')
@@ -71,19 +260,39 @@ class ExternalInterface:
 
         return response
 
+    def http_iter_content(self, response) -> ChunkStream:
+        """
+        http_get(stream=True)で取得したレスポンスのボディをチャンク単位で返却する。
+
+        Args:
+            response : http_getのレスポンス
+
+        Returns:
+            ChunkStream : 取得データのイテレータ
+        """
+
+        return ChunkStream(
+            response.iter_content(chunk_size=self.__STREAM_CHUNK_SIZE),
+            response.close)
+
     def http_post(
             self,
             target_url: str,
             headers: dict = None,
             post_body: dict = None,
-            verify: bool = True):
+            verify: bool = True,
+            files: dict = None):
         """
         対象URLに対してhttp(post)通信を行ってレスポンスを取得する。
+        接続先毎のセッションを利用し、keep-alive接続を再利用する。
+        filesを指定した場合はmultipart/form-data形式で送信する。
 
         Args:
             target_url str : 接続するURL
             headers : 設定するheader {ヘッダー名:パラメータ}
             post_body : 設定するbody部
+            verify : サーバ証明書の検証を行うか否か
+            files : multipart/form-dataで送信するファイル {フィールド名:(ファイル名, 内容, Content-Type)}
 
 
         Returns:
@@ -103,13 +312,22 @@ class ExternalInterface:
 
         headers['Cache-Control'] = 'no-cache'
 
-        req = requests
-        if not verify:
-            req = requests.Session()
-            req.verify = False
+        req = self.__get_session(target_url, verify)
 
         try:
-            if 'Content-Type' in headers and headers['Content-Type'] == 'application/x-www-form-urlencoded':
+            if files:
+                response = req.post(
+                    target_url,
+                    headers=headers,
+
+                    timeout=(
+                        self.__HTTP_CONNECT_TIMEOUT,
+                        self.__HTTP_READ_TIMEOUT),
+                    verify=verify,
+                    data=post_body,
+                    files=files
+                )
+            elif 'Content-Type' in headers and headers['Content-Type'] == 'application/x-www-form-urlencoded':
                 response = req.post(
                     target_url,
                     headers=headers,
@@ -117,6 +335,7 @@ class ExternalInterface:
                     timeout=(
                         self.__HTTP_CONNECT_TIMEOUT,
                         self.__HTTP_READ_TIMEOUT),
+                    verify=verify,
                     data=post_body
                 )
             else:
@@ -127,6 +346,7 @@ class ExternalInterface:
                     timeout=(
                         self.__HTTP_CONNECT_TIMEOUT,
                         self.__HTTP_READ_TIMEOUT),
+                    verify=verify,
                     json=post_body
                 )
         except Timeout:
@@ -140,7 +360,6 @@ class ExternalInterface:
 
         return response
 
-    @timeout(60, use_signals=False)
     def ftp_get(
             self,
             parsed_resource_url: dict,
@@ -148,6 +367,7 @@ class ExternalInterface:
             ftp_pass: str) -> BytesIO:
         """
         対象URLに対してftp通信を行ってレスポンスを取得する。
+        各通信にソケットのタイムアウトを設定し、加えて接続からファイル転送完了までの全体の制限時間を設ける。
 
         Args:
             parsed_resource_url dict : 解析後リソースURL {
@@ -163,24 +383,346 @@ class ExternalInterface:
             BytesIO : FTP通信で取得したファイル情報
 
         Raises:
+            FtpTransferTimeoutError: 全体の制限時間内にファイル転送が完了しなかった場合
             Exception: 本処理内でエラーが発生した場合
         """
 
+        deadline = time.monotonic() + self.__FTP_TRANSFER_TIMEOUT
         file_byte = BytesIO()
 
-        with FTP_IgnoreHost() as ftp:
-            ftp.connect(
-                parsed_resource_url['access_point'],
-                parsed_resource_url['port_no'],
-                self.__FTP_TIMEOUT)
-            ftp.login(user=ftp_id, passwd=ftp_pass)
+        ftp, data_connection, pool_key = self.__ftp_open_transfer(
+            parsed_resource_url, ftp_id, ftp_pass, deadline)
+        completed = False
+        try:
+            with data_connection:
+                while True:
+                    data_connection.settimeout(
+                        self.__ftp_socket_timeout(deadline))
+                    chunk = data_connection.recv(self.__STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    file_byte.write(chunk)
+
+            ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+            ftp.voidresp()
+            completed = True
+        except socket.timeout as e:
+            self.__raise_if_deadline_exceeded(deadline, e)
+            raise
+        finally:
+            self.__ftp_release(pool_key, ftp, completed)
+
+        file_byte.seek(0)
+
+        return file_byte
+
+    def ftp_get_stream(
+            self,
+            parsed_resource_url: dict,
+            ftp_id: str,
+            ftp_pass: str) -> ChunkStream:
+        """
+        対象URLに対してftp通信を行い、取得データをチャンク単位で返却する。
+        ファイル転送の開始までを本処理内で行い、データの読み込みは返却したイテレータで行う。
+        ファイル転送の開始までは全体の制限時間を設ける。
+        データの読み込みは返却先への送信速度に依存するため、ソケットのタイムアウトのみ設定する。
+
+        Args:
+            parsed_resource_url dict : 解析後リソースURL {
+                'access_point':(接続先),
+                'port_no':(ポート番号),
+                'directory':(ディレクトリ),
+                'file_name':(ファイル名)
+                 }
+            ftp_id : FTP接続時に利用するID
+            ftp_pass : FTP接続時に利用するパスワード
+
+        Returns:
+            ChunkStream : 取得データのイテレータ
+
+        Raises:
+            FtpTransferTimeoutError: 全体の制限時間内にファイル転送を開始できなかった場合
+            Exception: ファイル転送の開始までにエラーが発生した場合
+        """
+
+        deadline = time.monotonic() + self.__FTP_TRANSFER_TIMEOUT
+        ftp, data_connection, pool_key = self.__ftp_open_transfer(
+            parsed_resource_url, ftp_id, ftp_pass, deadline)
+        data_connection.settimeout(self.__FTP_TIMEOUT)
+        completed = []
+
+        def read_chunks():
+            while True:
+                chunk = data_connection.recv(self.__STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            data_connection.close()
+            ftp.sock.settimeout(self.__FTP_TIMEOUT)
+            ftp.voidresp()
+            completed.append(True)
+
+        def release():
+            # 最後まで転送が完了した接続のみ再利用し、中断・エラー時は破棄する
+            data_connection.close()
+            self.__ftp_release(pool_key, ftp, bool(completed))
+
+        return ChunkStream(read_chunks(), release)
+
+    def ftp_get_validators(
+            self,
+            parsed_resource_url: dict,
+            ftp_id: str,
+            ftp_pass: str) -> dict:
+        """
+        対象ファイルの更新確認に使用する情報(最終更新日時、サイズ)をMDTM、SIZEコマンドで取得する。
+        FTPサーバがコマンドに対応していない場合、該当する値はNoneとする。
+
+        Args:
+            parsed_resource_url dict : 解析後リソースURL
+            ftp_id : FTP接続時に利用するID
+            ftp_pass : FTP接続時に利用するパスワード
+
+        Returns:
+            dict : {'mdtm': 最終更新日時, 'size': サイズ}
+
+        Raises:
+            FtpTransferTimeoutError: 全体の制限時間を超過した場合
+            Exception: 本処理内でエラーが発生した場合
+        """
+
+        deadline = time.monotonic() + self.__FTP_TRANSFER_TIMEOUT
+        pool_key = self.__ftp_pool_key(parsed_resource_url, ftp_id, ftp_pass)
+        validators = {'mdtm': None, 'size': None}
 
+        ftp = self.__ftp_acquire(pool_key, deadline)
+        reusable = False
+        try:
             if len(parsed_resource_url['directory']) > 0:
+                ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
                 ftp.cwd(parsed_resource_url['directory'])
-            ftp.retrbinary(
-                'RETR ' + parsed_resource_url['file_name'],
-                file_byte.write)
 
-        file_byte.seek(0)
+            ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+            ftp.voidcmd('TYPE I')
 
-        return file_byte
+            try:
+                ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+                validators['mdtm'] = ftp.sendcmd(
+                    'MDTM ' + parsed_resource_url['file_name'])[4:].strip()
+            except ftplib.error_perm:
+                pass
+
+            try:
+                ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+                validators['size'] = ftp.size(parsed_resource_url['file_name'])
+            except ftplib.error_perm:
+                pass
+
+            reusable = True
+        except socket.timeout as e:
+            self.__raise_if_deadline_exceeded(deadline, e)
+            raise
+        finally:
+            self.__ftp_release(pool_key, ftp, reusable)
+
+        return validators
+
+    def __ftp_pool_key(self, parsed_resource_url: dict, ftp_id: str, ftp_pass: str) -> tuple:
+        """
+        FTPのコネクションプールのキーを作成する。
+
+        Args:
+            parsed_resource_url dict : 解析後リソースURL
+            ftp_id : FTP接続時に利用するID
+            ftp_pass : FTP接続時に利用するパスワード
+
+        Returns:
+            tuple : コネクションプールのキー (ホスト, ポート番号, FTP接続ID, FTP接続パスワード)
+        """
+
+        return (
+            parsed_resource_url['access_point'],
+            parsed_resource_url['port_no'],
+            ftp_id,
+            ftp_pass)
+
+    def __ftp_open_transfer(
+            self,
+            parsed_resource_url: dict,
+            ftp_id: str,
+            ftp_pass: str,
+            deadline: float):
+        """
+        コネクションプールから取得したFTP接続で、対象ファイルのバイナリ転送を開始する。
+        エラーが発生した場合は接続を破棄する。
+
+        Args:
+            parsed_resource_url dict : 解析後リソースURL
+            ftp_id : FTP接続時に利用するID
+            ftp_pass : FTP接続時に利用するパスワード
+            deadline float : 全体の制限時刻(time.monotonic基準)
+
+        Returns:
+            FTP_IgnoreHost : 制御用コネクション
+            socket : データ転送用コネクション
+            tuple : コネクションプールのキー
+
+        Raises:
+            FtpTransferTimeoutError: 全体の制限時間を超過した場合
+            Exception: 本処理内でエラーが発生した場合
+        """
+
+        pool_key = self.__ftp_pool_key(parsed_resource_url, ftp_id, ftp_pass)
+
+        ftp = self.__ftp_acquire(pool_key, deadline)
+        try:
+            if len(parsed_resource_url['directory']) > 0:
+                ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+                ftp.cwd(parsed_resource_url['directory'])
+
+            ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+            ftp.voidcmd('TYPE I')
+
+            # データ転送用コネクションはftp.timeoutのタイムアウトで接続する
+            ftp.timeout = self.__ftp_socket_timeout(deadline)
+            data_connection = ftp.transfercmd(
+                'RETR ' + parsed_resource_url['file_name'])
+        except Exception as e:
+            self.__ftp_release(pool_key, ftp, False)
+            if isinstance(e, socket.timeout):
+                self.__raise_if_deadline_exceeded(deadline, e)
+            raise
+
+        return ftp, data_connection, pool_key
+
+    def __ftp_acquire(self, pool_key: tuple, deadline: float) -> FTP_IgnoreHost:
+        """
+        接続先(ホスト, ポート番号, FTP接続ID)毎のコネクションプールから、ログイン済みのFTP接続を取得する。
+        待機中の接続はNOOPで疎通を確認し、応答がない接続は破棄する。
+        利用可能な接続がない場合は新たに接続してログインする。
+        再利用した接続はログイン直後のディレクトリに移動した状態で返却する。
+
+        Args:
+            pool_key tuple : コネクションプールのキー (ホスト, ポート番号, FTP接続ID, FTP接続パスワード)
+            deadline float : 全体の制限時刻(time.monotonic基準)
+
+        Returns:
+            FTP_IgnoreHost : ログイン済みのFTP接続
+
+        Raises:
+            FtpTransferTimeoutError: 全体の制限時間を超過した場合
+            Exception: 本処理内でエラーが発生した場合
+        """
+
+        with self.__ftp_pool_lock:
+            self.__ftp_evict_idle()
+
+        while True:
+            with self.__ftp_pool_lock:
+                idle_list = self.__ftp_pool.get(pool_key)
+                if not idle_list:
+                    break
+                ftp, _ = idle_list.pop()
+
+            try:
+                ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+                ftp.voidcmd('NOOP')
+                ftp.cwd(ftp.home_directory)
+                return ftp
+            except FtpTransferTimeoutError:
+                ftp.close()
+                raise
+            except Exception:
+                ftp.close()
+
+        ftp = FTP_IgnoreHost()
+        try:
+            ftp.connect(
+                pool_key[0],
+                pool_key[1],
+                self.__ftp_socket_timeout(deadline))
+
+            ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+            ftp.login(user=pool_key[2], passwd=pool_key[3])
+
+            ftp.sock.settimeout(self.__ftp_socket_timeout(deadline))
+            ftp.home_directory = ftp.pwd()
+        except Exception as e:
+            ftp.close()
+            if isinstance(e, socket.timeout):
+                self.__raise_if_deadline_exceeded(deadline, e)
+            raise
+
+        return ftp
+
+    def __ftp_release(self, pool_key: tuple, ftp: FTP_IgnoreHost, reusable: bool):
+        """
+        使用を終えたFTP接続をコネクションプールに戻す。
+        再利用できない接続、または待機中の接続数が上限に達している場合は接続を閉じる。
+
+        Args:
+            pool_key tuple : コネクションプールのキー
+            ftp FTP_IgnoreHost : 使用を終えたFTP接続
+            reusable bool : 接続を再利用可能か否か
+        """
+
+        if reusable:
+            with self.__ftp_pool_lock:
+                idle_list = self.__ftp_pool.setdefault(pool_key, [])
+                if len(idle_list) < self.__FTP_POOL_MAX_IDLE:
+                    idle_list.append((ftp, time.monotonic()))
+                    return
+
+        ftp.close()
+
+    def __ftp_evict_idle(self):
+        """
+        待機時間が上限を超えたFTP接続をコネクションプールから取り除いて閉じる。
+        呼び出し元で__ftp_pool_lockを取得していること。
+        """
+
+        expire = time.monotonic() - self.__FTP_POOL_IDLE_TIMEOUT
+        for pool_key in list(self.__ftp_pool):
+            idle_list = self.__ftp_pool[pool_key]
+            for ftp, last_used in idle_list:
+                if last_used < expire:
+                    ftp.close()
+            idle_list[:] = [
+                (ftp, last_used) for ftp, last_used in idle_list if expire <= last_used]
+            if not idle_list:
+                del self.__ftp_pool[pool_key]
+
+    def __ftp_socket_timeout(self, deadline: float) -> float:
+        """
+        全体の制限時刻までの残り時間を考慮した、ソケットのタイムアウト値を返却する。
+
+        Args:
+            deadline float : 全体の制限時刻(time.monotonic基準)
+
+        Returns:
+            float : ソケットのタイムアウト値(秒)
+
+        Raises:
+            FtpTransferTimeoutError: 全体の制限時間を超過した場合
+        """
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FtpTransferTimeoutError()
+
+        return min(self.__FTP_TIMEOUT, remaining)
+
+    def __raise_if_deadline_exceeded(self, deadline: float, error: Exception):
+        """
+        ソケットのタイムアウトが全体の制限時刻の到達によるものであれば、全体の制限時間超過として扱う。
+
+        Args:
+            deadline float : 全体の制限時刻(time.monotonic基準)
+            error Exception : 発生したソケットのタイムアウト
+
+        Raises:
+            FtpTransferTimeoutError: 全体の制限時間を超過していた場合
+        """
+
+        if deadline <= time.monotonic():
+            raise FtpTransferTimeoutError() from error
@@ -1,11 +1,28 @@
 ﻿# -*- coding: utf-8 -*-
 import json
+import os
+import signal
+import threading
+import time
 
 
 class InternalInterface:
+
+    # コンフィグファイルの更新有無を確認する間隔(秒)
+    __CONFIG_CHECK_INTERVAL = 1.0
+
+    # コンフィグファイルのパス毎の読み込み結果
+    # {パス: (最終更新時刻(ns), ファイルサイズ, 最終確認時刻, コンフィグファイルの内容)}
+    # 全インスタンス・全リクエストスレッドで共有する
+    __config_cache = {}
+    __config_cache_lock = threading.Lock()
+
     def config_read(self, file_path: str) -> dict:
         """
         コンフィグファイルからパラメータを取得する
+        読み込み結果はプロセス内で保持し、ファイルの更新(最終更新時刻、サイズの変更)を検知した場合、
+        またはclear_config_cacheが呼び出された場合(SIGHUP受信時を含む)に再読み込みする。
+        返却する内容は呼び出し元で共有するため、変更しないこと。
 
         Args:
             file_path str : コンフィグファイルのパス
@@ -14,7 +31,41 @@ class InternalInterface:
             dict : コンフィグファイルの内容
         """
 
-        json_file = open(file_path, 'r')
-        json_data = json.load(json_file)
+        now = time.monotonic()
+        cached = self.__config_cache.get(file_path)
+        if cached is not None and now - cached[2] < self.__CONFIG_CHECK_INTERVAL:
+            return cached[3]
+
+        stat_result = os.stat(file_path)
+        if cached is not None and \
+                cached[0] == stat_result.st_mtime_ns and \
+                cached[1] == stat_result.st_size:
+            with self.__config_cache_lock:
+                self.__config_cache[file_path] = (
+                    cached[0], cached[1], now, cached[3])
+            return cached[3]
+
+        with open(file_path, 'r') as json_file:
+            json_data = json.load(json_file)
+
+        with self.__config_cache_lock:
+            self.__config_cache[file_path] = (
+                stat_result.st_mtime_ns, stat_result.st_size, now, json_data)
 
         return json_data
+
+    @classmethod
+    def clear_config_cache(cls, *args):
+        """
+        保持しているコンフィグファイルの内容を破棄し、次回のconfig_readで再読み込みさせる。
+        SIGHUPのシグナルハンドラとしても使用するため、ロックは取得せず参照先の差し替えのみ行う。
+        """
+
+        cls.__config_cache = {}
+
+
+try:
+    signal.signal(signal.SIGHUP, InternalInterface.clear_config_cache)
+except (AttributeError, ValueError):
+    # SIGHUPが存在しない環境、またはメインスレッド以外からのインポート時は登録しない
+    pass
@@ -0,0 +1,218 @@
+﻿# -*- coding: utf-8 -*-
+import threading
+import time
+from logging import getLogger
+
+try:
+    import jwt
+except ImportError:
+    # PyJWTがインストールされていない場合はローカル検証を行わない
+    jwt = None
+
+logger = getLogger(__name__)
+
+
+class JwtVerificationError(Exception):
+    """
+    ローカル検証でトークンの署名、有効期限、発行者、受信者のいずれかが不正と判定された場合の例外。
+    """
+
+
+class JwtVerifier:
+    """
+    発行者の公開鍵(JWKS)を使用して、JWT形式のトークンをプロセス内で検証する。
+    公開鍵は発行者のJWKSのURL毎に全リクエストスレッドで共有して保持し、
+    保持時間を過ぎた場合、またはトークンのkidに該当する公開鍵がない場合(鍵の更新時)に再取得する。
+    """
+
+    # コンフィグ：ローカル検証設定(authentication.json、authorization.json)
+    __CONFIG_KEY_LOCAL_VERIFICATION = 'local_verification'
+    __CONFIG_KEY_ENABLE = 'enable'
+    __CONFIG_KEY_ISSUERS = 'issuers'
+    __CONFIG_KEY_ISSUER = 'issuer'
+    __CONFIG_KEY_JWKS_URI = 'jwks_uri'
+    __CONFIG_KEY_AUDIENCE = 'audience'
+    __CONFIG_KEY_ALGORITHMS = 'algorithms'
+    __CONFIG_KEY_JWKS_CACHE_TTL = 'jwks_cache_ttl'
+    __CONFIG_KEY_LEEWAY = 'leeway'
+
+    __DEFAULT_ALGORITHMS = ['RS256']
+    __DEFAULT_JWKS_CACHE_TTL = 3600
+    __DEFAULT_LEEWAY = 0
+
+    # jwks_uriを省略した場合に発行者のURLに付与するパス(Keycloakの公開鍵エンドポイント)
+    __DEFAULT_JWKS_PATH = '/protocol/openid-connect/certs'
+
+    # kidに該当する公開鍵がない場合に、JWKSを再取得する最短の間隔(秒)
+    __JWKS_REFRESH_INTERVAL = 30
+
+    # JWKSのURL毎の公開鍵 {JWKSのURL: (取得時刻, {kid: 公開鍵})}
+    __jwks_cache = {}
+    __jwks_cache_lock = threading.Lock()
+
+    # 直近に読み込んだコンフィグファイルの内容と、その内容から作成した検証処理
+    __last_config = (None, None)
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """
+        コンフィグファイルの内容からローカル検証を行う検証処理を取得する。
+        ローカル検証が有効でない場合、PyJWTがインストールされていない場合はNoneを返却する。
+
+        Args:
+            config dict : コンフィグファイル(authentication.json、authorization.json)の内容
+
+        Returns:
+            JwtVerifier : 検証処理 ローカル検証を行わない場合はNone
+        """
+
+        last_config, last_verifier = cls.__last_config
+        if last_config is config:
+            return last_verifier
+
+        verifier = None
+        try:
+            verification_config = config.get(cls.__CONFIG_KEY_LOCAL_VERIFICATION)
+            if verification_config and verification_config.get(cls.__CONFIG_KEY_ENABLE, False):
+                if jwt is None:
+                    logger.warning('PyJWTがインストールされていないため、トークンのローカル検証を行いません。')
+                else:
+                    verifier = cls(verification_config)
+        except Exception as e:
+            logger.warning('トークンのローカル検証の設定が不正です。' + str(e))
+            verifier = None
+
+        cls.__last_config = (config, verifier)
+
+        return verifier
+
+    def __init__(self, verification_config: dict):
+        """
+        コンストラクタ
+
+        Args:
+            verification_config dict : コンフィグファイルのlocal_verificationの内容
+        """
+
+        self.__jwks_cache_ttl = float(verification_config.get(
+            self.__CONFIG_KEY_JWKS_CACHE_TTL, self.__DEFAULT_JWKS_CACHE_TTL))
+        self.__leeway = float(verification_config.get(
+            self.__CONFIG_KEY_LEEWAY, self.__DEFAULT_LEEWAY))
+
+        self.__issuers = {}
+        for issuer_config in verification_config.get(self.__CONFIG_KEY_ISSUERS, []):
+            issuer = issuer_config[self.__CONFIG_KEY_ISSUER].rstrip('/')
+            self.__issuers[issuer] = {
+                self.__CONFIG_KEY_JWKS_URI: issuer_config.get(
+                    self.__CONFIG_KEY_JWKS_URI, issuer + self.__DEFAULT_JWKS_PATH),
+                self.__CONFIG_KEY_AUDIENCE: issuer_config.get(
+                    self.__CONFIG_KEY_AUDIENCE),
+                self.__CONFIG_KEY_ALGORITHMS: issuer_config.get(
+                    self.__CONFIG_KEY_ALGORITHMS, self.__DEFAULT_ALGORITHMS)
+            }
+
+    def verify(self, token: str, external_interface) -> dict:
+        """
+        トークンの署名、有効期限、発行者、受信者(設定した場合)を検証し、ペイロードを返却する。
+        発行者が設定されていない場合、公開鍵を取得できない場合等、ローカルで判定できない場合はNoneを返却するため、
+        呼び出し元は認証サーバ、認可サーバでの検証を行うこと。
+
+        Args:
+            token str : トークン 先頭に'Bearer 'が付与されていてもよい
+            external_interface : JWKSの取得を行うインタフェース
+
+        Returns:
+            dict : 検証したトークンのペイロード ローカルで判定できない場合はNone
+
+        Raises:
+            JwtVerificationError : トークンが不正な場合
+        """
+
+        if token.startswith('Bearer '):
+            token = token[7:]
+
+        try:
+            header = jwt.get_unverified_header(token)
+            unverified_payload = jwt.decode(
+                token, options={'verify_signature': False})
+        except jwt.PyJWTError as e:
+            raise JwtVerificationError(str(e))
+
+        issuer = str(unverified_payload.get('iss', '')).rstrip('/')
+        issuer_config = self.__issuers.get(issuer)
+        if issuer_config is None:
+            return None
+
+        key = self.__get_key(
+            issuer_config[self.__CONFIG_KEY_JWKS_URI], header.get('kid'), external_interface)
+        if key is None:
+            return None
+
+        audience = issuer_config[self.__CONFIG_KEY_AUDIENCE]
+        try:
+            return jwt.decode(
+                token,
+                key=key,
+                algorithms=issuer_config[self.__CONFIG_KEY_ALGORITHMS],
+                audience=audience,
+                issuer=unverified_payload.get('iss'),
+                leeway=self.__leeway,
+                options={
+                    'require': ['exp', 'iss'],
+                    'verify_aud': audience is not None})
+        except jwt.PyJWTError as e:
+            raise JwtVerificationError(str(e))
+
+    def __get_key(self, jwks_uri: str, kid: str, external_interface):
+        """
+        kidに該当する公開鍵を取得する。
+        保持しているJWKSが保持時間を過ぎている場合、kidに該当する公開鍵がない場合はJWKSを再取得する。
+        JWKSの再取得に失敗した場合は、保持しているJWKSを使用する。
+        """
+
+        now = time.monotonic()
+        cached = self.__jwks_cache.get(jwks_uri)
+        if cached is not None:
+            fetched_at, keys = cached
+            if now - fetched_at < self.__jwks_cache_ttl:
+                if kid in keys:
+                    return keys[kid]
+                if now - fetched_at < self.__JWKS_REFRESH_INTERVAL:
+                    return None
+
+        keys = self.__fetch_jwks(jwks_uri, external_interface)
+        if keys is None:
+            if cached is None:
+                return None
+            return cached[1].get(kid)
+
+        with self.__jwks_cache_lock:
+            self.__jwks_cache[jwks_uri] = (time.monotonic(), keys)
+
+        return keys.get(kid)
+
+    def __fetch_jwks(self, jwks_uri: str, external_interface) -> dict:
+        """
+        JWKSを取得し、署名用の公開鍵をkid毎に返却する。取得に失敗した場合はNoneを返却する。
+        """
+
+        try:
+            response = external_interface.http_get(jwks_uri)
+            if response.status_code < 200 or 300 <= response.status_code:
+                raise Exception(
+                    f'status_code: {response.status_code} {response.text}')
+            jwks = response.json()
+        except Exception as e:
+            logger.warning('JWKSの取得に失敗しました。' + jwks_uri + ' ' + str(e))
+            return None
+
+        keys = {}
+        for jwk in jwks.get('keys', []):
+            if jwk.get('use', 'sig') != 'sig':
+                continue
+            try:
+                keys[jwk.get('kid')] = jwt.PyJWK(jwk).key
+            except Exception as e:
+                logger.warning('JWKSの公開鍵を読み込めません。' + str(e))
+
+        return keys
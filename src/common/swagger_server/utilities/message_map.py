@@ -94,6 +94,7 @@ __MESSAGE_CODE_MAP = {
     '010401002E': {'message': '指定の認証方式が正しくありません。', 'http_status_code': 400},
     '010401003E': {'message': 'エラーが発生しました。エラー内容:{0[0]}'},
     '010401004E': {'message': '認可トークンの取得に失敗しました。CADDE管理者に問い合わせください。', 'http_status_code': 500},
+    '010401005E': {'message': '認証トークンの検証に失敗しました。リクエストパラメータに設定した認証トークンを確認してください。エラー内容:{0[0]}', 'http_status_code': 403},
     '010403001N': {'message': 'トークン情報: {0[0]}, CADDEユーザID（提供者）:{0[1]}, 提供者コネクタID:{0[2]}, 提供者コネクタのシークレット:{0[3]} リソースURL:{0[4]}'},
     '010403002E': {'message': 'エラーが発生しました。エラー内容:{0[0]}'},
     '020000001E': {'message': 'パラメータが不正です。リクエストパラメータの値を確認してください。', 'http_status_code': 500},
@@ -143,7 +144,8 @@ __MESSAGE_CODE_MAP = {
     '020400001E': {'message': '認証サーバのURL取得に失敗しました。CADDE管理者に問い合わせください。', 'http_status_code': 500},
     '020402001N': {'message': 'トークン情報: {0[0]}, 利用者コネクタID:{0[1]}, 利用者コネクタのシークレット:{0[2]}', 'http_status_code': 200},
     '020402002E': {'message': 'エラーが発生しました。エラー内容:{0[0]}'},
-    '020402003E': {'message': '認証処理を行いましたが、対象の認証トークンは使用できません。リクエストパラメータに設定した利用者トークンを確認してください。', 'http_status_code': 403}
+    '020402003E': {'message': '認証処理を行いましたが、対象の認証トークンは使用できません。リクエストパラメータに設定した利用者トークンを確認してください。', 'http_status_code': 403},
+    '020402004E': {'message': '利用者トークンの検証に失敗しました。リクエストパラメータに設定した利用者トークンを確認してください。エラー内容:{0[0]}', 'http_status_code': 403}
 }
 
 
@@ -0,0 +1,398 @@
+﻿# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from logging import getLogger
+
+from .external_interface import ChunkStream
+
+logger = getLogger(__name__)
+
+
+class OriginCache:
+    """
+    データ管理サーバから取得したファイルをディスクに保持するキャッシュ。
+    ファイル本体と検証情報(ETag、Last-Modified、MDTM/SIZE等)を保持し、
+    合計サイズが上限を超えた場合は最後に参照された時刻が古いものから削除する。
+    同じディレクトリを使用するキャッシュは、全リクエストスレッドで1つのインスタンスを共有する。
+    """
+
+    # コンフィグ：キャッシュ設定(http.json、ftp.json)
+    __CONFIG_KEY_ORIGIN_CACHE = 'origin_cache'
+    __CONFIG_KEY_ENABLE = 'enable'
+    __CONFIG_KEY_DIRECTORY = 'directory'
+    __CONFIG_KEY_MAX_SIZE = 'max_size'
+    __CONFIG_KEY_TTL = 'ttl'
+    __CONFIG_KEY_TTL_RULES = 'ttl_rules'
+    __CONFIG_KEY_TTL_RULE_URL = 'url'
+
+    __DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+    __DEFAULT_TTL = 0
+
+    __CHUNK_SIZE = 64 * 1024
+    __BODY_SUFFIX = '.body'
+    __META_SUFFIX = '.json'
+    __TEMP_PREFIX = 'tmp-'
+
+    # ディレクトリ毎のキャッシュ
+    __caches = {}
+    __caches_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict, default_directory: str):
+        """
+        コンフィグファイルの内容からキャッシュを取得する。
+        キャッシュが有効でない場合、またはキャッシュ用ディレクトリが使用できない場合はNoneを返却する。
+
+        Args:
+            config dict : コンフィグファイル(http.json、ftp.json)の内容
+            default_directory str : キャッシュ用ディレクトリが設定されていない場合に使用するディレクトリ
+
+        Returns:
+            OriginCache : キャッシュ 無効な場合はNone
+        """
+
+        try:
+            cache_config = config.get(cls.__CONFIG_KEY_ORIGIN_CACHE)
+            if not cache_config or not cache_config.get(cls.__CONFIG_KEY_ENABLE, False):
+                return None
+
+            directory = cache_config.get(
+                cls.__CONFIG_KEY_DIRECTORY, default_directory)
+            max_size = int(cache_config.get(
+                cls.__CONFIG_KEY_MAX_SIZE, cls.__DEFAULT_MAX_SIZE))
+            default_ttl = float(cache_config.get(
+                cls.__CONFIG_KEY_TTL, cls.__DEFAULT_TTL))
+            ttl_rules = [
+                (rule[cls.__CONFIG_KEY_TTL_RULE_URL], float(rule[cls.__CONFIG_KEY_TTL]))
+                for rule in cache_config.get(cls.__CONFIG_KEY_TTL_RULES, [])]
+
+            with cls.__caches_lock:
+                cache = cls.__caches.get(directory)
+                if cache is None:
+                    cache = cls(directory, max_size)
+                    cls.__caches[directory] = cache
+
+        except Exception as e:
+            logger.warning('オリジンキャッシュを使用できません。' + str(e))
+            return None
+
+        cache.__max_size = max_size
+        cache.__default_ttl = default_ttl
+        cache.__ttl_rules = ttl_rules
+
+        return cache
+
+    @staticmethod
+    def make_key(*key_items) -> str:
+        """
+        キャッシュのキーを作成する。
+
+        Args:
+            key_items : キャッシュを識別する情報(リソースURL、リクエストヘッダ、認証ID等)
+
+        Returns:
+            str : キャッシュのキー
+        """
+
+        key_source = json.dumps(key_items, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def __init__(self, directory: str, max_size: int = None):
+        """
+        コンストラクタ
+        キャッシュ用ディレクトリに残っているキャッシュを読み込み、作成途中のファイルは削除する。
+
+        Args:
+            directory str : キャッシュ用ディレクトリ
+            max_size int : キャッシュの合計サイズの上限(バイト) 未指定の場合はデフォルト値
+        """
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__max_size = max_size if max_size else self.__DEFAULT_MAX_SIZE
+        self.__default_ttl = self.__DEFAULT_TTL
+        self.__ttl_rules = []
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        self.__total_size = 0
+
+        self.__load()
+
+    def get_ttl(self, resource_url: str):
+        """
+        リソースURLに適用するキャッシュの有効期間を取得する。
+        有効期間の設定はリソースURLに前方一致する最初の設定を使用し、該当する設定がない場合はデフォルト値を使用する。
+
+        Args:
+            resource_url str : リソースURL
+
+        Returns:
+            float : 有効期間(秒) 有効期間が負の値の場合(キャッシュしない場合)はNone
+        """
+
+        ttl = self.__default_ttl
+        for rule_url, rule_ttl in self.__ttl_rules:
+            if resource_url.startswith(rule_url):
+                ttl = rule_ttl
+                break
+
+        if ttl < 0:
+            return None
+
+        return ttl
+
+    def lookup(self, key: str):
+        """
+        キャッシュの情報を取得する。
+
+        Args:
+            key str : キャッシュのキー
+
+        Returns:
+            dict : キャッシュの情報 {'validators': 検証情報, 'validated_at': 最終検証時刻} キャッシュがない場合はNone
+        """
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            return dict(entry)
+
+    def is_fresh(self, entry: dict, ttl: float) -> bool:
+        """
+        キャッシュが有効期間内であるか否かを返却する。
+
+        Args:
+            entry dict : lookupで取得したキャッシュの情報
+            ttl float : 有効期間(秒)
+
+        Returns:
+            bool : 有効期間内の場合True
+        """
+
+        return time.time() - entry['validated_at'] < ttl
+
+    def open(self, key: str):
+        """
+        キャッシュしたファイルをチャンク単位で返却するイテレータを取得する。
+
+        Args:
+            key str : キャッシュのキー
+
+        Returns:
+            ChunkStream : キャッシュしたファイルのイテレータ キャッシュがない場合はNone
+        """
+
+        with self.__lock:
+            if key not in self.__entries:
+                return None
+            self.__entries.move_to_end(key)
+
+        try:
+            body_file = open(self.__body_path(key), 'rb')
+        except OSError:
+            self.remove(key)
+            return None
+
+        return ChunkStream(
+            iter(lambda: body_file.read(self.__CHUNK_SIZE), b''), body_file.close)
+
+    def revalidated(self, key: str):
+        """
+        データ管理サーバへの確認でキャッシュが最新であった場合に、最終検証時刻を更新する。
+
+        Args:
+            key str : キャッシュのキー
+        """
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return
+            entry['validated_at'] = time.time()
+            entry = dict(entry)
+
+        try:
+            self.__write_meta(key, entry)
+        except OSError as e:
+            logger.warning('オリジンキャッシュの更新に失敗しました。' + str(e))
+
+    def store(self, key: str, chunks: ChunkStream, validators: dict) -> ChunkStream:
+        """
+        取得データを返却しながらキャッシュ用の一時ファイルに書き込み、最後まで返却した時点でキャッシュに登録する。
+        途中でcloseされた場合、書き込みに失敗した場合、サイズが上限を超えた場合はキャッシュに登録しない。
+
+        Args:
+            key str : キャッシュのキー
+            chunks ChunkStream : 取得データ
+            validators dict : 検証情報
+
+        Returns:
+            ChunkStream : 取得データのイテレータ
+        """
+
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                prefix=self.__TEMP_PREFIX, dir=self.__directory)
+            temp_file = os.fdopen(fd, 'wb')
+        except OSError as e:
+            logger.warning('オリジンキャッシュの作成に失敗しました。' + str(e))
+            return chunks
+
+        state = {'file': temp_file, 'size': 0}
+
+        def discard():
+            if state['file'] is None:
+                return
+            state['file'].close()
+            state['file'] = None
+            self.__unlink(temp_path)
+
+        def write_chunks():
+            for chunk in chunks:
+                if state['file'] is not None:
+                    try:
+                        state['file'].write(chunk)
+                        state['size'] += len(chunk)
+                        if self.__max_size < state['size']:
+                            discard()
+                    except OSError as e:
+                        logger.warning('オリジンキャッシュの作成に失敗しました。' + str(e))
+                        discard()
+                yield chunk
+
+            if state['file'] is not None:
+                try:
+                    state['file'].close()
+                    state['file'] = None
+                    self.__commit(key, temp_path, state['size'], validators)
+                except OSError as e:
+                    logger.warning('オリジンキャッシュの作成に失敗しました。' + str(e))
+                    self.__unlink(temp_path)
+
+        def release():
+            discard()
+            chunks.close()
+
+        return ChunkStream(write_chunks(), release)
+
+    def remove(self, key: str):
+        """
+        キャッシュを削除する。
+
+        Args:
+            key str : キャッシュのキー
+        """
+
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is not None:
+                self.__total_size -= entry['size']
+
+        if entry is not None:
+            self.__unlink(self.__body_path(key))
+            self.__unlink(self.__meta_path(key))
+
+    def __commit(self, key: str, temp_path: str, size: int, validators: dict):
+        """
+        書き込みが完了した一時ファイルをキャッシュに登録し、合計サイズが上限を超えた場合は古いキャッシュを削除する。
+        """
+
+        entry = {
+            'size': size,
+            'validators': validators,
+            'validated_at': time.time()
+        }
+        os.replace(temp_path, self.__body_path(key))
+        self.__write_meta(key, entry)
+
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__total_size -= previous['size']
+            self.__entries[key] = entry
+            self.__total_size += size
+
+        self.__evict()
+
+    def __evict(self):
+        """
+        合計サイズが上限以下になるまで、最後に参照された時刻が古いキャッシュを削除する。
+        """
+
+        evicted_keys = []
+        with self.__lock:
+            while self.__entries and self.__max_size < self.__total_size:
+                key, entry = self.__entries.popitem(last=False)
+                self.__total_size -= entry['size']
+                evicted_keys.append(key)
+
+        for key in evicted_keys:
+            self.__unlink(self.__body_path(key))
+            self.__unlink(self.__meta_path(key))
+
+    def __load(self):
+        """
+        キャッシュ用ディレクトリに残っているキャッシュを読み込む。
+        検証情報とファイル本体が揃っていないもの、作成途中の一時ファイルは削除する。
+        """
+
+        loaded = []
+        for file_name in os.listdir(self.__directory):
+            path = os.path.join(self.__directory, file_name)
+            if file_name.startswith(self.__TEMP_PREFIX):
+                self.__unlink(path)
+                continue
+            if not file_name.endswith(self.__META_SUFFIX):
+                continue
+
+            key = file_name[:-len(self.__META_SUFFIX)]
+            try:
+                with open(path, 'r') as meta_file:
+                    entry = json.load(meta_file)
+                if os.path.getsize(self.__body_path(key)) != entry['size']:
+                    raise ValueError(key)
+                loaded.append((entry['validated_at'], key, entry))
+            except Exception:
+                self.__unlink(path)
+                self.__unlink(self.__body_path(key))
+
+        for file_name in os.listdir(self.__directory):
+            if file_name.endswith(self.__BODY_SUFFIX) and \
+                    not os.path.exists(self.__meta_path(file_name[:-len(self.__BODY_SUFFIX)])):
+                self.__unlink(os.path.join(self.__directory, file_name))
+
+        for _, key, entry in sorted(loaded, key=lambda e: e[0]):
+            self.__entries[key] = entry
+            self.__total_size += entry['size']
+
+        self.__evict()
+
+    def __write_meta(self, key: str, entry: dict):
+        fd, temp_path = tempfile.mkstemp(
+            prefix=self.__TEMP_PREFIX, dir=self.__directory)
+        try:
+            with os.fdopen(fd, 'w') as meta_file:
+                json.dump(entry, meta_file)
+            os.replace(temp_path, self.__meta_path(key))
+        except OSError:
+            self.__unlink(temp_path)
+            raise
+
+    def __body_path(self, key: str) -> str:
+        return os.path.join(self.__directory, key + self.__BODY_SUFFIX)
+
+    def __meta_path(self, key: str) -> str:
+        return os.path.join(self.__directory, key + self.__META_SUFFIX)
+
+    def __unlink(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
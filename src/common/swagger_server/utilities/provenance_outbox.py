@@ -0,0 +1,345 @@
+﻿# -*- coding: utf-8 -*-
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from logging import getLogger
+from typing import Callable
+
+logger = getLogger(__name__)
+
+
+class ProvenanceOutbox:
+    """
+    来歴管理I/Fへの履歴登録を、ローカルのSQLiteに保存してから非同期に送信するキュー。
+    登録要求は保存した時点で事前に払い出したローカル識別子を返却し、バックグラウンドのスレッドが
+    送信に失敗したものを指数的に間隔を空けて再送する。
+    保存したトークンが来歴管理I/Fに拒否された場合(401、403)は、再送しても成功しないため再送回数を消費せずに送信を中止する。
+    キューの滞留数と最古の未送信イベントの経過時間は、metrics_interval毎にJSON形式でログに出力する。
+    同じファイルを使用するキューは、全リクエストスレッドで1つのインスタンスを共有する。
+    """
+
+    # コンフィグ：アウトボックス設定(provenance.json)
+    __CONFIG_KEY_OUTBOX = 'outbox'
+    __CONFIG_KEY_ENABLE = 'enable'
+    __CONFIG_KEY_PATH = 'path'
+    __CONFIG_KEY_MAX_ATTEMPTS = 'max_attempts'
+    __CONFIG_KEY_RETRY_BASE_INTERVAL = 'retry_base_interval'
+    __CONFIG_KEY_RETRY_MAX_INTERVAL = 'retry_max_interval'
+    __CONFIG_KEY_METRICS_INTERVAL = 'metrics_interval'
+    __CONFIG_KEY_RETENTION = 'retention'
+
+    __DEFAULT_MAX_ATTEMPTS = 20
+    __DEFAULT_RETRY_BASE_INTERVAL = 1
+    __DEFAULT_RETRY_MAX_INTERVAL = 300
+    __DEFAULT_METRICS_INTERVAL = 60
+    __DEFAULT_RETENTION = 7 * 24 * 60 * 60
+
+    # 1回の処理で送信するイベント数
+    __BATCH_SIZE = 100
+
+    __STATUS_PENDING = 'pending'
+    __STATUS_SENT = 'sent'
+    __STATUS_FAILED = 'failed'
+    __STATUS_UNAUTHORIZED = 'unauthorized'
+
+    # 保存したトークンが拒否されたとみなすステータスコード
+    __UNAUTHORIZED_STATUS_CODES = (401, 403)
+
+    __SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS outbox ('
+        'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+        'local_id TEXT NOT NULL UNIQUE, '
+        'url TEXT NOT NULL, '
+        'headers TEXT NOT NULL, '
+        'body BLOB NOT NULL, '
+        'status TEXT NOT NULL, '
+        'attempts INTEGER NOT NULL DEFAULT 0, '
+        'created_at REAL NOT NULL, '
+        'next_attempt_at REAL NOT NULL, '
+        'event_id TEXT, '
+        'last_error TEXT)')
+    __INDEX = 'CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, next_attempt_at)'
+
+    # ファイル毎のキュー
+    __outboxes = {}
+    __outboxes_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict, default_path: str, send: Callable):
+        """
+        コンフィグファイルの内容からキューを取得する。初回は送信スレッドを開始する。
+        アウトボックスが有効でない場合、またはファイルが使用できない場合はNoneを返却する。
+
+        Args:
+            config dict : コンフィグファイル(provenance.json)の内容
+            default_path str : ファイルのパスが設定されていない場合に使用するパス
+            send Callable : 送信処理 send(url, headers, body)で識別情報を返却し、失敗した場合は例外を送出する
+
+        Returns:
+            ProvenanceOutbox : キュー 無効な場合はNone
+        """
+
+        try:
+            outbox_config = config.get(cls.__CONFIG_KEY_OUTBOX)
+            if not outbox_config or not outbox_config.get(cls.__CONFIG_KEY_ENABLE, False):
+                return None
+
+            path = outbox_config.get(cls.__CONFIG_KEY_PATH, default_path)
+            settings = {
+                'max_attempts': int(outbox_config.get(
+                    cls.__CONFIG_KEY_MAX_ATTEMPTS, cls.__DEFAULT_MAX_ATTEMPTS)),
+                'retry_base_interval': float(outbox_config.get(
+                    cls.__CONFIG_KEY_RETRY_BASE_INTERVAL, cls.__DEFAULT_RETRY_BASE_INTERVAL)),
+                'retry_max_interval': float(outbox_config.get(
+                    cls.__CONFIG_KEY_RETRY_MAX_INTERVAL, cls.__DEFAULT_RETRY_MAX_INTERVAL)),
+                'metrics_interval': float(outbox_config.get(
+                    cls.__CONFIG_KEY_METRICS_INTERVAL, cls.__DEFAULT_METRICS_INTERVAL)),
+                'retention': float(outbox_config.get(
+                    cls.__CONFIG_KEY_RETENTION, cls.__DEFAULT_RETENTION))
+            }
+
+            with cls.__outboxes_lock:
+                outbox = cls.__outboxes.get(path)
+                if outbox is None:
+                    outbox = cls(path, send)
+                    cls.__outboxes[path] = outbox
+                    outbox.__settings = settings
+                    outbox.__start()
+
+        except Exception as e:
+            logger.warning('来歴のアウトボックスを使用できません。' + str(e))
+            return None
+
+        outbox.__settings = settings
+
+        return outbox
+
+    def __init__(self, path: str, send: Callable):
+        """
+        コンストラクタ
+        ファイルがない場合は作成する。トークンを含むため、所有者のみ読み書きできる権限とする。
+
+        Args:
+            path str : SQLiteのファイルのパス
+            send Callable : 送信処理
+        """
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+
+        self.__path = path
+        self.__send = send
+        self.__settings = {}
+        self.__wakeup = threading.Event()
+        self.__sent_total = 0
+        self.__retry_total = 0
+        self.__failed_total = 0
+        self.__unauthorized_total = 0
+        self.__blocked_until = 0
+
+        with self.__connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(self.__SCHEMA)
+            connection.execute(self.__INDEX)
+
+    def enqueue(self, url: str, headers: dict, body: bytes) -> str:
+        """
+        履歴登録をキューに保存し、ローカル識別子を返却する。
+
+        Args:
+            url str : 送信先URL
+            headers dict : 送信時のヘッダ
+            body bytes : 送信するイベント
+
+        Returns:
+            str : ローカル識別子
+        """
+
+        local_id = str(uuid.uuid4())
+        now = time.time()
+
+        with self.__connect() as connection:
+            connection.execute(
+                'INSERT INTO outbox (local_id, url, headers, body, status, created_at, next_attempt_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (local_id, url, json.dumps(headers), body, self.__STATUS_PENDING, now, now))
+
+        self.__wakeup.set()
+
+        return local_id
+
+    @contextlib.contextmanager
+    def __connect(self):
+        """
+        SQLiteに接続し、処理が正常に終了した場合はコミット、例外が発生した場合はロールバックして切断する。
+        """
+
+        connection = sqlite3.connect(self.__path, timeout=30)
+        try:
+            connection.execute('PRAGMA synchronous=FULL')
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def __start(self):
+        threading.Thread(
+            target=self.__run, name='provenance_outbox', daemon=True).start()
+
+    def __run(self):
+        """
+        送信可能なイベントの送信、保持期間を過ぎた送信済みイベントの削除、メトリクスの出力を繰り返す。
+        """
+
+        next_metrics_at = time.monotonic()
+        while True:
+            self.__wakeup.clear()
+            wait_time = self.__settings['retry_max_interval']
+            try:
+                wait_time = self.__flush()
+            except Exception as e:
+                logger.warning('来歴のアウトボックスの送信処理に失敗しました。' + str(e))
+
+            if next_metrics_at <= time.monotonic():
+                try:
+                    self.__purge()
+                    self.__log_metrics()
+                except Exception as e:
+                    logger.warning('来歴のアウトボックスのメトリクス出力に失敗しました。' + str(e))
+                next_metrics_at = time.monotonic() + self.__settings['metrics_interval']
+
+            wait_time = min(wait_time, max(next_metrics_at - time.monotonic(), 0))
+            self.__wakeup.wait(wait_time)
+
+    def __flush(self) -> float:
+        """
+        送信時刻を迎えたイベントを登録順に送信する。
+        送信に失敗した場合は来歴管理I/Fが停止しているとみなし、そのイベントの再送時刻まで後続のイベントも送信しない。
+
+        Returns:
+            float : 次に送信を行うまでの時間(秒)
+        """
+
+        if time.time() < self.__blocked_until:
+            return self.__blocked_until - time.time()
+
+        while True:
+            now = time.time()
+            with self.__connect() as connection:
+                rows = connection.execute(
+                    'SELECT seq, url, headers, body, attempts FROM outbox '
+                    'WHERE status = ? AND next_attempt_at <= ? ORDER BY seq LIMIT ?',
+                    (self.__STATUS_PENDING, now, self.__BATCH_SIZE)).fetchall()
+
+            for seq, url, headers, body, attempts in rows:
+                retry_at = self.__send_one(seq, url, json.loads(headers), body, attempts)
+                if retry_at is not None:
+                    self.__blocked_until = retry_at
+                    return retry_at - time.time()
+
+            if len(rows) < self.__BATCH_SIZE:
+                break
+
+        with self.__connect() as connection:
+            next_attempt_at = connection.execute(
+                'SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?',
+                (self.__STATUS_PENDING,)).fetchone()[0]
+
+        if next_attempt_at is None:
+            return self.__settings['retry_max_interval']
+
+        return max(next_attempt_at - time.time(), 0)
+
+    def __send_one(self, seq: int, url: str, headers: dict, body: bytes, attempts: int) -> float:
+        """
+        イベントを1件送信し、結果を保存する。
+        失敗した場合は再送時刻を設定して返却し、max_attemptsに達した場合は送信を諦める。
+        トークンが拒否された場合は来歴管理I/Fは停止していないため、後続のイベントの送信は止めない。
+        """
+
+        attempts += 1
+        try:
+            event_id = self.__send(url, headers, body)
+        except Exception as e:
+            error = getattr(e, 'error_message', None) or str(e)
+            if getattr(e, 'http_status_code', None) in self.__UNAUTHORIZED_STATUS_CODES:
+                self.__unauthorized_total += 1
+                logger.warning('来歴の登録を中止しました(トークン拒否)。seq:' + str(seq) + ' ' + error)
+                with self.__connect() as connection:
+                    connection.execute(
+                        'UPDATE outbox SET status = ?, attempts = ?, last_error = ? WHERE seq = ?',
+                        (self.__STATUS_UNAUTHORIZED, attempts, error, seq))
+                return None
+
+            if self.__settings['max_attempts'] <= attempts:
+                status = self.__STATUS_FAILED
+                self.__failed_total += 1
+                logger.warning('来歴の登録を中止しました。seq:' + str(seq) + ' ' + error)
+            else:
+                status = self.__STATUS_PENDING
+                self.__retry_total += 1
+            interval = min(
+                self.__settings['retry_base_interval'] * (2 ** (attempts - 1)),
+                self.__settings['retry_max_interval'])
+            retry_at = time.time() + interval
+            with self.__connect() as connection:
+                connection.execute(
+                    'UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? '
+                    'WHERE seq = ?',
+                    (status, attempts, retry_at, error, seq))
+            return retry_at
+
+        self.__sent_total += 1
+        with self.__connect() as connection:
+            connection.execute(
+                'UPDATE outbox SET status = ?, attempts = ?, event_id = ?, last_error = NULL WHERE seq = ?',
+                (self.__STATUS_SENT, attempts, event_id, seq))
+
+        return None
+
+    def __purge(self):
+        """
+        保持期間を過ぎた送信済み、送信中止のイベントを削除する。
+        """
+
+        with self.__connect() as connection:
+            connection.execute(
+                'DELETE FROM outbox WHERE status != ? AND created_at < ?',
+                (self.__STATUS_PENDING, time.time() - self.__settings['retention']))
+
+    def __log_metrics(self):
+        """
+        キューの滞留数、最古の未送信イベントの経過時間、送信件数をJSON形式でログに出力する。
+        """
+
+        with self.__connect() as connection:
+            pending, oldest_created_at = connection.execute(
+                'SELECT COUNT(*), MIN(created_at) FROM outbox WHERE status = ?',
+                (self.__STATUS_PENDING,)).fetchone()
+            failed = connection.execute(
+                'SELECT COUNT(*) FROM outbox WHERE status = ?',
+                (self.__STATUS_FAILED,)).fetchone()[0]
+            unauthorized = connection.execute(
+                'SELECT COUNT(*) FROM outbox WHERE status = ?',
+                (self.__STATUS_UNAUTHORIZED,)).fetchone()[0]
+
+        log_message = {}
+        log_message['log_type'] = 'provenance_outbox'
+        log_message['timestamp'] = datetime.datetime.now().isoformat(timespec='microseconds')
+        log_message['pending'] = pending
+        log_message['failed'] = failed
+        log_message['unauthorized'] = unauthorized
+        log_message['lag'] = round(time.time() - oldest_created_at, 3) if oldest_created_at else 0
+        log_message['sent_total'] = self.__sent_total
+        log_message['retry_total'] = self.__retry_total
+        log_message['failed_total'] = self.__failed_total
+        log_message['unauthorized_total'] = self.__unauthorized_total
+        logger.info(json.dumps(log_message, ensure_ascii=False))
@@ -0,0 +1,106 @@
+﻿# -*- coding: utf-8 -*-
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    有効期限付きのキャッシュ。
+    エントリ数が上限を超えた場合は、最後に参照された時刻が古いものから削除する。
+    複数のリクエストスレッドから同時に使用できる。
+    """
+
+    def __init__(self, max_size: int):
+        """
+        コンストラクタ
+
+        Args:
+            max_size int : 保持するエントリ数の上限
+        """
+
+        self.__max_size = max_size
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*key_items) -> str:
+        """
+        トークン等の秘匿情報をそのまま保持しないよう、キーをハッシュ値に変換する。
+
+        Args:
+            key_items : キーとする値(str)
+
+        Returns:
+            str : キャッシュのキー
+        """
+
+        hash_object = hashlib.sha256()
+        for key_item in key_items:
+            hash_object.update(str(key_item).encode('utf-8'))
+            hash_object.update(b'\0')
+
+        return hash_object.hexdigest()
+
+    def get(self, key: str):
+        """
+        キャッシュした値を取得する。有効期限を過ぎている場合は削除する。
+
+        Args:
+            key str : キャッシュのキー
+
+        Returns:
+            キャッシュした値 キャッシュがない場合、有効期限を過ぎている場合はNone
+        """
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+
+            expire_at, value = entry
+            if expire_at <= time.monotonic():
+                del self.__entries[key]
+                return None
+
+            self.__entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        """
+        値をキャッシュする。有効期間が0以下の場合はキャッシュしない。
+
+        Args:
+            key str : キャッシュのキー
+            value : キャッシュする値
+            ttl float : 有効期間(秒)
+        """
+
+        if ttl <= 0:
+            return
+
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + ttl, value)
+            self.__entries.move_to_end(key)
+            while self.__max_size < len(self.__entries):
+                self.__entries.popitem(last=False)
+
+    def delete(self, key: str):
+        """
+        キャッシュを削除する。
+
+        Args:
+            key str : キャッシュのキー
+        """
+
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        """
+        全てのキャッシュを削除する。
+        """
+
+        with self.__lock:
+            self.__entries.clear()
@@ -1,13 +1,33 @@
 ﻿# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import json
+import time
+from typing import Callable
 
 from flask import Response
 
+from .external_interface import ChunkStream
+
 __LOG_MESSAGE_REPLACE_STR = '設定なし'
 __URL_SPLIT_CHR = '/'
 
 __FILE_NAME_RETENTION_ATTRIBUTE = 'Content-Disposition'
 __FILE_NAME_ATTRIBUTE = 'filename='
 
+# レスポンスヘッダのうち、接続先との接続に関するもので呼び出し元に返却しないもの(RFC 7230 6.1)
+# 返却時の転送方式(Transfer-Encoding等)は返却するサーバ(Werkzeug)が設定する
+__HOP_BY_HOP_HEADERS = [
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailer',
+    'transfer-encoding',
+    'upgrade'
+]
+
 
 def log_message_none_parameter_replace(target_str: str) -> str:
     """
@@ -56,3 +76,75 @@ def get_url_file_name(url: str) -> str:
     """
 
     return url.split(__URL_SPLIT_CHR)[-1]
+
+
+def remove_hop_by_hop_headers(headers) -> dict:
+    """
+    接続先から受信したレスポンスヘッダから、接続に関するヘッダを除いて返却する。
+    Connectionヘッダに列挙されたヘッダも除く。
+
+    Args:
+        headers : 接続先から受信したレスポンスヘッダ
+
+    Returns:
+        dict: 呼び出し元に返却するレスポンスヘッダ
+    """
+
+    hop_by_hop_headers = set(__HOP_BY_HOP_HEADERS)
+    for key, value in headers.items():
+        if key.lower() == 'connection':
+            hop_by_hop_headers.update(
+                name.strip().lower() for name in value.split(',') if name.strip())
+
+    return {key: value for key, value in headers.items()
+            if key.lower() not in hop_by_hop_headers}
+
+
+def hash_chunk_stream(
+        response_stream: ChunkStream,
+        on_complete: Callable[[str], None]) -> ChunkStream:
+    """
+    取得データをチャンク単位で返却しながら、SHA-512のハッシュ値を逐次算出する。
+    全てのチャンクを返却した時点で、ハッシュ値(16進文字列)を引数にon_completeを呼び出す。
+    途中でcloseされた場合はon_completeを呼び出さない。
+
+    Args:
+        response_stream ChunkStream : 取得データ
+        on_complete Callable : ハッシュ値算出後に呼び出す処理
+
+    Returns:
+        ChunkStream: ハッシュ値を算出しながら取得データを返却するイテレータ
+    """
+
+    def hash_chunks():
+        hash_object = hashlib.sha512()
+        for chunk in response_stream:
+            hash_object.update(chunk)
+            yield chunk
+        on_complete(hash_object.hexdigest())
+
+    return ChunkStream(hash_chunks(), response_stream.close)
+
+
+def get_token_remaining_time(token: str, skew: float = 0) -> float:
+    """
+    JWT形式のトークンのペイロードからexpを取得し、有効期限までの残り時間を返却する。
+    署名の検証は行わないため、キャッシュの有効期間の算出にのみ使用すること。
+
+    Args:
+        token str : トークン 先頭に'Bearer 'が付与されていてもよい
+        skew float : 有効期限から差し引く時間(秒)
+
+    Returns:
+        float : 有効期限までの残り時間(秒) expが取得できない場合は0
+    """
+
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        payload = token.split('.')[1]
+        payload_dict = json.loads(base64.urlsafe_b64decode(
+            payload + '=' * (-len(payload) % 4)).decode())
+        return float(payload_dict['exp']) - skew - time.time()
+    except Exception:
+        return 0
@@ -5,13 +5,30 @@ import base64
 from swagger_server.utilities.cadde_exception import CaddeException
 from swagger_server.utilities.external_interface import ExternalInterface
 from swagger_server.utilities.internal_interface import InternalInterface
+from swagger_server.utilities.jwt_verifier import JwtVerifier, JwtVerificationError
+from swagger_server.utilities.ttl_cache import TTLCache
+from swagger_server.utilities.utilities import get_token_remaining_time
 
 
 __CONFIG_AUTHENTICATION_FILE_PATH = '/usr/src/app/swagger_server/configs/authentication.json'
 __CONFIG_AUTHENTICATION_SERVER_URL = 'authentication_server_url'
+__CONFIG_LOCAL_VERIFICATION = 'local_verification'
+__CONFIG_CONSUMER_ID_CLAIM = 'consumer_id_claim'
+
+# ローカル検証したトークンからCADDEユーザID(利用者)を取得するクレーム(consumer_id_claimを省略した場合)
+# 認証サーバ(Keycloak)はCADDEユーザIDをユーザ名として管理しており、認証トークン検証のuser_idはpreferred_usernameと同じ値となる
+__DEFAULT_TOKEN_CLAIM_CONSUMER_ID = 'preferred_username'
 
 __CADDE_INTROSPECT = '/cadde/api/v4/token/introspect'
 
+# 認証トークン検証結果のキャッシュ
+# (利用者トークン, 利用者コネクタID, 利用者コネクタのシークレット)毎のCADDEユーザID(利用者)を、
+# 利用者トークンの有効期限(expから差し引く時間を除く)と保持時間の上限の早い方まで保持する
+__INTROSPECT_CACHE_MAX_SIZE = 1000
+__INTROSPECT_CACHE_MAX_TTL = 60
+__INTROSPECT_CACHE_EXPIRE_SKEW = 30
+__INTROSPECT_CACHE = TTLCache(__INTROSPECT_CACHE_MAX_SIZE)
+
 
 def token_introspect_execute(
         authorization: str,
@@ -21,6 +38,9 @@ def token_introspect_execute(
         external_interface: ExternalInterface = ExternalInterface()) -> str:
     """
     認証トークン検証を行い、CADDEユーザID(利用者)を返す。
+    検証に成功した結果は利用者トークンの有効期限内でキャッシュし、同じトークンでの検証には認証サーバへ問い合わせずに返却する。
+    authentication.jsonでローカル検証が有効な場合は、発行者の公開鍵で検証し、ローカルで判定できない場合のみ認証サーバに問い合わせる。
+    ローカル検証では認証サーバでの利用者コネクタID、シークレットの確認は行わない。
 
     Args:
         authorization str : 利用者トークン
@@ -35,11 +55,28 @@ def token_introspect_execute(
     Raises:
         Cadde_excption : ステータスコード2xxでない場合 エラーコード : 020402002E
         Cadde_excption : 利用者トークンが有効でなかった場合 エラーコード : 020402003E
-        Cadde_excption : 利用者トークンが有効でなかった場合 エラーコード : 020402004E
+        Cadde_excption : ローカル検証で利用者トークンが有効でなかった場合 エラーコード : 020402004E
         Cadde_excption : 利用者トークンが有効でなかった場合 エラーコード : 020402005E
 
     """
 
+    cache_key = TTLCache.make_key(
+        authorization, consumer_connector_id, consumer_connector_secret)
+    consumer_id = __INTROSPECT_CACHE.get(cache_key)
+    if consumer_id is not None:
+        return consumer_id
+
+    ttl = min(
+        __INTROSPECT_CACHE_MAX_TTL,
+        get_token_remaining_time(authorization, __INTROSPECT_CACHE_EXPIRE_SKEW))
+
+    # ローカル検証
+    consumer_id = __verify_token_locally(
+        authorization, internal_interface, external_interface)
+    if consumer_id is not None:
+        __INTROSPECT_CACHE.set(cache_key, consumer_id, ttl)
+        return consumer_id
+
     # コンフィグファイルから認証サーバのURL取得
     authentication_server_url = __get_authentication_url(authorization[7:])
 
@@ -78,9 +115,54 @@ def token_introspect_execute(
 
     consumer_id = response_text_dict['user_id']
 
+    __INTROSPECT_CACHE.set(cache_key, consumer_id, ttl)
+
     return consumer_id
 
 
+def __verify_token_locally(authorization, internal_interface, external_interface) -> str:
+    """
+    authentication.jsonでローカル検証が有効な場合、利用者トークンを発行者の公開鍵で検証し、CADDEユーザID(利用者)を返す。
+    CADDEユーザID(利用者)は、consumer_id_claimに設定したクレーム(省略時はpreferred_username)から取得する。
+
+    Args:
+        authorization str : 利用者トークン
+        internal_interface : 内部リクエストを行うインタフェース
+        external_interface : 外部リクエストを行うインタフェース
+
+    Returns:
+        str : CADDEユーザID(利用者) ローカル検証を行わない場合、ローカルで判定できない場合はNone
+
+    Raises:
+        Cadde_excption : 利用者トークンが有効でなかった場合 エラーコード : 020402004E
+
+    """
+
+    try:
+        authentication_config = internal_interface.config_read(
+            __CONFIG_AUTHENTICATION_FILE_PATH)
+    except Exception:
+        return None
+
+    verifier = JwtVerifier.from_config(authentication_config)
+    if verifier is None:
+        return None
+
+    try:
+        payload = verifier.verify(authorization, external_interface)
+    except JwtVerificationError as e:
+        raise CaddeException(
+            message_id='020402004E',
+            replace_str_list=[str(e)])
+
+    consumer_id_claim = authentication_config[__CONFIG_LOCAL_VERIFICATION].get(
+        __CONFIG_CONSUMER_ID_CLAIM, __DEFAULT_TOKEN_CLAIM_CONSUMER_ID)
+    if payload is None or not payload.get(consumer_id_claim):
+        return None
+
+    return payload[consumer_id_claim]
+
+
 def __get_authentication_url(target_token) -> (str):
     """
     リクエストパラメータのトークンをデコードし、issに記載されているURLから認証サーバのURLを取得する
@@ -2,7 +2,7 @@ import connexion
 
 import re
 import urllib
-from flask import make_response
+from flask import Response
 from logging import getLogger
 
 from swagger_server.services.service import fetch_data
@@ -142,7 +142,8 @@ def retrieve_entity():
         raise
 
     # flaskレスポンスを生成して返却する
-    response = make_response(data.read(), 200)
+    # 取得データはチャンク単位で逐次送信する
+    response = Response(response=data, status=200)
     response.headers = headers
     response.headers['X-Content-Type-Options'] = 'nosniff'
     response.headers['X-XSS-Protection'] = '1; mode=block'
@@ -1,5 +1,5 @@
 import connexion
-from flask import make_response
+from flask import Response
 import logging
 
 from swagger_server.utilities.message_map import get_message
@@ -59,7 +59,8 @@ def files(authorization=None, resource_url=None, resource_api_type=None, provide
         None,
         external_interface)
 
-    response = make_response(data.read(), 200)
+    # 取得データはチャンク単位で逐次送信する
+    response = Response(response=data, status=200)
     response.headers = headers
     response.headers['Content-Disposition'] = 'attachment; filename=' + \
         get_url_file_name(resource_url)
@@ -1,14 +1,18 @@
 ﻿# -*- coding: utf-8 -*-
 import datetime
+import functools
 import json
 import logging
-import hashlib
-from io import BytesIO
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from flask import Response
 
 from swagger_server.utilities.cadde_exception import CaddeException
-from swagger_server.utilities.external_interface import ExternalInterface
+from swagger_server.utilities.external_interface import ExternalInterface, ChunkStream
 from swagger_server.utilities.internal_interface import InternalInterface
+from swagger_server.utilities.utilities import hash_chunk_stream, remove_hop_by_hop_headers
 from swagger_server.services.provide_data_ngsi import provide_data_ngsi
 from swagger_server.services.provide_data_ftp import provide_data_ftp
 from swagger_server.services.provide_data_http import provide_data_http
@@ -30,6 +34,21 @@ __CONFIG_LOCATION_SERVICE_URL = 'location_service_url'
 __CONFIG_PROVIDER_CONNECTOR_URL = 'provider_connector_url'
 __LOCATION_SERVICE_PROVIDER_CONNECTOR_URL = 'provider_connector_url'
 
+# ロケーションサービスの問い合わせ結果のキャッシュ
+# {(ロケーションサービスのURL, CADDEユーザID（提供者）): (問い合わせ時刻, 提供者コネクタのアクセスURL)}
+# 提供者コネクタのアクセスURLが空文字の場合は、ロケーションサービスに登録がない(または問い合わせに失敗した)ことを示す
+# 保持時間を過ぎたアクセスURLは、STALE_TTLの間はそのまま返却し、バックグラウンドで再問い合わせする
+__LOCATION_CACHE_TTL = 300
+__LOCATION_CACHE_NEGATIVE_TTL = 30
+__LOCATION_CACHE_STALE_TTL = 3600
+__LOCATION_CACHE_MAX_SIZE = 1000
+__LOCATION_CACHE = OrderedDict()
+__LOCATION_CACHE_LOCK = threading.Lock()
+__LOCATION_REFRESHING = set()
+
+# location.jsonの内容毎のCADDEユーザID（提供者）と提供者コネクタのアクセスURLの対応 (コンフィグファイルの内容, {CADDEユーザID（提供者）: アクセスURL})
+__LOCATION_CONFIG_MAP_CACHE = [None, {}]
+
 
 __ACCESS_POINT_URL_SEARCH = 'http://consumer_catalog_search:8080/cadde/api/v4/catalog'
 __ACCESS_POINT_URL_FILE = 'http://consumer_data_exchange:8080/cadde/api/v4/file'
@@ -38,6 +57,16 @@ __ACCESS_POINT_URL_PROVENANCE_MANAGEMENT_CALL_VOUCHER = 'http://consumer_provena
 __ACCESS_POINT_URL_PROVENANCE_MANAGEMENT_CALL_RECEIVED = ('http://consumer_provenance_management:8080/'
                                                           'eventwithhash/received')
 
+# 取得データの送信完了後にデータ証憑通知(受信)を行うスレッド
+# 送信待ち(送信中を含む)の最大数、送信完了から通知を開始するまでの期限(秒)
+# 上限を超えた、または期限を過ぎたデータ証憑通知は行わず、再通知できるよう内容をログに出力する
+__VOUCHER_MAX_WORKERS = 4
+__VOUCHER_MAX_QUEUE_SIZE = 1000
+__VOUCHER_DEADLINE = 300
+__VOUCHER_EXECUTOR = ThreadPoolExecutor(
+    max_workers=__VOUCHER_MAX_WORKERS, thread_name_prefix='voucher_received')
+__VOUCHER_SLOTS = threading.BoundedSemaphore(__VOUCHER_MAX_QUEUE_SIZE)
+
 
 def catalog_search(
         query_string: str,
@@ -144,10 +173,11 @@ def fetch_data(authorization: str,
                resource_api_type: str,
                provider: str,
                options: dict,
-               external_interface: ExternalInterface = ExternalInterface()) -> (BytesIO,
+               external_interface: ExternalInterface = ExternalInterface()) -> (ChunkStream,
                                                                                 dict):
     """
     データ交換I/Fからデータを取得する、もしくはデータ管理から直接データを取得する。
+    取得データは受信したチャンクを逐次返却するイテレータとし、ファイル全体をメモリに保持しない。
 
     Args:
         resource_url str : リソースURL
@@ -158,7 +188,7 @@ def fetch_data(authorization: str,
         external_interface ExternalInterface : GETリクエストを行うインタフェース
 
     Returns:
-        BytesIO :取得データ
+        ChunkStream :取得データ
         dict: レスポンスヘッダ情報 key:ヘッダ名 value:パラメータ レスポンスヘッダがない場合は空のdictを返す
 
     Raises:
@@ -168,7 +198,6 @@ def fetch_data(authorization: str,
         Cadde_excption: データ提供IFが使用するカスタムヘッダーの変換に失敗した場合           エラーコード: 020004004E
         Cadde_excption: データ交換I/Fのデータ交換の呼び出し時に、エラーが発生した場合        エラーコード: 020004005E
         Cadde_excption: データ証憑通知(受信)時にCADDEユーザID（利用者）が空の場合            エラーコード: 020004006E
-        Cadde_excption: 来歴管理I/F データ証憑通知(受信)API呼び出し時にエラーが発生した場合  エラーコード: 020004007E
         Cadde_excption: 受信履歴登録時にCADDEユーザID（利用者）が空の場合                    エラーコード: 020004008E
         Cadde_excption: 来歴管理I/F 受信履歴登録（来歴）API呼び出し時にエラーが発生した場合  エラーコード: 020004009E
 
@@ -200,7 +229,7 @@ def fetch_data(authorization: str,
 
         consumer_id = token_introspect_response.headers['x-cadde-consumer-id']
 
-    response_bytes = None
+    response_stream = None
     response_headers = {
         'x-cadde-provenance': '',
         'x-cadde-contract-id': '',
@@ -212,20 +241,20 @@ def fetch_data(authorization: str,
     # CADDEユーザID（提供者）なし
     if not provider:
         if resource_api_type == 'api/ngsi':
-            response_bytes, ngsi_response_headers = provide_data_ngsi(
-                resource_url, options)
+            response_stream, ngsi_response_headers = provide_data_ngsi(
+                resource_url, options, stream=True, external_interface=external_interface)
             header_arry = ngsi_response_headers.keys()
             for key_data in header_arry:
                 response_headers[key_data] = ngsi_response_headers[key_data]
         elif resource_api_type == 'file/ftp':
-            response_bytes = provide_data_ftp(
-                resource_url, external_interface, internal_interface)
+            response_stream = provide_data_ftp(
+                resource_url, external_interface, internal_interface, stream=True)
 
         elif resource_api_type == 'file/http':
-            response_bytes = provide_data_http(
-                resource_url, options, external_interface, internal_interface)
+            response_stream = provide_data_http(
+                resource_url, options, external_interface, internal_interface, stream=True)
 
-        return response_bytes, response_headers
+        return response_stream, response_headers
 
     # CADDEユーザID（提供者）あり
     else:
@@ -252,8 +281,9 @@ def fetch_data(authorization: str,
         }
 
         # データ取得実行
+        # ボディは読み込まず、チャンク単位で逐次返却する
         response = external_interface.http_get(
-            __ACCESS_POINT_URL_FILE, headers_dict)
+            __ACCESS_POINT_URL_FILE, headers_dict, stream=True)
         if response.status_code < 200 or 300 <= response.status_code:
             raise CaddeException(
                 '020004005E',
@@ -261,75 +291,18 @@ def fetch_data(authorization: str,
                 replace_str_list=[
                     response.text])
 
-        response_bytes = BytesIO(response.content)
-        response_headers = dict(response.headers)
-        response_data = response_bytes.read()
-        response_bytes.seek(0)
-
-        # レスポンスヘッダからデータを取得
-        provenance_id = ''
-        provenance_id = response_headers['x-cadde-provenance']
-        provenance_url = ''
-        provenance_url = response_headers['x-cadde-provenance-management-service-url']
-        contract_id = ''
-        contract_id = response_headers['x-cadde-contract-id']
-        contract_url = ''
-        contract_url = response_headers['x-cadde-contract-management-service-url']
-
-        # 来歴管理：データ証憑通知(受信)
-        # 契約している場合（戻り値に取引ID、契約管理サービスURLが設定されている場合）に行う
-        if contract_id and contract_url:
-            # 認証あり（consumer_id有効）の場合に行う
-            if consumer_id is None:
-                raise CaddeException('020004006E')
-            # ハッシュ値算出
-            hash_value = hashlib.sha512(response_data).hexdigest()
-
-            sent_headers = {
-                'x-cadde-provider': provider,
-                'x-cadde-consumer': consumer_id,
-                'x-cadde-contract-id': contract_id,
-                'x-cadde-hash-get-data': hash_value,
-                'x-cadde-contract-management-service-url': contract_url,
-                'Authorization': authorization
-            }
-
-            sent_response = external_interface.http_post(
-                __ACCESS_POINT_URL_PROVENANCE_MANAGEMENT_CALL_VOUCHER, sent_headers)
-
-            if sent_response.status_code < 200 or 300 <= sent_response.status_code:
-                raise CaddeException(
-                    message_id='020004007E',
-                    status_code=sent_response.status_code,
-                    replace_str_list=[
-                        sent_response.text])
-
-        # 来歴管理：受信履歴登録
-        # 交換実績記録用リソースIDあり、かつ、認証あり（consumer_id有効）
-        if provenance_id != '':
-            if consumer_id is None:
-                raise CaddeException('020004008E')
-
-            received_headers = {
-                'x-cadde-provider': provider,
-                'x-cadde-consumer': consumer_id,
-                'x-cadde-resource-id-for-provenance': provenance_id,
-                'x-cadde-provenance-management-service-url': provenance_url,
-                'Authorization': authorization,
-            }
-
-            received_response = external_interface.http_post(
-                __ACCESS_POINT_URL_PROVENANCE_MANAGEMENT_CALL_RECEIVED, received_headers)
-
-            if received_response.status_code < 200 or 300 <= received_response.status_code:
-                raise CaddeException(
-                    message_id='020004009E',
-                    status_code=received_response.status_code,
-                    replace_str_list=[
-                        received_response.text])
-
-            # レスポンスヘッダ：識別情報を更新
-            response_headers['x-cadde-provenance'] = received_response.headers['x-cadde-provenance']
+        response_stream = external_interface.http_iter_content(response)
+        # 呼び出し元へのレスポンスにそのまま設定するため、Transfer-Encoding等の接続に関するヘッダは除く
+        response_headers = remove_hop_by_hop_headers(response.headers)
+
+        try:
+            response_stream = __register_received(
+                response_stream, response_headers, provider, consumer_id,
+                authorization, external_interface)
+        except Exception:
+            # 返却しない取得データの接続を解放する
+            response_stream.close()
+            raise
 
     provider_id = ''
     provider_id = provider
@@ -351,7 +324,236 @@ def fetch_data(authorization: str,
         log_message['options'] = options
         logger.info(json.dumps(log_message, ensure_ascii=False))
 
-    return response_bytes, response_headers
+    return response_stream, response_headers
+
+
+def __register_received(
+        response_stream,
+        response_headers,
+        provider,
+        consumer_id,
+        authorization,
+        external_interface) -> ChunkStream:
+    """
+    提供者コネクタから取得したデータについて、データ証憑通知(受信)と受信履歴登録を行う。
+    受信履歴登録で取得した識別情報はレスポンスヘッダ情報に設定する。
+    データ証憑通知(受信)は返却する取得データの送信完了時に、逐次算出したハッシュ値を用いて行う。
+    送信完了の応答を待たせないよう、データ証憑通知(受信)は別スレッドで行う。
+
+    Args:
+        response_stream ChunkStream : 取得データ
+        response_headers dict : レスポンスヘッダ情報
+        provider str : CADDEユーザID（提供者）
+        consumer_id str : CADDEユーザID（利用者）
+        authorization str : 利用者トークン
+        external_interface ExternalInterface : 外部リクエストを行うインタフェース
+
+    Returns:
+        ChunkStream : 返却する取得データ
+
+    Raises:
+        Cadde_excption: データ証憑通知(受信)時にCADDEユーザID（利用者）が空の場合            エラーコード: 020004006E
+        Cadde_excption: 受信履歴登録時にCADDEユーザID（利用者）が空の場合                    エラーコード: 020004008E
+        Cadde_excption: 来歴管理I/F 受信履歴登録（来歴）API呼び出し時にエラーが発生した場合  エラーコード: 020004009E
+
+    """
+
+    # レスポンスヘッダからデータを取得
+    provenance_id = ''
+    provenance_id = response_headers['x-cadde-provenance']
+    provenance_url = ''
+    provenance_url = response_headers['x-cadde-provenance-management-service-url']
+    contract_id = ''
+    contract_id = response_headers['x-cadde-contract-id']
+    contract_url = ''
+    contract_url = response_headers['x-cadde-contract-management-service-url']
+
+    # 来歴管理：データ証憑通知(受信)
+    # 契約している場合（戻り値に取引ID、契約管理サービスURLが設定されている場合）に行う
+    if contract_id and contract_url:
+        # 認証あり（consumer_id有効）の場合に行う
+        if consumer_id is None:
+            raise CaddeException('020004006E')
+        # 取得データの送信完了時にデータ証憑通知(受信)を行う
+        voucher_received = functools.partial(
+            __submit_voucher_received,
+            provider=provider,
+            consumer_id=consumer_id,
+            contract_id=contract_id,
+            contract_url=contract_url,
+            authorization=authorization,
+            external_interface=external_interface)
+        response_stream = hash_chunk_stream(response_stream, voucher_received)
+
+    # 来歴管理：受信履歴登録
+    # 交換実績記録用リソースIDあり、かつ、認証あり（consumer_id有効）
+    if provenance_id != '':
+        if consumer_id is None:
+            raise CaddeException('020004008E')
+
+        received_headers = {
+            'x-cadde-provider': provider,
+            'x-cadde-consumer': consumer_id,
+            'x-cadde-resource-id-for-provenance': provenance_id,
+            'x-cadde-provenance-management-service-url': provenance_url,
+            'Authorization': authorization,
+        }
+
+        received_response = external_interface.http_post(
+            __ACCESS_POINT_URL_PROVENANCE_MANAGEMENT_CALL_RECEIVED, received_headers)
+
+        if received_response.status_code < 200 or 300 <= received_response.status_code:
+            raise CaddeException(
+                message_id='020004009E',
+                status_code=received_response.status_code,
+                replace_str_list=[
+                    received_response.text])
+
+        # レスポンスヘッダ：識別情報を更新
+        response_headers['x-cadde-provenance'] = received_response.headers['x-cadde-provenance']
+
+    return response_stream
+
+
+def __submit_voucher_received(
+        hash_value,
+        provider,
+        consumer_id,
+        contract_id,
+        contract_url,
+        authorization,
+        external_interface):
+    """
+    データ証憑通知(受信)を送信待ちに追加する。
+    送信待ちが上限に達している場合、または送信を開始する時点で期限を過ぎている場合は通知を行わず、
+    通知しなかったデータ証憑の内容をログに出力する。
+
+    Args:
+        hash_value str : 取得データのハッシュ値
+        provider str : CADDEユーザID（提供者）
+        consumer_id str : CADDEユーザID（利用者）
+        contract_id str : 取引ID
+        contract_url str : 契約管理サービスURL
+        authorization str : 利用者トークン
+        external_interface ExternalInterface : 外部リクエストを行うインタフェース
+
+    """
+
+    log_dropped = functools.partial(
+        __log_voucher_received_dropped,
+        hash_value=hash_value,
+        provider=provider,
+        consumer_id=consumer_id,
+        contract_id=contract_id,
+        contract_url=contract_url)
+
+    if not __VOUCHER_SLOTS.acquire(blocking=False):
+        log_dropped('queue_full')
+        return
+
+    deadline = time.monotonic() + __VOUCHER_DEADLINE
+
+    def run():
+        try:
+            if deadline < time.monotonic():
+                log_dropped('deadline_exceeded')
+                return
+            __voucher_received(
+                hash_value, provider, consumer_id, contract_id,
+                contract_url, authorization, external_interface)
+        finally:
+            __VOUCHER_SLOTS.release()
+
+    try:
+        __VOUCHER_EXECUTOR.submit(run)
+    except Exception:
+        __VOUCHER_SLOTS.release()
+        log_dropped('submit_failed')
+
+
+def __log_voucher_received_dropped(
+        reason,
+        hash_value,
+        provider,
+        consumer_id,
+        contract_id,
+        contract_url):
+    """
+    通知しなかったデータ証憑通知(受信)の内容を、再通知できるようJSON形式でログに出力する。
+
+    Args:
+        reason str : 通知しなかった理由
+        hash_value str : 取得データのハッシュ値
+        provider str : CADDEユーザID（提供者）
+        consumer_id str : CADDEユーザID（利用者）
+        contract_id str : 取引ID
+        contract_url str : 契約管理サービスURL
+
+    """
+
+    log_message = {}
+    log_message['log_type'] = 'voucher_received_dropped'
+    log_message['timestamp'] = datetime.datetime.now().isoformat(timespec='microseconds')
+    log_message['reason'] = reason
+    log_message['provider_id'] = provider
+    log_message['consumer_id'] = consumer_id
+    log_message['contract_id'] = contract_id
+    log_message['contract_management_service_url'] = contract_url
+    log_message['hash'] = hash_value
+    logger.error(json.dumps(log_message, ensure_ascii=False))
+
+
+def __voucher_received(
+        hash_value,
+        provider,
+        consumer_id,
+        contract_id,
+        contract_url,
+        authorization,
+        external_interface):
+    """
+    データ証憑通知(受信)を行う。
+    取得データの送信完了後に呼び出されるため、エラーが発生した場合は利用者へ返却せずログ出力のみ行う。
+
+    Args:
+        hash_value str : 取得データのハッシュ値
+        provider str : CADDEユーザID（提供者）
+        consumer_id str : CADDEユーザID（利用者）
+        contract_id str : 取引ID
+        contract_url str : 契約管理サービスURL
+        authorization str : 利用者トークン
+        external_interface ExternalInterface : 外部リクエストを行うインタフェース
+
+    """
+
+    sent_headers = {
+        'x-cadde-provider': provider,
+        'x-cadde-consumer': consumer_id,
+        'x-cadde-contract-id': contract_id,
+        'x-cadde-hash-get-data': hash_value,
+        'x-cadde-contract-management-service-url': contract_url,
+        'Authorization': authorization
+    }
+
+    try:
+        sent_response = external_interface.http_post(
+            __ACCESS_POINT_URL_PROVENANCE_MANAGEMENT_CALL_VOUCHER, sent_headers)
+
+        if sent_response.status_code < 200 or 300 <= sent_response.status_code:
+            raise CaddeException(
+                message_id='020004007E',
+                status_code=sent_response.status_code,
+                replace_str_list=[
+                    sent_response.text])
+
+    except CaddeException as e:
+        logger.warning(e.error_message)
+        __log_voucher_received_dropped(
+            'failed', hash_value, provider, consumer_id, contract_id, contract_url)
+    except Exception as e:
+        logger.warning(str(e))
+        __log_voucher_received_dropped(
+            'failed', hash_value, provider, consumer_id, contract_id, contract_url)
 
 
 def __exchange_options_str(options_dict: dict) -> str:
@@ -387,6 +589,7 @@ def __get_location_info(provider, location_service_url, external_interface) -> (
     CADDEユーザID（提供者）をキーにして、ロケーションサービスから情報を取得する。
     ロケーションサービスから取得ができなかった場合、
     location.jsonからコンフィグ情報を取得する。
+    ロケーションサービスの問い合わせ結果、location.jsonの内容はキャッシュしたものを使用する。
 
     Args:
         provider string : CADDEユーザID（提供者）
@@ -409,41 +612,167 @@ def __get_location_info(provider, location_service_url, external_interface) -> (
     if provider is None:
         raise CaddeException(message_id='020000002E')
 
-    provider_connector_url = ''
-
-    # ロケーションサービスへ取得リクエスト
-    response = __get_location_from_location_service(
+    # ロケーションサービスへ取得リクエスト(キャッシュを使用)
+    provider_connector_url = __get_location_from_cache(
         provider, location_service_url, external_interface)
 
-    if response:
-        if response.endswith('/'):
-            response = response[:-1]
-        provider_connector_url = response
-
+    if provider_connector_url:
         return provider_connector_url
 
     # コンフィグから再取得を試みる
     logger.info(f'Not Found {provider} from {location_service_url}')
+    location_config_map = __get_location_config_map()
+
+    return location_config_map.get(provider, '')
+
+
+def __get_location_from_cache(provider, location_service_url, external_interface) -> (str):
+    """
+    ロケーションサービスの問い合わせ結果をキャッシュから取得する。
+    キャッシュがない場合、登録がない結果の保持時間を過ぎている場合、アクセスURLがSTALE_TTLを過ぎている場合は
+    ロケーションサービスに問い合わせる。アクセスURLが保持時間を過ぎている場合は、保持している値を返却し
+    バックグラウンドで再問い合わせする。
+
+    Args:
+        provider string : CADDEユーザID（提供者）
+        location_service_url string : ロケーションサービスのURL
+        external_interface ExternalInterface : 外部にリクエストを行うインタフェース
+
+    Returns:
+        str: 提供者コネクタのアクセスURL 登録がない場合、問い合わせに失敗した場合は空文字
+
+    """
+
+    cache_key = (location_service_url, provider)
+    cached = __LOCATION_CACHE.get(cache_key)
+    if cached is not None:
+        checked_at, provider_connector_url = cached
+        elapsed = time.monotonic() - checked_at
+        if provider_connector_url:
+            if elapsed < __LOCATION_CACHE_TTL:
+                return provider_connector_url
+            if elapsed < __LOCATION_CACHE_STALE_TTL:
+                __refresh_location_in_background(
+                    provider, location_service_url, external_interface)
+                return provider_connector_url
+        elif elapsed < __LOCATION_CACHE_NEGATIVE_TTL:
+            return provider_connector_url
+
+    return __refresh_location(provider, location_service_url, external_interface)
+
+
+def __refresh_location(provider, location_service_url, external_interface) -> (str):
+    """
+    ロケーションサービスに問い合わせ、結果をキャッシュに設定する。
+    問い合わせに失敗した場合、STALE_TTL内のアクセスURLを保持していればその値を維持して返却する。
+
+    Args:
+        provider string : CADDEユーザID（提供者）
+        location_service_url string : ロケーションサービスのURL
+        external_interface ExternalInterface : 外部にリクエストを行うインタフェース
+
+    Returns:
+        str: 提供者コネクタのアクセスURL 登録がない場合、問い合わせに失敗した場合は空文字
+
+    """
+
+    cache_key = (location_service_url, provider)
+    provider_connector_url = __get_location_from_location_service(
+        provider, location_service_url, external_interface)
+
+    with __LOCATION_CACHE_LOCK:
+        now = time.monotonic()
+        if provider_connector_url is None:
+            logger.warning(f'Location service error {provider} from {location_service_url}')
+            cached = __LOCATION_CACHE.get(cache_key)
+            if cached is not None and cached[1] and now - cached[0] < __LOCATION_CACHE_STALE_TTL:
+                return cached[1]
+            provider_connector_url = ''
+
+        if provider_connector_url.endswith('/'):
+            provider_connector_url = provider_connector_url[:-1]
+
+        __LOCATION_CACHE[cache_key] = (now, provider_connector_url)
+        __LOCATION_CACHE.move_to_end(cache_key)
+        while __LOCATION_CACHE_MAX_SIZE < len(__LOCATION_CACHE):
+            __LOCATION_CACHE.popitem(last=False)
+
+    return provider_connector_url
+
+
+def __refresh_location_in_background(provider, location_service_url, external_interface):
+    """
+    ロケーションサービスへの再問い合わせをバックグラウンドで実行する。
+    同じCADDEユーザID（提供者）に対する再問い合わせが実行中の場合は何もしない。
+
+    Args:
+        provider string : CADDEユーザID（提供者）
+        location_service_url string : ロケーションサービスのURL
+        external_interface ExternalInterface : 外部にリクエストを行うインタフェース
+
+    """
+
+    cache_key = (location_service_url, provider)
+    with __LOCATION_CACHE_LOCK:
+        if cache_key in __LOCATION_REFRESHING:
+            return
+        __LOCATION_REFRESHING.add(cache_key)
+
+    def refresh():
+        try:
+            __refresh_location(provider, location_service_url, external_interface)
+        except Exception as e:
+            logger.warning(str(e))
+        finally:
+            with __LOCATION_CACHE_LOCK:
+                __LOCATION_REFRESHING.discard(cache_key)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def __get_location_config_map() -> (dict):
+    """
+    location.jsonからCADDEユーザID（提供者）と提供者コネクタのアクセスURLの対応を取得する。
+    location.jsonの内容が変わらない間は、前回作成した対応を使用する。
+
+    Returns:
+        dict: {CADDEユーザID（提供者）: 提供者コネクタのアクセスURL}
+
+    Raises:
+        Cadde_excption: コンフィグファイルの読み込みに失敗した場合                                エラーコード: 020000003E
+        Cadde_excption: 必須パラメータが設定されていなかった場合（コネクタロケーション）          エラーコード: 020000004E
+
+    """
+
     try:
         config = internal_interface.config_read(__CONFIG_LOCATION_FILE_PATH)
     except Exception:  # pathミス
         raise CaddeException(message_id='020000003E')
+
+    cached_config, location_config_map = __LOCATION_CONFIG_MAP_CACHE
+    if cached_config is config:
+        return location_config_map
+
     try:
         connector_location = config[__CONFIG_CONNECTOR_LOCATION]
     except Exception:  # オブジェクトなし
         raise CaddeException(
             message_id='020000004E',
             replace_str_list=[__CONFIG_CONNECTOR_LOCATION])
-    try:
-        provider_info = connector_location[provider]
-        provider_connector_url = provider_info[__CONFIG_PROVIDER_CONNECTOR_URL]
-    except Exception:  # コンフィグファイルから指定したURLの情報が取得できない場合は何もしない
-        pass
 
-    if provider_connector_url.endswith('/'):
-        provider_connector_url = provider_connector_url[:-1]
+    location_config_map = {}
+    for provider, provider_info in connector_location.items():
+        try:
+            provider_connector_url = provider_info[__CONFIG_PROVIDER_CONNECTOR_URL]
+        except Exception:  # アクセスURLの情報が取得できない提供者は対応に含めない
+            continue
+        if provider_connector_url.endswith('/'):
+            provider_connector_url = provider_connector_url[:-1]
+        location_config_map[provider] = provider_connector_url
 
-    return provider_connector_url
+    __LOCATION_CONFIG_MAP_CACHE[:] = [config, location_config_map]
+
+    return location_config_map
 
 
 def __get_location_from_location_service(provider, location_service_url, external_interface) -> (str):
@@ -456,7 +785,7 @@ def __get_location_from_location_service(provider, location_service_url, externa
         location_service_url string : ロケーションサービスのURL
 
     Returns:
-        str: 提供者コネクタのアクセスURL
+        str: 提供者コネクタのアクセスURL 登録がない場合は空文字 問い合わせに失敗した場合はNone
 
     Raises:
         本処理ではエラーのキャッチは行わない
@@ -472,13 +801,23 @@ def __get_location_from_location_service(provider, location_service_url, externa
     # 取得リクエストを実行
     try:
         response = external_interface.http_get(send_url, header)
-        # レスポンスからロケーション情報取得
-        response_text_dict = json.loads(response.text)
-        if __LOCATION_SERVICE_PROVIDER_CONNECTOR_URL in response_text_dict:
-            provider_connector_url = response_text_dict[__LOCATION_SERVICE_PROVIDER_CONNECTOR_URL]
+    except Exception:
+        return None
+
+    if response.status_code == 404:
+        return provider_connector_url
+
+    if response.status_code < 200 or 300 <= response.status_code:
+        return None
 
+    # レスポンスからロケーション情報取得
+    try:
+        response_text_dict = json.loads(response.text)
     except Exception:
-        pass
+        return None
+
+    if isinstance(response_text_dict, dict) and response_text_dict.get(__LOCATION_SERVICE_PROVIDER_CONNECTOR_URL):
+        provider_connector_url = response_text_dict[__LOCATION_SERVICE_PROVIDER_CONNECTOR_URL]
 
     return provider_connector_url
 
@@ -18,6 +18,7 @@ def data_exchange(
         external_interface: ExternalInterface = ExternalInterface()) -> Response:
     """
     提供者側コネクタにデータ交換を行い、取得した情報を返す
+    レスポンスのボディは読み込まずに返却するため、呼び出し元でExternalInterface.http_iter_contentにより読み込むこと
 
     Args:
         resource_url str : リソースURL
@@ -44,7 +45,7 @@ def data_exchange(
     data_exchange_url = provider_connector_url + __SET_EXCHANGE_URL
 
     response = external_interface.http_get(
-        data_exchange_url, headers_dict)
+        data_exchange_url, headers_dict, stream=True)
     if (response.status_code < __HTTP_STATUS_CODE_SUCCESS_LOWER_LIMIT
             or __HTTP_STATUS_CODE_SUCCESS_UPPER_LIMIT < response.status_code):
         raise CaddeException(
@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 import json
-import requests
 
 from swagger_server.utilities.cadde_exception import CaddeException
 from swagger_server.utilities.external_interface import ExternalInterface
 from swagger_server.utilities.internal_interface import InternalInterface
+from swagger_server.utilities.provenance_outbox import ProvenanceOutbox
 
 # 接続先URL (仮の値)
 __URL_HISTORY_EVENT_WITH_HASH = '/eventwithhash'
@@ -15,6 +15,9 @@ __URL_HISTORY_SEARCHEVENTS = '/searchevents'
 __CONFIG_PROVENANCE_FILE_PATH = '/usr/src/app/swagger_server/configs/provenance.json'
 __CONFIG_PROVENANCE_MANAGEMENT_URL = 'provenance_management_api_url'
 
+# アウトボックスのファイルのパスが設定されていない場合に使用するパス
+__OUTBOX_DEFAULT_PATH = '/usr/src/app/outbox/provenance.sqlite3'
+
 # 受信履歴登録のcdleventtypeの値
 __CDL_EVENT_TYPE_RECEIVED = 'Received'
 
@@ -41,6 +44,8 @@ def received_history_registration(
         external_interface: ExternalInterface) -> str:
     """
     来歴管理I/Fに受信履歴登録を依頼する
+    provenance.jsonのoutboxが有効な場合は、アウトボックスに保存してローカル識別子を返却し、
+    来歴管理I/Fへはバックグラウンドで送信する。
 
     Args:
         provider_id str: CADDEユーザID（提供者）
@@ -52,12 +57,14 @@ def received_history_registration(
         external_interface ExternalInterface : 外部にリクエストを行うインタフェース
 
     Returns:
-        str : 識別情報
+        str : 識別情報 アウトボックスを使用する場合はローカル識別子
 
     Raises:
         Cadde_excption : 来歴管理に登録できなかった場合 エラーコード : 020301002E
     """
 
+    config = {}
+
     # コンフィグファイルからURL取得
     try:
         config = internal_interface.config_read(
@@ -87,10 +94,48 @@ def received_history_registration(
     if authorization is not None:
         headers['Authorization'] = authorization[7:]  # noqa: E501
 
+    outbox = ProvenanceOutbox.from_config(
+        config, __OUTBOX_DEFAULT_PATH, __post_event_with_hash)
+    if outbox is not None:
+        identification_information = outbox.enqueue(
+            server_url + __URL_HISTORY_EVENT_WITH_HASH, headers, body_data)
+    else:
+        identification_information = __post_event_with_hash(
+            server_url + __URL_HISTORY_EVENT_WITH_HASH, headers, body_data, external_interface)
+
+    return identification_information
+
+
+def __post_event_with_hash(
+        access_url: str,
+        headers: dict,
+        body_data: bytes,
+        external_interface: ExternalInterface = ExternalInterface()) -> str:
+    """
+    来歴管理I/Fに受信履歴を登録し、識別情報を返す。アウトボックスの送信処理としても使用する。
+    来歴管理I/F毎のkeep-alive接続を再利用する。
+
+    Args:
+        access_url str : 来歴管理I/Fの履歴登録URL
+        headers dict : 設定するヘッダ
+        body_data bytes : 登録するイベント
+        external_interface ExternalInterface : 外部にリクエストを行うインタフェース
+
+    Returns:
+        str : 識別情報
+
+    Raises:
+        Cadde_excption : 来歴管理に登録できなかった場合 エラーコード : 020301002E
+        Cadde_excption : 識別情報が発行されなかった場合 エラーコード : 020301003E
+        Cadde_excption : タイムアウトが発生した場合     エラーコード : 000002001E
+        Cadde_excption : 通信に失敗した場合             エラーコード : 000002002E
+
+    """
+
     upfile = {'request': ('', body_data, 'application/json')}
 
-    response = requests.post(
-        server_url + __URL_HISTORY_EVENT_WITH_HASH, headers=headers, files=upfile)
+    response = external_interface.http_post(
+        access_url, headers=dict(headers), files=upfile)
 
     if response.status_code < 200 or 300 <= response.status_code:
         raise CaddeException(
@@ -104,9 +149,7 @@ def received_history_registration(
     if 'cdleventid' not in response_text_dict or not response_text_dict['cdleventid']:
         raise CaddeException(message_id='020301003E')
 
-    identification_information = response_text_dict['cdleventid']
-
-    return identification_information
+    return response_text_dict['cdleventid']
 
 
 def voucher_received_call(
@@ -5,10 +5,14 @@ import base64
 from swagger_server.utilities.cadde_exception import CaddeException
 from swagger_server.utilities.external_interface import ExternalInterface
 from swagger_server.utilities.internal_interface import InternalInterface
+from swagger_server.utilities.jwt_verifier import JwtVerifier, JwtVerificationError
 
 __CONFIG_AUTHORIZATION_FILE_PATH = '/usr/src/app/swagger_server/configs/authorization.json'
 __CONFIG_AUTHORIZATION_SERVER_URL = 'authorization_server_url'
 
+# ローカル検証したトークンからCADDEユーザID（利用者）を取得するクレーム
+__TOKEN_CLAIM_CONSUMER_ID = 'preferred_username'
+
 __CADDE_FEDERATION = '/cadde/api/v4/token/federate'
 __CADDE_AUTHZ = '/cadde/api/v4/authz/confirm'
 
@@ -22,6 +26,8 @@ def token_federation_execute(
         external_interface: ExternalInterface = ExternalInterface()) -> str:
     """
     認可トークン取得を行い、認可トークンを返す。
+    authorization.jsonでローカル検証が有効な場合は、認可トークン取得の前に認証トークンを発行者の公開鍵で検証し、
+    不正なトークンは認可サーバに問い合わせずに拒否する。
 
     Args:
         authorization str : 認証トークン
@@ -36,6 +42,7 @@ def token_federation_execute(
 
     Raises:
         Cadde_excption : ステータスコード2xxでない場合 エラーコード : 010401002E
+        Cadde_excption : ローカル検証で認証トークンが有効でなかった場合 エラーコード : 010401005E
 
     """
 
@@ -49,6 +56,10 @@ def token_federation_execute(
     if not authorization.startswith('Bearer'):
         raise CaddeException(message_id='010401002E')
 
+    # ローカル検証
+    verified_payload = __verify_token_locally(
+        authorization, internal_interface, external_interface)
+
     # Authorizationにセットする情報をBase64エンコードする
     credential = f'{provider_connector_id}:{provider_connector_secret}'
     bearer = base64.b64encode(credential.encode()).decode()
@@ -88,7 +99,10 @@ def token_federation_execute(
     auth_token = response_text_dict['access_token']
 
     # authorizationからtokenを抜き出す
-    consumer_id = __get_authorization_consumer_id(authorization[7:])
+    if verified_payload and verified_payload.get(__TOKEN_CLAIM_CONSUMER_ID):
+        consumer_id = verified_payload[__TOKEN_CLAIM_CONSUMER_ID]
+    else:
+        consumer_id = __get_authorization_consumer_id(authorization[7:])
 
     return auth_token, consumer_id
 
@@ -202,6 +216,41 @@ def __get_authorization_config(internal_interface) -> (str):
     return authorization_server_url
 
 
+def __verify_token_locally(authorization, internal_interface, external_interface) -> dict:
+    """
+    authorization.jsonでローカル検証が有効な場合、認証トークンを発行者の公開鍵で検証し、ペイロードを返す。
+
+    Args:
+        authorization str : 認証トークン
+        internal_interface : 内部リクエストを行うインタフェース
+        external_interface : 外部リクエストを行うインタフェース
+
+    Returns:
+        dict : 検証したトークンのペイロード ローカル検証を行わない場合、ローカルで判定できない場合はNone
+
+    Raises:
+        Cadde_excption : 認証トークンが有効でなかった場合 エラーコード : 010401005E
+
+    """
+
+    try:
+        authorization_config = internal_interface.config_read(
+            __CONFIG_AUTHORIZATION_FILE_PATH)
+    except Exception:
+        return None
+
+    verifier = JwtVerifier.from_config(authorization_config)
+    if verifier is None:
+        return None
+
+    try:
+        return verifier.verify(authorization, external_interface)
+    except JwtVerificationError as e:
+        raise CaddeException(
+            message_id='010401005E',
+            replace_str_list=[str(e)])
+
+
 def __get_authorization_decode(target_token) -> (str):
     """
     リクエストパラメータのトークンをデコードする
@@ -1,6 +1,6 @@
 import connexion
 
-from flask import send_file, Response
+from flask import Response
 import logging
 
 from swagger_server.utilities.message_map import get_message
@@ -48,12 +48,13 @@ def files(x_cadde_resource_url=None, x_cadde_resource_api_type=None, Authorizati
                                   authorization),
                               log_message_none_parameter_replace(options)]))
 
-    response_bytes, headers_dict = fetch_data(
+    # 取得データはチャンク単位で逐次送信する
+    response_stream, headers_dict = fetch_data(
         resource_url, resource_api_type, authorization, options, external_interface, internal_interface)
 
     if resource_api_type == 'api/ngsi':
         return_response = Response(
-            response=response_bytes.read(),
+            response=response_stream,
             status=200,
             headers=headers_dict,
             mimetype='application/json')
@@ -64,16 +65,14 @@ def files(x_cadde_resource_url=None, x_cadde_resource_api_type=None, Authorizati
 
         return return_response
     else:
-        fileName = get_url_file_name(resource_url)
-        send_file_response = send_file(
-            response_bytes,
-            as_attachment=True,
-            download_name=fileName)
+        file_response = Response(
+            response=response_stream,
+            status=200)
 
-        send_file_response.headers = headers_dict
+        file_response.headers = headers_dict
 
-        if 'Content-Disposition' not in send_file_response.headers:
-            send_file_response.headers[
+        if 'Content-Disposition' not in file_response.headers:
+            file_response.headers[
                 'Content-Disposition'] = 'attachment; filename=' + get_url_file_name(resource_url)
 
-        return send_file_response, 200
+        return file_response, 200
@@ -0,0 +1,273 @@
+﻿# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+import urllib.parse
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class CkanResourceIndex:
+    """
+    公開CKANと詳細CKANの全リソースを、リソースURL(NGSIの場合はテナント、サービスパスを含む)から
+    交換実績記録用リソースIDを引く索引としてメモリ上に保持する。
+    索引はバックグラウンドのスレッドでpackage_searchのページングにより作成し、
+    refresh_interval毎にmetadata_modifiedが前回以降のデータセットのみ取り込み、
+    rebuild_interval毎に全件を取り直す(削除、非公開化されたデータセットの反映)。
+    """
+
+    # コンフィグ：索引設定(provider_ckan.json)
+    __CONFIG_KEY_RESOURCE_INDEX = 'resource_index'
+    __CONFIG_KEY_ENABLE = 'enable'
+    __CONFIG_KEY_REFRESH_INTERVAL = 'refresh_interval'
+    __CONFIG_KEY_REBUILD_INTERVAL = 'rebuild_interval'
+    __CONFIG_KEY_MAX_AGE = 'max_age'
+    __CONFIG_KEY_PAGE_SIZE = 'page_size'
+
+    __DEFAULT_REFRESH_INTERVAL = 60
+    __DEFAULT_REBUILD_INTERVAL = 3600
+    __DEFAULT_MAX_AGE = 300
+    __DEFAULT_PAGE_SIZE = 1000
+
+    __PACKAGE_SEARCH_PATH = '/api/3/action/package_search?'
+    __RESOURCE_ID_FOR_PROVENANCE = 'caddec_resource_id_for_provenance'
+
+    # (公開CKANのURL, 詳細CKANのURL)毎の索引
+    __indexes = {}
+    __indexes_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, ckan_config: dict, release_ckan_url: str, detail_ckan_url: str, external_interface):
+        """
+        コンフィグファイルの内容から索引を取得する。初回はバックグラウンドでの索引の作成を開始する。
+        索引が有効でない場合はNoneを返却し、作成中の索引があれば停止する。
+
+        Args:
+            ckan_config dict : コンフィグファイル(provider_ckan.json)の内容
+            release_ckan_url str : 公開CKANのURL 未設定の場合はNone
+            detail_ckan_url str : 詳細CKANのURL 未設定の場合はNone
+            external_interface : CKANへのリクエストを行うインタフェース
+
+        Returns:
+            CkanResourceIndex : 索引 無効な場合はNone
+        """
+
+        try:
+            index_config = ckan_config.get(cls.__CONFIG_KEY_RESOURCE_INDEX)
+            enable = bool(index_config and index_config.get(cls.__CONFIG_KEY_ENABLE, False))
+            if enable:
+                settings = (
+                    float(index_config.get(
+                        cls.__CONFIG_KEY_REFRESH_INTERVAL, cls.__DEFAULT_REFRESH_INTERVAL)),
+                    float(index_config.get(
+                        cls.__CONFIG_KEY_REBUILD_INTERVAL, cls.__DEFAULT_REBUILD_INTERVAL)),
+                    float(index_config.get(
+                        cls.__CONFIG_KEY_MAX_AGE, cls.__DEFAULT_MAX_AGE)),
+                    int(index_config.get(
+                        cls.__CONFIG_KEY_PAGE_SIZE, cls.__DEFAULT_PAGE_SIZE)))
+        except Exception as e:
+            logger.warning('CKANリソース索引の設定が不正です。' + str(e))
+            enable = False
+
+        index_key = (release_ckan_url, detail_ckan_url)
+        with cls.__indexes_lock:
+            if not enable:
+                for index in cls.__indexes.values():
+                    index.__stop_event.set()
+                cls.__indexes.clear()
+                return None
+
+            index = cls.__indexes.get(index_key)
+            if index is None:
+                for other_index in cls.__indexes.values():
+                    other_index.__stop_event.set()
+                cls.__indexes.clear()
+                index = cls(release_ckan_url, detail_ckan_url, external_interface)
+                cls.__indexes[index_key] = index
+                index.__settings = settings
+                index.__start()
+            else:
+                index.__settings = settings
+
+        return index
+
+    def __init__(self, release_ckan_url: str, detail_ckan_url: str, external_interface):
+        """
+        コンストラクタ
+
+        Args:
+            release_ckan_url str : 公開CKANのURL 未設定の場合はNone
+            detail_ckan_url str : 詳細CKANのURL 未設定の場合はNone
+            external_interface : CKANへのリクエストを行うインタフェース
+        """
+
+        self.__ckan_urls = [
+            ckan_url for ckan_url in (release_ckan_url, detail_ckan_url) if ckan_url is not None]
+        self.__external_interface = external_interface
+        self.__settings = (
+            self.__DEFAULT_REFRESH_INTERVAL, self.__DEFAULT_REBUILD_INTERVAL,
+            self.__DEFAULT_MAX_AGE, self.__DEFAULT_PAGE_SIZE)
+        self.__stop_event = threading.Event()
+
+        # CKAN毎の取り込み状態
+        # {CKANのURL: {'packages': {データセットID: [(URL, テナント, サービスパス, 交換実績記録用リソースID)]},
+        #              'last_modified': 取り込んだ最新のmetadata_modified, 'rebuilt_at': 全件取得時刻}}
+        self.__states = {}
+
+        # CKAN毎の索引 {CKANのURL: (作成時刻, {URL: [ID]}, {(URL, テナント, サービスパス): [ID]})}
+        # 参照先の差し替えのみで更新するため、参照時にロックは取得しない
+        self.__snapshots = {}
+
+    def lookup(self, resource_url: str, is_ngsi: bool, ngsi_tenant: str, ngsi_service_path: str) -> list:
+        """
+        リソースURLに該当するリソースの交換実績記録用リソースIDを、公開CKAN、詳細CKANの順に返却する。
+        索引が作成されていない場合、max_ageより古い場合、該当するリソースがない場合は、
+        CKANへの検索で確認させるためNoneを返却する。
+
+        Args:
+            resource_url str : リソースURL
+            is_ngsi bool : NGSIのリソースか否か
+            ngsi_tenant str : NGSIテナント
+            ngsi_service_path str : NGSIサービスパス
+
+        Returns:
+            list : 交換実績記録用リソースIDのリスト(未設定のリソースは空文字) 索引で判定できない場合はNone
+        """
+
+        max_age = self.__settings[2]
+        now = time.monotonic()
+        provenance_id_list = []
+
+        for ckan_url in self.__ckan_urls:
+            snapshot = self.__snapshots.get(ckan_url)
+            if snapshot is None or max_age <= now - snapshot[0]:
+                return None
+            if is_ngsi:
+                provenance_id_list.extend(snapshot[2].get(
+                    (resource_url, ngsi_tenant, ngsi_service_path), []))
+            else:
+                provenance_id_list.extend(snapshot[1].get(resource_url, []))
+
+        if not provenance_id_list:
+            return None
+
+        return provenance_id_list
+
+    def __start(self):
+        threading.Thread(
+            target=self.__run, name='ckan_resource_index', daemon=True).start()
+
+    def __run(self):
+        """
+        停止されるまで、refresh_interval毎に索引を更新する。
+        """
+
+        while not self.__stop_event.is_set():
+            refresh_interval, rebuild_interval, _, page_size = self.__settings
+            for ckan_url in self.__ckan_urls:
+                if self.__stop_event.is_set():
+                    return
+                try:
+                    self.__update(ckan_url, rebuild_interval, page_size)
+                except Exception as e:
+                    logger.warning('CKANリソース索引の更新に失敗しました。' + ckan_url + ' ' + str(e))
+
+            self.__stop_event.wait(refresh_interval)
+
+    def __update(self, ckan_url: str, rebuild_interval: float, page_size: int):
+        """
+        CKANのデータセットを取り込み、索引を差し替える。
+        全件取得からrebuild_intervalを過ぎている場合は全件、それ以外は前回以降に更新されたデータセットのみ取り込む。
+        """
+
+        started_at = time.monotonic()
+        state = self.__states.get(ckan_url)
+
+        if state is None or rebuild_interval <= started_at - state['rebuilt_at']:
+            packages, last_modified = self.__fetch_packages(ckan_url, None, page_size)
+            state = {
+                'packages': packages,
+                'last_modified': last_modified,
+                'rebuilt_at': started_at
+            }
+        else:
+            packages, last_modified = self.__fetch_packages(
+                ckan_url, state['last_modified'], page_size)
+            state['packages'].update(packages)
+            if last_modified and (not state['last_modified'] or state['last_modified'] < last_modified):
+                state['last_modified'] = last_modified
+
+        if self.__stop_event.is_set():
+            return
+
+        self.__states[ckan_url] = state
+
+        url_index = {}
+        ngsi_index = {}
+        for resources in state['packages'].values():
+            for url, ngsi_tenant, ngsi_service_path, provenance_id in resources:
+                url_index.setdefault(url, []).append(provenance_id)
+                ngsi_index.setdefault(
+                    (url, ngsi_tenant, ngsi_service_path), []).append(provenance_id)
+
+        self.__snapshots[ckan_url] = (started_at, url_index, ngsi_index)
+
+    def __fetch_packages(self, ckan_url: str, modified_since: str, page_size: int) -> (dict, str):
+        """
+        package_searchをページングして、データセット毎のリソースを取得する。
+
+        Args:
+            ckan_url str : CKANのURL
+            modified_since str : 指定した場合、metadata_modifiedがこの値以降のデータセットのみ取得する
+            page_size int : 1回のpackage_searchで取得する件数
+
+        Returns:
+            dict : {データセットID: [(URL, テナント, サービスパス, 交換実績記録用リソースID)]}
+            str : 取得したデータセットの最新のmetadata_modified
+        """
+
+        params = {
+            'q': '*:*',
+            'rows': page_size,
+            'sort': 'metadata_modified asc, id asc'
+        }
+        if modified_since:
+            # Solrの日付形式(秒単位、UTC)で指定し、境界のデータセットは再取得する
+            params['fq'] = 'metadata_modified:[' + modified_since[:19] + 'Z TO *]'
+
+        packages = {}
+        last_modified = None
+        start = 0
+        while not self.__stop_event.is_set():
+            params['start'] = start
+            response = self.__external_interface.http_get(
+                ckan_url + self.__PACKAGE_SEARCH_PATH + urllib.parse.urlencode(params))
+            if response.status_code < 200 or 300 <= response.status_code:
+                raise Exception(f'status_code: {response.status_code} {response.text}')
+
+            result = json.loads(response.text)['result']
+            results = result['results']
+            for package in results:
+                packages[package['id']] = [
+                    self.__resource_entry(resource) for resource in package.get('resources', [])]
+                metadata_modified = package.get('metadata_modified')
+                if metadata_modified and (not last_modified or last_modified < metadata_modified):
+                    last_modified = metadata_modified
+
+            start += len(results)
+            if not results or result['count'] <= start:
+                break
+
+        return packages, last_modified
+
+    def __resource_entry(self, resource: dict) -> tuple:
+        """
+        リソースから索引に登録する(URL, テナント, サービスパス, 交換実績記録用リソースID)を取得する。
+        """
+
+        return (
+            resource.get('url'),
+            resource.get('ngsi_tenant', ''),
+            resource.get('ngsi_service_path', ''),
+            resource.get(self.__RESOURCE_ID_FOR_PROVENANCE, ''))
@@ -1,15 +1,20 @@
 ﻿# -*- coding: utf-8 -*-
 import datetime
+import functools
 import json
 import logging
-import hashlib
+import threading
+import time
 import urllib
-from io import BytesIO
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 from swagger_server.utilities.cadde_exception import CaddeException
-from swagger_server.utilities.external_interface import ExternalInterface
+from swagger_server.utilities.external_interface import ExternalInterface, ChunkStream
 from swagger_server.utilities.internal_interface import InternalInterface
+from swagger_server.utilities.ttl_cache import TTLCache
+from swagger_server.utilities.utilities import hash_chunk_stream, get_token_remaining_time
 from swagger_server.services.ckan_access import search_catalog_ckan
+from swagger_server.services.ckan_resource_index import CkanResourceIndex
 from swagger_server.services.provide_data_ngsi import provide_data_ngsi
 from swagger_server.services.provide_data_ftp import provide_data_ftp
 from swagger_server.services.provide_data_http import provide_data_http
@@ -33,6 +38,7 @@ __CONFIG_PROVIDER_ID = 'provider_id'
 __CONFIG_PROVIDER_CONNECTOR_ID = 'provider_connector_id'
 __CONFIG_PROVIDER_CONNECTOR_SECRET = 'provider_connector_secret'
 __CONFIG_TRACE_LOG_ENABLE = 'trace_log_enable'
+__CONFIG_CONTRACT_CACHE_TTL = 'contract_cache_ttl'
 
 # コンフィグ：認可確認
 __COMMON_KEY_AUTH_TARGET = 'authorization'
@@ -55,11 +61,32 @@ __COMMON_KEY_PROVENANCE_TENANT = 'tenant'
 __COMMON_KEY_PROVENANCE_SERVICEPATH = 'servicepath'
 __COMMON_KEY_PROVENANCE_ENABLE = 'enable'
 
+# 認可確認、取引市場利用、来歴登録設定の検索用情報
+# (設定のキー, URLのキー, テナントのキー, サービスパスのキー, 有効/無効のキー, 有効/無効が未設定の場合のエラーコード,
+#  コンフィグファイルの読み込みに失敗した場合のエラーコード(ngsi.json, ftp.json, http.json))
+__ENABLE_RULE_SECTIONS = [
+    (__COMMON_KEY_AUTH_TARGET, __COMMON_KEY_AUTH_URL, __COMMON_KEY_AUTH_TENANT,
+     __COMMON_KEY_AUTH_SERVICEPATH, __COMMON_KEY_AUTH_ENABLE, '010000014E',
+     ('010000011E', '010000012E', '010000013E')),
+    (__COMMON_KEY_CONTRACT_TARGET, __COMMON_KEY_CONTRACT_URL, __COMMON_KEY_CONTRACT_TENANT,
+     __COMMON_KEY_CONTRACT_SERVICEPATH, __COMMON_KEY_CONTRACT_ENABLE, '010000018E',
+     ('010000015E', '010000016E', '010000017E')),
+    (__COMMON_KEY_PROVENANCE_TARGET, __COMMON_KEY_PROVENANCE_URL, __COMMON_KEY_PROVENANCE_TENANT,
+     __COMMON_KEY_PROVENANCE_SERVICEPATH, __COMMON_KEY_PROVENANCE_ENABLE, '010000022E',
+     ('010000019E', '010000020E', '010000021E')),
+]
+
+# リソース提供手段識別子毎の検索用索引 {リソース提供手段識別子: (コンフィグファイルの内容, 索引)}
+__ENABLE_RULE_INDEX_CACHE = {}
+
 # CKAN検索用情報
 __CKAN_API_PATH = '/api/3/action/package_search'
 __CKAN_RESOURCE_SEARCH_PATH = '/api/3/action/resource_search?'
 __CKAN_RESOURCE_SEARCH_PROPATY = 'query=url:'
 
+# 公開CKANと詳細CKANのリソース検索の両方の検索結果を待つ時間(秒)
+__CKAN_SEARCH_TIMEOUT = 70
+
 # 接続先URL情報
 __ACCESS_POINT_TOKEN_FEDERATION_URL = 'http://provider_authorization:8080/token_federation'
 __ACCESS_POINT_TOKEN_CONTRACT_URL = 'http://provider_authorization:8080/token_contract'
@@ -71,6 +98,21 @@ __RESOURCE_ID_FOR_PROVENANCE = 'caddec_resource_id_for_provenance'
 
 
 __URL_SPLIT_CHAR = '/'
+__URL_SCHEME_SEPARATOR = '://'
+
+# トークン連携結果のキャッシュ
+# 認証トークン毎の認可トークンとCADDEユーザID（利用者）を、トークンの有効期限(から猶予時間を差し引いた時刻)まで保持する
+__TOKEN_FEDERATION_CACHE_MAX_SIZE = 1000
+__TOKEN_FEDERATION_CACHE_EXPIRE_SKEW = 30
+__TOKEN_FEDERATION_CACHE = TTLCache(__TOKEN_FEDERATION_CACHE_MAX_SIZE)
+
+# 認可確認結果のキャッシュ
+# (認可トークン, 補正後のリソースURL)毎の取引ID、契約形態、契約管理サービスURLを、
+# connector.jsonのcontract_cache_ttl(秒)の間保持する(未設定の場合は保持しない)
+# connector.jsonが再読み込みされた場合、データ証憑通知（送信）に失敗した場合は破棄する
+__CONTRACT_CACHE_MAX_SIZE = 1000
+__CONTRACT_CACHE = TTLCache(__CONTRACT_CACHE_MAX_SIZE)
+__CONTRACT_CACHE_CONFIG = [None]
 
 logger = logging.getLogger(__name__)
 
@@ -111,26 +153,9 @@ def detail_search(
     # 認可処理
     if authorization:
         # トークン連携(認可トークン取得)
-        token_federation_headers = {
-            'Authorization': authorization,
-            'x-cadde-provider': provider_id,
-            'x-cadde-provider-connector-id': provider_connector_id,
-            'x-cadde-provider-connector-secret': provider_connector_secret
-        }
-        token_federation_response = external_interface.http_get(
-            __ACCESS_POINT_TOKEN_FEDERATION_URL, token_federation_headers)
-
-        if token_federation_response.status_code < 200 or 300 <= token_federation_response.status_code:
-            raise CaddeException(
-                message_id='010001002E',
-                status_code=token_federation_response.status_code,
-                replace_str_list=[
-                    token_federation_response.text])
-
-        get_token = token_federation_response.headers['x-cadde-auth-token']
-        auth_token = f'Bearer {get_token}'
-
-        consumer_id = token_federation_response.headers['x-cadde-consumer-id']
+        auth_token, consumer_id = __token_federation(
+            authorization, provider_id, provider_connector_id, provider_connector_secret,
+            '010001002E', external_interface)
 
     # 対象のリソースURLが認可確認有ならば、認可確認を行う
     if ckan_authorization:
@@ -139,23 +164,9 @@ def detail_search(
             raise CaddeException('010001003E')
 
         # 認可確認
-        token_contract_headers = {
-            'Authorization': auth_token,
-            'x-cadde-provider': provider_id,
-            'x-cadde-provider-connector-id': provider_connector_id,
-            'x-cadde-provider-connector-secret': provider_connector_secret,
-            'x-cadde-resource-url': detail_ckan_url
-        }
-
-        token_contract_response = external_interface.http_get(
-            __ACCESS_POINT_TOKEN_CONTRACT_URL, token_contract_headers)
-
-        if token_contract_response.status_code < 200 or 300 <= token_contract_response.status_code:
-            raise CaddeException(
-                message_id='010001004E',
-                status_code=token_contract_response.status_code,
-                replace_str_list=[
-                    token_contract_response.text])
+        __token_contract(
+            auth_token, provider_id, provider_connector_id, provider_connector_secret,
+            detail_ckan_url, '010001004E', external_interface, internal_interface)
 
     # 詳細URLに/cadde/api/v4/catalog を追加
     if detail_ckan_url != '' and detail_ckan_url[-1:] == '/':
@@ -193,9 +204,12 @@ def fetch_data(
         authorization: str,
         options: str,
         external_interface: ExternalInterface = ExternalInterface(),
-        internal_interface: InternalInterface = InternalInterface()) -> (BytesIO, dict):
+        internal_interface: InternalInterface = InternalInterface()) -> (ChunkStream, dict):
     """
     データ管理に、NGSI、FTP、HTTPの取得を行い、取得データを返す
+    取得データはデータ管理から受信したチャンクを逐次返却するイテレータとし、ファイル全体をメモリに保持しない。
+    データ管理への取得要求とCKANの検索は認可処理(トークン連携、認可確認)と並行して行い、
+    取得データは認可処理が成功した場合のみ返却する。失敗した場合は取得データの接続を解放する。
 
     Args:
         resource_url str : リソースURL
@@ -206,7 +220,7 @@ def fetch_data(
         internal_interface : 内部リクエストを行うインタフェース
 
     Returns:
-        BytesIO :取得データ
+        ChunkStream :取得データ
         dict :ヘッダ情報 ヘッダ情報がない場合は空のdictを返す
     Raises:
         Cadde_excption: カスタムヘッダー取得が異常終了の場合 エラーコード: 010002002E
@@ -243,19 +257,11 @@ def fetch_data(
         raise CaddeException('010002002E')
 
     if (resource_api_type == 'file/http') or (resource_api_type == 'file/ftp') or (resource_api_type == 'api/ngsi'):
-        # 認証設定情報取得
-        auth_check_enable = __get_auth_check_enable(
+        # 認証設定情報、取引市場利用設定情報、来歴登録設定情報取得
+        auth_check_enable, contract_check_enable, provenance_check_enable = __get_check_enable(
             resource_url, resource_api_type, options_dict, internal_interface)
         print('auth_check_enable', auth_check_enable)
-
-        # 取引市場利用設定情報取得
-        contract_check_enable = __get_contract_check_enable(
-            resource_url, resource_api_type, options_dict, internal_interface)
         print('contract_check_enable', contract_check_enable)
-
-        # 来歴登録設定情報取得
-        provenance_check_enable = __get_provenance_check_enable(
-            resource_url, resource_api_type, options_dict, internal_interface)
         print('provenance_check_enable', provenance_check_enable)
     else:
         raise CaddeException('010002003E')
@@ -265,96 +271,202 @@ def fetch_data(
     contract_id = ''
     contract_type = ''
     contract_url = ''
+    contract_cache_key = None
+    resource_id_for_provenance = ''
 
-    # 認可情報処理
-    if authorization:
-        # トークン連携(認可トークン取得)
-        token_federation_headers = {
-            'Authorization': authorization,
-            'x-cadde-provider': provider_id,
-            'x-cadde-provider-connector-id': provider_connector_id,
-            'x-cadde-provider-connector-secret': provider_connector_secret
-        }
-        token_federation_response = external_interface.http_get(
-            __ACCESS_POINT_TOKEN_FEDERATION_URL, token_federation_headers)
+    # 識別子ごとにデータ取得(認可処理と並行して開始する)
+    provide_data_future = __submit_in_thread(
+        'fetch_pipeline', __provide_data, resource_url, resource_api_type, options_dict,
+        external_interface, internal_interface)
 
-        if token_federation_response.status_code < 200 or 300 <= token_federation_response.status_code:
-            raise CaddeException(
-                message_id='010002004E',
-                status_code=token_federation_response.status_code,
-                replace_str_list=[
-                    token_federation_response.text])
+    # CKANからの交換実績記録用リソースID取得(認可処理と並行して開始する)
+    # データ交換時のリソース検索設定がTrueの場合確認する
+    ckan_search_future = None
+    if packages_search_for_data_exchange:
+        # リソースURLからCKANを逆引き検索して、交換実績記録用リソースIDを取得
+        resource_index = __get_ckan_resource_index(
+            release_ckan_url, detail_ckan_url, internal_interface, external_interface)
+        ckan_search_future = __submit_in_thread(
+            'fetch_pipeline', __ckan_search_execute, release_ckan_url, detail_ckan_url, resource_url, resource_api_type,
+            options_dict, auth_check_enable, external_interface, resource_index)
 
-        get_token = token_federation_response.headers['x-cadde-auth-token']
-        auth_token = f'Bearer {get_token}'
+    try:
+        # 認可情報処理
+        if authorization:
+            # トークン連携(認可トークン取得)
+            auth_token, consumer_id = __token_federation(
+                authorization, provider_id, provider_connector_id, provider_connector_secret,
+                '010002004E', external_interface)
 
-        consumer_id = token_federation_response.headers['x-cadde-consumer-id']
+        # 認可確認：対象のリソースURLが認可確認有の場合
+        if auth_check_enable:
+            # 設定値との整合性確認
+            if not authorization:
+                raise CaddeException('010002005E')
 
-    # 認可確認：対象のリソースURLが認可確認有の場合
-    if auth_check_enable:
-        # 設定値との整合性確認
-        if not authorization:
-            raise CaddeException('010002005E')
+            # リソースURLを識別子に合わせて補正する
+            convert_resource_url = __convert_resource_url(
+                resource_api_type, resource_url, options_dict)
 
-        # リソースURLを識別子に合わせて補正する
-        convert_resource_url = __convert_resource_url(
-            resource_api_type, resource_url, options_dict)
+            # 認可確認
+            contract_id, contract_type, contract_url = __token_contract(
+                auth_token, provider_id, provider_connector_id, provider_connector_secret,
+                convert_resource_url, '010002006E', external_interface, internal_interface)
+            contract_cache_key = __get_contract_cache_key(
+                auth_token, provider_id, provider_connector_id, convert_resource_url)
 
-        # 認可確認
-        token_contract_headers = {
-            'Authorization': auth_token,
-            'x-cadde-provider': provider_id,
-            'x-cadde-provider-connector-id': provider_connector_id,
-            'x-cadde-provider-connector-secret': provider_connector_secret,
-            'x-cadde-resource-url': convert_resource_url
-        }
+        if ckan_search_future is not None:
+            resource_id_for_provenance = ckan_search_future.result()
 
-        token_contract_response = external_interface.http_get(
-            __ACCESS_POINT_TOKEN_CONTRACT_URL, token_contract_headers)
+        response_stream, response_headers = provide_data_future.result()
 
-        if token_contract_response.status_code < 200 or 300 <= token_contract_response.status_code:
-            raise CaddeException(
-                message_id='010002006E',
-                status_code=token_contract_response.status_code,
-                replace_str_list=[
-                    token_contract_response.text])
+    except Exception:
+        # 認可処理、CKANの検索に失敗した場合は、返却しない取得データの接続を解放する
+        if ckan_search_future is not None:
+            ckan_search_future.cancel()
+        __discard_provided_data(provide_data_future)
+        raise
 
-        contract_id = token_contract_response.headers['x-cadde-contract-id']
-        contract_type = token_contract_response.headers['x-cadde-contract-type']
-        contract_url = token_contract_response.headers['x-cadde-contract-management-service-url']
+    try:
+        provenance_id, provenance_url, response_stream = __register_exchange(
+            response_stream, resource_id_for_provenance, provider_id, consumer_id,
+            contract_check_enable, contract_id, contract_url, contract_cache_key,
+            provenance_check_enable, authorization, external_interface)
+    except Exception:
+        # 返却しない取得データの接続を解放する
+        response_stream.close()
+        raise
 
-    response_bytes = None
-    response_headers = {}
-    resource_id_for_provenance = ''
+    response_headers['x-cadde-provenance'] = provenance_id
+    response_headers['x-cadde-provenance-management-service-url'] = provenance_url
+    response_headers['x-cadde-contract-id'] = contract_id
+    response_headers['x-cadde-contract-type'] = contract_type
+    response_headers['x-cadde-contract-management-service-url'] = contract_url
 
-    # CKANからの交換実績記録用リソースID取得
-    # データ交換時のリソース検索設定がTrueの場合確認する
-    if packages_search_for_data_exchange:
-        # リソースURLからCKANを逆引き検索して、交換実績記録用リソースIDを取得
-        resource_id_for_provenance = __ckan_search_execute(
-            release_ckan_url, detail_ckan_url, resource_url, resource_api_type,
-            options_dict, auth_check_enable, external_interface)
+    # トレースログ
+    if trace_log_enable:
+        token = False
+        dt_now = datetime.datetime.now()
+        if authorization:
+            token = True
+        log_message = {}
+        log_message['log_type'] = 'browsing'
+        log_message['timestamp'] = dt_now.isoformat(timespec='microseconds')
+        log_message['consumer_id'] = consumer_id
+        log_message['provider_id'] = provider_id
+        log_message['type'] = 'data_exchange'
+        log_message['resource_url'] = resource_url
+        log_message['resource_type'] = resource_api_type
+        log_message['authorization'] = token
+        log_message['options'] = options
+        log_message['authorization_enable'] = auth_check_enable
+        log_message['contract_enable'] = contract_check_enable
+        logger.info(json.dumps(log_message, ensure_ascii=False))
+
+    return response_stream, response_headers
+
+
+def __provide_data(resource_url, resource_api_type, options_dict, external_interface, internal_interface) -> (ChunkStream, dict):
+    """
+    リソース提供手段識別子に応じて、データ管理からデータを取得する。
+
+    Args:
+        resource_url str : リソースURL
+        resource_api_type str : リソース提供手段識別子
+        options_dict dict : データ提供IFが使用するカスタムヘッダー
+        external_interface : 外部リクエストを行うインタフェース
+        internal_interface : 内部リクエストを行うインタフェース
+
+    Returns:
+        ChunkStream :取得データ
+        dict :ヘッダ情報 ヘッダ情報がない場合は空のdictを返す
+
+    """
+
+    response_stream = None
+    response_headers = {}
 
-    # 識別子ごとにデータ取得
     if (resource_api_type == 'api/ngsi'):
-        response_bytes, response_headers = provide_data_ngsi(
-            resource_url, options_dict)
+        response_stream, response_headers = provide_data_ngsi(
+            resource_url, options_dict, stream=True, external_interface=external_interface)
 
     elif (resource_api_type == 'file/ftp'):
-        response_bytes = provide_data_ftp(
-            resource_url, external_interface, internal_interface)
+        response_stream = provide_data_ftp(
+            resource_url, external_interface, internal_interface, stream=True)
 
     elif (resource_api_type == 'file/http'):
-        response_bytes = provide_data_http(
-            resource_url, options_dict, external_interface, internal_interface)
+        response_stream = provide_data_http(
+            resource_url, options_dict, external_interface, internal_interface, stream=True)
 
-    response_data = response_bytes.read()
-    response_bytes.seek(0)
+    return response_stream, response_headers
+
+
+def __discard_provided_data(provide_data_future):
+    """
+    返却しない取得データの接続を解放する。データ取得が完了していない場合は、完了時に解放する。
+
+    Args:
+        provide_data_future Future : __provide_data を実行しているFuture
+
+    """
+
+    def close_response_stream(done_future):
+        try:
+            response_stream, _ = done_future.result()
+        except BaseException:
+            return
+        if response_stream is not None:
+            response_stream.close()
+
+    if not provide_data_future.cancel():
+        provide_data_future.add_done_callback(close_response_stream)
+
+
+def __register_exchange(
+        response_stream,
+        resource_id_for_provenance,
+        provider_id,
+        consumer_id,
+        contract_check_enable,
+        contract_id,
+        contract_url,
+        contract_cache_key,
+        provenance_check_enable,
+        authorization,
+        external_interface) -> (str, str, ChunkStream):
+    """
+    データ証憑通知（送信）と送信履歴登録を行う。
+    データ証憑通知（送信）は返却する取得データの送信完了時に、逐次算出したハッシュ値を用いて行う。
+
+    Args:
+        response_stream ChunkStream : 取得データ
+        resource_id_for_provenance str : 交換実績記録用ID
+        provider_id str : CADDEユーザID（提供者）
+        consumer_id str : CADDEユーザID（利用者）
+        contract_check_enable bool : 取引市場利用有無
+        contract_id str : 取引ID
+        contract_url str : 契約管理サービスURL
+        contract_cache_key str : 認可確認結果のキャッシュのキー 認可確認を行っていない場合はNone
+        provenance_check_enable bool : 来歴登録有無
+        authorization str : 認証トークン
+        external_interface : 外部リクエストを行うインタフェース
+
+    Returns:
+        str : 識別情報
+        str : 来歴管理サービスURL
+        ChunkStream : 返却する取得データ
+
+    Raises:
+        Cadde_excption: データ証憑通知（送信）：contract_idの値が不正の場合                   エラーコード: 010002007E
+        Cadde_excption: データ証憑通知（送信）：contract_urlの値が不正の場合                  エラーコード: 010002008E
+        Cadde_excption: 送信履歴登録：交換実績記録用IDが取得できない場合                      エラーコード: 010002010E
+        Cadde_excption: 送信履歴登録：CADDEユーザID（利用者）が取得できない場合              エラーコード: 010002011E
+        Cadde_excption: 送信履歴登録が200以外の場合                                           エラーコード: 010002012E
+
+    """
 
     # リソースURLのドメインが認可確認有の場合、データ証憑通知（送信）
     if contract_check_enable:
-        # ハッシュ値算出
-        hash_value = hashlib.sha512(response_data).hexdigest()
         # 取引IDを確認する
         if not contract_id:
             raise CaddeException('010002007E')
@@ -362,24 +474,18 @@ def fetch_data(
         if not contract_url:
             raise CaddeException('010002008E')
 
-        # 取引IDと契約管理サービスURLに値がある場合、データ証憑通知（送信）を行う
-        sent_headers = {
-            'x-cadde-provider': provider_id,
-            'x-cadde-consumer': consumer_id,
-            'x-cadde-contract-id': contract_id,
-            'x-cadde-hash-get-data': hash_value,
-            'x-cadde-contract-management-service-url': contract_url,
-            'Authorization': authorization
-        }
-        sent_response = external_interface.http_post(
-            __ACCESS_POINT_VOUCHER_URL, sent_headers)
-
-        if sent_response.status_code < 200 or 300 <= sent_response.status_code:
-            raise CaddeException(
-                message_id='010002009E',
-                status_code=sent_response.status_code,
-                replace_str_list=[
-                    sent_response.text])
+        # 取引IDと契約管理サービスURLに値がある場合、取得データの送信完了時にデータ証憑通知（送信）を行う
+        response_stream = hash_chunk_stream(
+            response_stream,
+            functools.partial(
+                __voucher_sent,
+                provider_id=provider_id,
+                consumer_id=consumer_id,
+                contract_id=contract_id,
+                contract_url=contract_url,
+                contract_cache_key=contract_cache_key,
+                authorization=authorization,
+                external_interface=external_interface))
 
     provenance_id = ''
     provenance_url = ''
@@ -413,33 +519,62 @@ def fetch_data(
         provenance_id = sent_response.headers['x-cadde-provenance']
         provenance_url = sent_response.headers['x-cadde-provenance-management-service-url']
 
-    response_headers['x-cadde-provenance'] = provenance_id
-    response_headers['x-cadde-provenance-management-service-url'] = provenance_url
-    response_headers['x-cadde-contract-id'] = contract_id
-    response_headers['x-cadde-contract-type'] = contract_type
-    response_headers['x-cadde-contract-management-service-url'] = contract_url
+    return provenance_id, provenance_url, response_stream
 
-    # トレースログ
-    if trace_log_enable:
-        token = False
-        dt_now = datetime.datetime.now()
-        if authorization:
-            token = True
-        log_message = {}
-        log_message['log_type'] = 'browsing'
-        log_message['timestamp'] = dt_now.isoformat(timespec='microseconds')
-        log_message['consumer_id'] = consumer_id
-        log_message['provider_id'] = provider_id
-        log_message['type'] = 'data_exchange'
-        log_message['resource_url'] = resource_url
-        log_message['resource_type'] = resource_api_type
-        log_message['authorization'] = token
-        log_message['options'] = options
-        log_message['authorization_enable'] = auth_check_enable
-        log_message['contract_enable'] = contract_check_enable
-        logger.info(json.dumps(log_message, ensure_ascii=False))
 
-    return response_bytes, response_headers
+def __voucher_sent(
+        hash_value,
+        provider_id,
+        consumer_id,
+        contract_id,
+        contract_url,
+        contract_cache_key,
+        authorization,
+        external_interface):
+    """
+    データ証憑通知（送信）を行う。
+    取得データの送信完了後に呼び出されるため、エラーが発生した場合は利用者へ返却せずログ出力のみ行う。
+    エラーが発生した場合は、取引の状態が変わっている可能性があるため認可確認結果のキャッシュを破棄する。
+
+    Args:
+        hash_value str : 取得データのハッシュ値
+        provider_id str : CADDEユーザID（提供者）
+        consumer_id str : CADDEユーザID（利用者）
+        contract_id str : 取引ID
+        contract_url str : 契約管理サービスURL
+        contract_cache_key str : 認可確認結果のキャッシュのキー 認可確認を行っていない場合はNone
+        authorization str : 認証トークン
+        external_interface : 外部リクエストを行うインタフェース
+
+    """
+
+    sent_headers = {
+        'x-cadde-provider': provider_id,
+        'x-cadde-consumer': consumer_id,
+        'x-cadde-contract-id': contract_id,
+        'x-cadde-hash-get-data': hash_value,
+        'x-cadde-contract-management-service-url': contract_url,
+        'Authorization': authorization
+    }
+
+    try:
+        sent_response = external_interface.http_post(
+            __ACCESS_POINT_VOUCHER_URL, sent_headers)
+
+        if sent_response.status_code < 200 or 300 <= sent_response.status_code:
+            raise CaddeException(
+                message_id='010002009E',
+                status_code=sent_response.status_code,
+                replace_str_list=[
+                    sent_response.text])
+
+    except Exception as e:
+        if contract_cache_key is not None:
+            __CONTRACT_CACHE.delete(contract_cache_key)
+        if isinstance(e, CaddeException):
+            logger.warning(e.error_message)
+        else:
+            logger.warning(str(e))
 
 
 def __exchange_options_dict(options_str: str) -> dict:
@@ -469,6 +604,190 @@ def __exchange_options_dict(options_str: str) -> dict:
     return return_dict
 
 
+def __token_federation(
+        authorization,
+        provider_id,
+        provider_connector_id,
+        provider_connector_secret,
+        error_message_id,
+        external_interface) -> (str, str):
+    """
+    トークン連携(認可トークン取得)を行い、認可トークンとCADDEユーザID（利用者）を返却する。
+    同じ認証トークンでの結果は、認証トークンと認可トークンの有効期限までキャッシュから返却する。
+
+    Args:
+        authorization str : 認証トークン
+        provider_id str : CADDEユーザID（提供者）
+        provider_connector_id str : 提供者コネクタID
+        provider_connector_secret str : 提供者コネクタのシークレット
+        error_message_id str : トークン連携が200以外の場合のエラーコード
+        external_interface : 外部リクエストを行うインタフェース
+
+    Returns:
+        str : 認可トークン('Bearer '付き)
+        str : CADDEユーザID（利用者）
+
+    Raises:
+        Cadde_excption: トークン連携が200以外の場合 エラーコード: error_message_idで指定したエラーコード
+
+    """
+
+    cache_key = TTLCache.make_key(
+        authorization, provider_id, provider_connector_id, provider_connector_secret)
+    cached = __TOKEN_FEDERATION_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    token_federation_headers = {
+        'Authorization': authorization,
+        'x-cadde-provider': provider_id,
+        'x-cadde-provider-connector-id': provider_connector_id,
+        'x-cadde-provider-connector-secret': provider_connector_secret
+    }
+    token_federation_response = external_interface.http_get(
+        __ACCESS_POINT_TOKEN_FEDERATION_URL, token_federation_headers)
+
+    if token_federation_response.status_code < 200 or 300 <= token_federation_response.status_code:
+        raise CaddeException(
+            message_id=error_message_id,
+            status_code=token_federation_response.status_code,
+            replace_str_list=[
+                token_federation_response.text])
+
+    get_token = token_federation_response.headers['x-cadde-auth-token']
+    auth_token = f'Bearer {get_token}'
+
+    consumer_id = token_federation_response.headers['x-cadde-consumer-id']
+
+    # 認証トークンと認可トークンのうち、先に有効期限を迎える方に合わせて保持する
+    ttl = min(
+        get_token_remaining_time(authorization, __TOKEN_FEDERATION_CACHE_EXPIRE_SKEW),
+        get_token_remaining_time(get_token, __TOKEN_FEDERATION_CACHE_EXPIRE_SKEW))
+    __TOKEN_FEDERATION_CACHE.set(cache_key, (auth_token, consumer_id), ttl)
+
+    return auth_token, consumer_id
+
+
+def __token_contract(
+        auth_token,
+        provider_id,
+        provider_connector_id,
+        provider_connector_secret,
+        resource_url,
+        error_message_id,
+        external_interface,
+        internal_interface) -> (str, str, str):
+    """
+    認可確認を行い、取引ID、契約形態、契約管理サービスURLを返却する。
+    connector.jsonのcontract_cache_ttlが設定されている場合、同じ認可トークンとリソースURLでの結果を
+    設定された時間(認可トークンの有効期限が先に来る場合はその時刻)までキャッシュから返却する。
+
+    Args:
+        auth_token str : 認可トークン('Bearer '付き)
+        provider_id str : CADDEユーザID（提供者）
+        provider_connector_id str : 提供者コネクタID
+        provider_connector_secret str : 提供者コネクタのシークレット
+        resource_url str : リソースURL
+        error_message_id str : 認可確認が200以外の場合のエラーコード
+        external_interface : 外部リクエストを行うインタフェース
+        internal_interface : 内部リクエストを行うインタフェース
+
+    Returns:
+        str : 取引ID
+        str : 契約形態
+        str : 契約管理サービスURL
+
+    Raises:
+        Cadde_excption: 認可確認が200以外の場合 エラーコード: error_message_idで指定したエラーコード
+
+    """
+
+    cache_ttl = __get_contract_cache_ttl(internal_interface)
+    cache_key = __get_contract_cache_key(
+        auth_token, provider_id, provider_connector_id, resource_url)
+    if 0 < cache_ttl:
+        cached = __CONTRACT_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    token_contract_headers = {
+        'Authorization': auth_token,
+        'x-cadde-provider': provider_id,
+        'x-cadde-provider-connector-id': provider_connector_id,
+        'x-cadde-provider-connector-secret': provider_connector_secret,
+        'x-cadde-resource-url': resource_url
+    }
+
+    token_contract_response = external_interface.http_get(
+        __ACCESS_POINT_TOKEN_CONTRACT_URL, token_contract_headers)
+
+    if token_contract_response.status_code < 200 or 300 <= token_contract_response.status_code:
+        raise CaddeException(
+            message_id=error_message_id,
+            status_code=token_contract_response.status_code,
+            replace_str_list=[
+                token_contract_response.text])
+
+    contract_id = token_contract_response.headers['x-cadde-contract-id']
+    contract_type = token_contract_response.headers['x-cadde-contract-type']
+    contract_url = token_contract_response.headers['x-cadde-contract-management-service-url']
+
+    if 0 < cache_ttl:
+        ttl = min(
+            cache_ttl,
+            get_token_remaining_time(auth_token, __TOKEN_FEDERATION_CACHE_EXPIRE_SKEW))
+        __CONTRACT_CACHE.set(
+            cache_key, (contract_id, contract_type, contract_url), ttl)
+
+    return contract_id, contract_type, contract_url
+
+
+def __get_contract_cache_key(auth_token, provider_id, provider_connector_id, resource_url) -> str:
+    """
+    認可確認結果のキャッシュのキーを作成する。
+
+    Args:
+        auth_token str : 認可トークン
+        provider_id str : CADDEユーザID（提供者）
+        provider_connector_id str : 提供者コネクタID
+        resource_url str : リソースURL
+
+    Returns:
+        str : キャッシュのキー
+    """
+
+    return TTLCache.make_key(auth_token, provider_id, provider_connector_id, resource_url)
+
+
+def __get_contract_cache_ttl(internal_interface) -> float:
+    """
+    connector.jsonから認可確認結果のキャッシュ保持時間を取得する。
+    connector.jsonが再読み込みされていた場合は、キャッシュを破棄する。
+
+    Args:
+        internal_interface : 内部リクエストを行うインタフェース
+
+    Returns:
+        float : キャッシュ保持時間(秒) 設定がない場合、取得できない場合は0
+    """
+
+    try:
+        connector_config = internal_interface.config_read(
+            __CONFIG_CONNECTOR_FILE_PATH)
+    except Exception:
+        __CONTRACT_CACHE.clear()
+        return 0
+
+    if __CONTRACT_CACHE_CONFIG[0] is not connector_config:
+        __CONTRACT_CACHE.clear()
+        __CONTRACT_CACHE_CONFIG[0] = connector_config
+
+    try:
+        return float(connector_config.get(__CONFIG_CONTRACT_CACHE_TTL, 0))
+    except Exception:
+        return 0
+
+
 def __get_ckan_config(internal_interface) -> (str, str):
     """
     ckan.configから情報を取得して返却する
@@ -543,6 +862,31 @@ def __get_ckan_config(internal_interface) -> (str, str):
     return release_ckan_url, detail_ckan_url, ckan_authorization, packages_search_for_data_exchange
 
 
+def __get_ckan_resource_index(release_ckan_url, detail_ckan_url, internal_interface, external_interface):
+    """
+    provider_ckan.jsonのresource_indexが有効な場合、CKANのリソース索引を取得する。
+
+    Args:
+        release_ckan_url str : 公開CKANのURL
+        detail_ckan_url str : 詳細CKANのURL
+        internal_interface : 内部リクエストを行うインタフェース
+        external_interface : 外部リクエストを行うインタフェース
+
+    Returns:
+        CkanResourceIndex : CKANのリソース索引 索引を使用しない場合はNone
+
+    """
+
+    try:
+        ckan_config = internal_interface.config_read(
+            __CONFIG_CKAN_URL_FILE_PATH)
+    except Exception:
+        return None
+
+    return CkanResourceIndex.from_config(
+        ckan_config, release_ckan_url, detail_ckan_url, external_interface)
+
+
 def __get_connector_config(internal_interface) -> (str, str, str, str):
     """
     connector.configから情報を取得して返却する
@@ -602,12 +946,16 @@ def __get_connector_config(internal_interface) -> (str, str, str, str):
     return provider_id, provider_connector_id, provider_connector_secret, trace_log_enable
 
 
-def __get_auth_check_enable(resource_url,
-                            resource_api_type,
-                            options_dict,
-                            internal_interface) -> str:
+def __get_check_enable(resource_url,
+                       resource_api_type,
+                       options_dict,
+                       internal_interface) -> (bool, bool, bool):
     """
-    リソースURLのドメインからhttp.json、ftp.json、ngsi.jsonを検索して、認可確認の有無を返却
+    リソースURLからhttp.json、ftp.json、ngsi.jsonの設定を検索して、認可確認、取引市場利用、来歴登録設定の有無を返却
+    コンフィグファイルの設定から作成した索引を用いて、3つの設定を1回の検索で取得する。
+    各設定で条件に一致する設定が複数ある場合は、コンフィグファイル上で先に記載された設定を使用する。
+    一致の条件、設定が不正な場合の扱い、エラーコードは設定毎に検索していた従来の処理と同じとする。
+
     Args:
         resource_url str : リソースURL
         resource_api_type str : リソース提供手段識別子
@@ -615,277 +963,257 @@ def __get_auth_check_enable(resource_url,
         internal_interface : 内部リクエストを行うインタフェース
 
     Returns:
-        enable: 認可確認有無(True or False)
+        bool: 認可確認有無(True or False)
+        bool: 取引市場利用(True or False)
+        bool: 来歴登録設定情報(True or False)
 
     Raises:
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(ngsi.json)       エラーコード: 010000011E
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(ftp.json)        エラーコード: 010000012E
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(http.json)       エラーコード: 010000013E
-        Cadde_excption: 必須パラメータが設定されていなかった場合(リソースURL)       エラーコード: 010000014E
+        Cadde_excption: 認可確認の取得時にコンフィグファイルの読み込みに失敗した場合(ngsi.json)       エラーコード: 010000011E
+        Cadde_excption: 認可確認の取得時にコンフィグファイルの読み込みに失敗した場合(ftp.json)        エラーコード: 010000012E
+        Cadde_excption: 認可確認の取得時にコンフィグファイルの読み込みに失敗した場合(http.json)       エラーコード: 010000013E
+        Cadde_excption: 必須パラメータが設定されていなかった場合(認可確認のenable)                   エラーコード: 010000014E
+        Cadde_excption: 取引市場利用の取得時にコンフィグファイルの読み込みに失敗した場合(ngsi.json)   エラーコード: 010000015E
+        Cadde_excption: 取引市場利用の取得時にコンフィグファイルの読み込みに失敗した場合(ftp.json)    エラーコード: 010000016E
+        Cadde_excption: 取引市場利用の取得時にコンフィグファイルの読み込みに失敗した場合(http.json)   エラーコード: 010000017E
+        Cadde_excption: 必須パラメータが設定されていなかった場合(取引市場利用のenable)               エラーコード: 010000018E
+        Cadde_excption: 来歴登録設定の取得時にコンフィグファイルの読み込みに失敗した場合(ngsi.json)   エラーコード: 010000019E
+        Cadde_excption: 来歴登録設定の取得時にコンフィグファイルの読み込みに失敗した場合(ftp.json)    エラーコード: 010000020E
+        Cadde_excption: 来歴登録設定の取得時にコンフィグファイルの読み込みに失敗した場合(http.json)   エラーコード: 010000021E
+        Cadde_excption: 必須パラメータが設定されていなかった場合(来歴登録設定のenable)               エラーコード: 010000022E
 
     """
 
-    target_auth_data = []
-    enable = True
+    # 索引毎の検索結果 {id(索引): 設定毎の一致した設定内容}
+    matched_rules_by_index = {}
 
-    if (resource_api_type == 'api/ngsi'):
-        try:
-            config_data = internal_interface.config_read(
-                __CONFIG_NGSI_FILE_PATH)
-        except Exception:
-            raise CaddeException('010000011E')
+    enable_list = []
+    for section_no, section in enumerate(__ENABLE_RULE_SECTIONS):
+        _, _, _, _, enable_key, error_id, read_error_ids = section
 
-    elif (resource_api_type == 'file/ftp'):
+        # 設定毎に読み込む(内容が変わっていなければ、コンフィグファイルの内容、索引は同じものを使用する)
+        if (resource_api_type == 'api/ngsi'):
+            config_file_path, read_error_id = __CONFIG_NGSI_FILE_PATH, read_error_ids[0]
+        elif (resource_api_type == 'file/ftp'):
+            config_file_path, read_error_id = __CONFIG_FTP_FILE_PATH, read_error_ids[1]
+        else:
+            config_file_path, read_error_id = __CONFIG_HTTP_FILE_PATH, read_error_ids[2]
         try:
-            config_data = internal_interface.config_read(
-                __CONFIG_FTP_FILE_PATH)
+            config_data = internal_interface.config_read(config_file_path)
         except Exception:
-            raise CaddeException('010000012E')
+            raise CaddeException(read_error_id)
 
-    elif (resource_api_type == 'file/http'):
-        try:
-            config_data = internal_interface.config_read(
-                __CONFIG_HTTP_FILE_PATH)
-        except Exception:
-            raise CaddeException('010000013E')
+        rule_index = __get_enable_rule_index(resource_api_type, config_data)
+        matched_rules = matched_rules_by_index.get(id(rule_index))
+        if matched_rules is None:
+            matched_rules = __match_enable_rules(
+                resource_url, resource_api_type, options_dict, rule_index)
+            matched_rules_by_index[id(rule_index)] = matched_rules
 
-    try:
-        if (resource_api_type == 'api/ngsi'):
-            for e in config_data[__COMMON_KEY_AUTH_TARGET]:
-                ngsi_tenant, ngsi_service_path = __get_ngsi_option(
-                    options_dict)
+        enable = True
+        rule = matched_rules[section_no]
+        if section_no not in rule_index['invalid_sections'] and rule is not None:
+            if enable_key not in rule:
+                raise CaddeException(
+                    message_id=error_id,
+                    replace_str_list=[enable_key])
 
-                if __COMMON_KEY_AUTH_URL not in e:
-                    continue
+            enable = rule[enable_key]
+        enable_list.append(enable)
 
-                access_url, ngsi_type = ___parse_ngsi_url(resource_url)
-                auth_access_url, auth_ngsi_type = ___parse_ngsi_url(
-                    e[__COMMON_KEY_AUTH_URL])
+    return tuple(enable_list)
 
-                if auth_access_url != access_url or auth_ngsi_type != ngsi_type:
-                    continue
 
-                if __COMMON_KEY_AUTH_TENANT in e and ngsi_tenant != e[__COMMON_KEY_AUTH_TENANT]:
-                    continue
+def __get_enable_rule_index(resource_api_type, config_data) -> dict:
+    """
+    コンフィグファイルの内容に対応する検索用の索引を取得する。
+    コンフィグファイルが再読み込みされた場合(内容のオブジェクトが変わった場合)のみ索引を作成し直す。
 
-                if __COMMON_KEY_AUTH_TENANT not in e and '' != ngsi_tenant:
-                    continue
+    Args:
+        resource_api_type str : リソース提供手段識別子
+        config_data dict : コンフィグファイルの内容
 
-                if __COMMON_KEY_AUTH_SERVICEPATH in e and ngsi_service_path != e[__COMMON_KEY_AUTH_SERVICEPATH]:
-                    continue
+    Returns:
+        dict: 索引
+    """
 
-                if __COMMON_KEY_AUTH_SERVICEPATH not in e and '' != ngsi_service_path:
-                    continue
+    cached = __ENABLE_RULE_INDEX_CACHE.get(resource_api_type)
+    if cached is not None and cached[0] is config_data:
+        return cached[1]
 
-                target_auth_data.append(e)
+    rule_index = __build_enable_rule_index(resource_api_type, config_data)
+    __ENABLE_RULE_INDEX_CACHE[resource_api_type] = (config_data, rule_index)
 
-        else:
-            target_auth_data = [e for e in config_data[__COMMON_KEY_AUTH_TARGET]
-                                if e[__COMMON_KEY_AUTH_URL] in resource_url]
+    return rule_index
 
-    except Exception:
-        # コンフィグファイルから指定したURLの情報が取得できない場合は何もしない
-        pass
-    if target_auth_data:
-        if __COMMON_KEY_AUTH_ENABLE not in target_auth_data[0]:
-            raise CaddeException(
-                '010000014E',
-                replace_str_list=[__COMMON_KEY_AUTH_ENABLE])
 
-        enable = target_auth_data[0][__COMMON_KEY_AUTH_ENABLE]
-
-    return enable
-
-
-def __get_contract_check_enable(resource_url,
-                                resource_api_type,
-                                options_dict,
-                                internal_interface) -> str:
+def __build_enable_rule_index(resource_api_type, config_data) -> dict:
     """
-    リソースURLのドメインからhttp.json、ftp.json、ngsi.jsonを検索して、取引市場利用の有無を返却
+    認可確認、取引市場利用、来歴登録設定の設定から検索用の索引を作成する。
+    NGSIは(NGSI URL, NGSIデータ種別, テナント, サービスパス)をキーとしたハッシュ表を作成する。
+    従来の検索と同様に、不正な設定があった場合はそれより前に記載された設定のみを検索対象とする。
+    http/ftpはスキームを含む設定URLをキーとしたハッシュ表と、設定URLの文字数、スキームの区切り文字の位置の一覧を作成する。
+    スキームを含まない設定URLは部分一致で検索するため、一覧で保持する。
+    従来の検索と同様に、不正な設定があった場合はその設定の種類全体を該当設定なしとして扱う。
+    索引の各値は設定毎の(コンフィグファイル上の順番, 設定内容)のリスト(該当設定がない場合はNone)とする。
+
     Args:
-        resource_url str : リソースURL
         resource_api_type str : リソース提供手段識別子
-        options_dict str : データ提供IFが使用するカスタムヘッダー
-        internal_interface : 内部リクエストを行うインタフェース
+        config_data dict : コンフィグファイルの内容
 
     Returns:
-        enable: 取引市場利用(True or False)
-
-    Raises:
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(ngsi.json)       エラーコード: 010000015E
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(ftp.json)        エラーコード: 010000016E
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(http.json)       エラーコード: 010000017E
-        Cadde_excption: 必須パラメータが設定されていなかった場合(リソースURL)       エラーコード: 010000018E
+        dict: 索引 {
+            'ngsi': NGSI用ハッシュ表,
+            'scheme': スキームを含む設定URLのハッシュ表,
+            'scheme_lengths': スキームを含む設定URLの文字数の一覧,
+            'scheme_offsets': スキームを含む設定URL内のスキームの区切り文字の位置の一覧,
+            'substring': スキームを含まない設定 [(設定URL, 設定毎の(順番, 設定内容)のリスト)],
+            'invalid_sections': 設定が不正で、該当設定なしとして扱う設定の番号
+        }
 
     """
 
-    target_contract_data = []
-    enable = True
-
-    if (resource_api_type == 'api/ngsi'):
-        try:
-            config_data = internal_interface.config_read(
-                __CONFIG_NGSI_FILE_PATH)
-        except Exception:
-            raise CaddeException('010000015E')
-
-    elif (resource_api_type == 'file/ftp'):
+    rule_index = {
+        'ngsi': {},
+        'scheme': {},
+        'scheme_lengths': [],
+        'scheme_offsets': [],
+        'substring': [],
+        'invalid_sections': set()
+    }
+
+    for section_no, (target_key, url_key, tenant_key, service_path_key, _, _, _) in enumerate(__ENABLE_RULE_SECTIONS):
+        section_entries = []
         try:
-            config_data = internal_interface.config_read(
-                __CONFIG_FTP_FILE_PATH)
-        except Exception:
-            raise CaddeException('010000016E')
+            for rule_no, e in enumerate(config_data[target_key]):
+                if (resource_api_type == 'api/ngsi'):
+                    if url_key not in e:
+                        continue
+                    access_url, ngsi_type = ___parse_ngsi_url(e[url_key])
+                    key = (
+                        access_url,
+                        ngsi_type,
+                        e.get(tenant_key, ''),
+                        e.get(service_path_key, ''))
+                    try:
+                        hash(key)
+                    except TypeError:
+                        # テナント、サービスパスが文字列でない設定はどのリソースにも一致しない
+                        continue
+                else:
+                    key = e[url_key]
+                    if not isinstance(key, str):
+                        raise TypeError(key)
+                section_entries.append((key, rule_no, e))
 
-    elif (resource_api_type == 'file/http'):
-        try:
-            config_data = internal_interface.config_read(
-                __CONFIG_HTTP_FILE_PATH)
         except Exception:
-            raise CaddeException('010000017E')
-
-    try:
-        if (resource_api_type == 'api/ngsi'):
-            for e in config_data[__COMMON_KEY_CONTRACT_TARGET]:
-                ngsi_tenant, ngsi_service_path = __get_ngsi_option(
-                    options_dict)
-
-                if __COMMON_KEY_CONTRACT_URL not in e:
-                    continue
-
-                access_url, ngsi_type = ___parse_ngsi_url(resource_url)
-                contract_access_url, contract_ngsi_type = ___parse_ngsi_url(
-                    e[__COMMON_KEY_CONTRACT_URL])
-
-                if contract_access_url != access_url or contract_ngsi_type != ngsi_type:
-                    continue
-
-                if __COMMON_KEY_CONTRACT_TENANT in e and ngsi_tenant != e[__COMMON_KEY_CONTRACT_TENANT]:
-                    continue
+            if (resource_api_type != 'api/ngsi'):
+                rule_index['invalid_sections'].add(section_no)
+                continue
 
-                if __COMMON_KEY_CONTRACT_TENANT not in e and '' != ngsi_tenant:
-                    continue
+        for key, rule_no, e in section_entries:
+            if (resource_api_type == 'api/ngsi'):
+                entry = rule_index['ngsi'].setdefault(key, [None] * len(__ENABLE_RULE_SECTIONS))
+            elif __URL_SCHEME_SEPARATOR in key:
+                entry = rule_index['scheme'].setdefault(key, [None] * len(__ENABLE_RULE_SECTIONS))
+            else:
+                entry = [None] * len(__ENABLE_RULE_SECTIONS)
+                rule_index['substring'].append((key, entry))
 
-                if __COMMON_KEY_CONTRACT_SERVICEPATH in e and ngsi_service_path != e[__COMMON_KEY_CONTRACT_SERVICEPATH]:
-                    continue
+            # 同じキーの設定が複数ある場合は先に記載された設定を優先する
+            if entry[section_no] is None:
+                entry[section_no] = (rule_no, e)
 
-                if __COMMON_KEY_CONTRACT_SERVICEPATH not in e and '' != ngsi_service_path:
-                    continue
+    rule_index['scheme_lengths'] = sorted(
+        {len(key) for key in rule_index['scheme']})
+    rule_index['scheme_offsets'] = sorted(
+        {key.index(__URL_SCHEME_SEPARATOR) for key in rule_index['scheme']})
 
-                target_contract_data.append(e)
+    return rule_index
 
-        else:
-            target_contract_data = [e for e in config_data[__COMMON_KEY_CONTRACT_TARGET]
-                                    if e[__COMMON_KEY_CONTRACT_URL] in resource_url]
 
-    except Exception:
-        # コンフィグファイルから指定したURLの情報が取得できない場合は何もしない
-        pass
-    if target_contract_data:
-        if __COMMON_KEY_CONTRACT_ENABLE not in target_contract_data[0]:
-            raise CaddeException(
-                message_id='010000018E',
-                replace_str_list=[__COMMON_KEY_CONTRACT_ENABLE])
-
-        enable = target_contract_data[0][__COMMON_KEY_CONTRACT_ENABLE]
-
-    return enable
-
-
-def __get_provenance_check_enable(resource_url,
-                                  resource_api_type,
-                                  options_dict,
-                                  internal_interface) -> str:
+def __match_enable_rules(resource_url, resource_api_type, options_dict, rule_index) -> list:
     """
-    リソースURLのドメインからhttp.json、ftp.json、ngsi.jsonを検索して、来歴登録設定情報の有無を返却
+    リソースURLに一致する設定を、索引を用いて設定毎に取得する。
+    リソースURLを解析できない場合等は、従来の検索と同様に一致する設定なしとする。
+
     Args:
         resource_url str : リソースURL
         resource_api_type str : リソース提供手段識別子
         options_dict str : データ提供IFが使用するカスタムヘッダー
-        internal_interface : 内部リクエストを行うインタフェース
+        rule_index dict : 索引
 
     Returns:
-        enable: 来歴登録設定情報(True or False)
-
-    Raises:
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(ngsi.json)       エラーコード: 010000019E
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(ftp.json)        エラーコード: 010000020E
-        Cadde_excption: コンフィグファイルの読み込みに失敗した場合(http.json)       エラーコード: 010000021E
-        Cadde_excption: 必須パラメータが設定されていなかった場合(リソースURL)       エラーコード: 010000022E
+        list: 設定毎の一致した設定内容(一致する設定がない場合はNone)
 
     """
 
-    target_provenance_data = []
-    enable = True
-
-    if (resource_api_type == 'api/ngsi'):
-        try:
-            config_data = internal_interface.config_read(
-                __CONFIG_NGSI_FILE_PATH)
-        except Exception:
-            raise CaddeException('010000019E')
-
-    elif (resource_api_type == 'file/ftp'):
-        try:
-            config_data = internal_interface.config_read(
-                __CONFIG_FTP_FILE_PATH)
-        except Exception:
-            raise CaddeException('010000020E')
-
-    elif (resource_api_type == 'file/http'):
-        try:
-            config_data = internal_interface.config_read(
-                __CONFIG_HTTP_FILE_PATH)
-        except Exception:
-            raise CaddeException('010000021E')
-
     try:
         if (resource_api_type == 'api/ngsi'):
-            for e in config_data[__COMMON_KEY_PROVENANCE_TARGET]:
-                ngsi_tenant, ngsi_service_path = __get_ngsi_option(
-                    options_dict)
-
-                if __COMMON_KEY_PROVENANCE_URL not in e:
-                    continue
-
-                access_url, ngsi_type = ___parse_ngsi_url(resource_url)
-                provenance_access_url, provenance_ngsi_type = ___parse_ngsi_url(
-                    e[__COMMON_KEY_PROVENANCE_URL])
+            ngsi_tenant, ngsi_service_path = __get_ngsi_option(options_dict)
+            access_url, ngsi_type = ___parse_ngsi_url(resource_url)
+            entry = rule_index['ngsi'].get(
+                (access_url, ngsi_type, ngsi_tenant, ngsi_service_path))
+            if entry is not None:
+                return [rule[1] if rule is not None else None for rule in entry]
+        else:
+            return __match_url_rules(resource_url, rule_index)
+    except Exception:
+        # コンフィグファイルから指定したURLの情報が取得できない場合は何もしない
+        pass
 
-                if provenance_access_url != access_url or provenance_ngsi_type != ngsi_type:
-                    continue
+    return [None] * len(__ENABLE_RULE_SECTIONS)
 
-                if __COMMON_KEY_PROVENANCE_TENANT in e and ngsi_tenant != e[__COMMON_KEY_PROVENANCE_TENANT]:
-                    continue
 
-                if __COMMON_KEY_PROVENANCE_TENANT not in e and '' != ngsi_tenant:
-                    continue
+def __match_url_rules(resource_url, rule_index) -> list:
+    """
+    http/ftpのリソースURLに一致する設定を、索引を用いて設定毎に取得する。
+    従来の検索と同様に、設定URLがリソースURLに部分一致する設定のうち、コンフィグファイル上で先に記載された設定を返却する。
+    スキームを含む設定URLは、リソースURL内のスキームの区切り文字の位置から一致し得る開始位置を求め、
+    開始位置毎に設定URLの文字数分の文字列をハッシュ表で検索する。
 
-                if __COMMON_KEY_PROVENANCE_SERVICEPATH in e and ngsi_service_path != e[
-                        __COMMON_KEY_PROVENANCE_SERVICEPATH]:
-                    continue
+    Args:
+        resource_url str : リソースURL
+        rule_index dict : 索引
 
-                if __COMMON_KEY_PROVENANCE_SERVICEPATH not in e and '' != ngsi_service_path:
-                    continue
+    Returns:
+        list: 設定毎の一致した設定内容(一致する設定がない場合はNone)
 
-                target_provenance_data.append(e)
+    """
 
+    candidates = []
+
+    start_positions = set()
+    separator_position = resource_url.find(__URL_SCHEME_SEPARATOR)
+    while 0 <= separator_position:
+        for offset in rule_index['scheme_offsets']:
+            if offset <= separator_position:
+                start_positions.add(separator_position - offset)
+        separator_position = resource_url.find(
+            __URL_SCHEME_SEPARATOR, separator_position + 1)
+
+    for start_position in start_positions:
+        for length in rule_index['scheme_lengths']:
+            if len(resource_url) < start_position + length:
+                break
+            entry = rule_index['scheme'].get(
+                resource_url[start_position:start_position + length])
+            if entry is not None:
+                candidates.append(entry)
+
+    for key, entry in rule_index['substring']:
+        if key in resource_url:
+            candidates.append(entry)
+
+    matched_rules = []
+    for section_no in range(len(__ENABLE_RULE_SECTIONS)):
+        matched = [entry[section_no]
+                   for entry in candidates if entry[section_no] is not None]
+        if matched:
+            matched_rules.append(min(matched, key=lambda m: m[0])[1])
         else:
-            target_provenance_data = [e for e in config_data[__COMMON_KEY_PROVENANCE_TARGET]
-                                      if e[__COMMON_KEY_PROVENANCE_URL] in resource_url]
-
-    except Exception:
-        # コンフィグファイルから指定したURLの情報が取得できない場合は何もしない
-        pass
-    if target_provenance_data:
-        if __COMMON_KEY_PROVENANCE_ENABLE not in target_provenance_data[0]:
-            raise CaddeException(
-                '010000022E',
-                replace_str_list=[__COMMON_KEY_PROVENANCE_ENABLE])
+            matched_rules.append(None)
 
-        enable = target_provenance_data[0][__COMMON_KEY_PROVENANCE_ENABLE]
-
-    return enable
+    return matched_rules
 
 
 def __ckan_search_execute(release_ckan_url,
@@ -894,10 +1222,14 @@ def __ckan_search_execute(release_ckan_url,
                           resource_api_type,
                           options_dict,
                           auth_check_enable,
-                          external_interface) -> (str,
-                                                  str):
+                          external_interface,
+                          resource_index=None) -> (str,
+                                                   str):
     """
     公開Ckanと詳細CKANを検索して交換実績記録用リソースIDを返却
+    リソース索引が有効で、索引に該当するリソースがある場合はCKANを検索せずに索引から返却する。
+    公開CKANと詳細CKANの検索は並行して行い、両方の結果を待つ時間は共通の期限とする。
+    両方の検索でエラーが発生した場合は、公開CKANの検索のエラーを返却する。
     Args:
         release_ckan_url str : 公開CKANのURL
         detail_ckan_url: 詳細CKANのURL
@@ -906,6 +1238,7 @@ def __ckan_search_execute(release_ckan_url,
         options_dict: データ提供IFが使用するカスタムヘッダー
         auth_check_enable: 認可確認有無(True or False)
         external_interface: 外部リクエストを行うインタフェース
+        resource_index: CKANのリソース索引 索引を使用しない場合はNone
 
     Returns:
         resource_id_for_provenance: 交換実績記録用ID(str or None)
@@ -913,6 +1246,7 @@ def __ckan_search_execute(release_ckan_url,
 
     Raises:
         Cadde_excption: 交換実績記録用リソースIDに登録されている値が混在している場合      エラーコード: 010000023E
+        Cadde_excption: 期限内に検索結果が取得できなかった場合                              エラーコード: 000001001E
 
     """
 
@@ -948,19 +1282,41 @@ def __ckan_search_execute(release_ckan_url,
         query_url = urllib.parse.quote(resource_url)
         query_string = __CKAN_RESOURCE_SEARCH_PROPATY + query_url
 
-    release_search_results_list = []
+    if resource_index is not None:
+        ngsi_tenant, ngsi_service_path = __get_ngsi_option(options_dict)
+        provenance_id_list = resource_index.lookup(
+            resource_url, resource_api_type == 'api/ngsi', ngsi_tenant, ngsi_service_path)
+        if provenance_id_list is not None:
+            return __select_resource_id_for_provenance(provenance_id_list)
+
+    deadline = time.monotonic() + __CKAN_SEARCH_TIMEOUT
 
+    release_future = None
     if release_ckan_url is not None:
-        release_ckan_text = search_catalog_ckan(
-            release_ckan_url, query_string, external_interface)
+        release_future = __submit_in_thread(
+            'ckan_search', search_catalog_ckan, release_ckan_url, query_string, external_interface)
+
+    detail_future = None
+    if detail_ckan_url is not None:
+        detail_future = __submit_in_thread(
+            'ckan_search', search_catalog_ckan, detail_ckan_url, query_string, external_interface)
+
+    release_search_results_list = []
+
+    if release_future is not None:
+        try:
+            release_ckan_text = __wait_ckan_search(release_future, deadline)
+        except Exception:
+            if detail_future is not None:
+                detail_future.cancel()
+            raise
         release_search_results_list = json.loads(
             release_ckan_text)['result']['results']
 
     detail_search_results_list = []
 
-    if detail_ckan_url is not None:
-        detail_ckan_text = search_catalog_ckan(
-            detail_ckan_url, query_string, external_interface)
+    if detail_future is not None:
+        detail_ckan_text = __wait_ckan_search(detail_future, deadline)
         detail_search_results_list = json.loads(
             detail_ckan_text)['result']['results']
 
@@ -971,19 +1327,93 @@ def __ckan_search_execute(release_ckan_url,
         resource_api_type,
         options_dict)
 
+    return __select_resource_id_for_provenance(
+        [one_data[__RESOURCE_ID_FOR_PROVENANCE] for one_data in ckan_check_result_list])
+
+
+def __select_resource_id_for_provenance(provenance_id_list) -> (str):
+    """
+    該当したリソースの交換実績記録用リソースIDから、交換実績記録用リソースIDを決定する。
+
+    Args:
+        provenance_id_list list : 交換実績記録用リソースIDのリスト(未設定のリソースは空文字)
+
+    Returns:
+        resource_id_for_provenance: 交換実績記録用ID(str or None)
+
+    Raises:
+        Cadde_excption: 交換実績記録用リソースIDに登録されている値が混在している場合      エラーコード: 010000023E
+
+    """
+
     resource_id_for_provenance = None
 
-    for one_data in ckan_check_result_list:
-        if resource_id_for_provenance is None and one_data[__RESOURCE_ID_FOR_PROVENANCE] != '':
-            resource_id_for_provenance = one_data[__RESOURCE_ID_FOR_PROVENANCE]
+    for provenance_id in provenance_id_list:
+        if resource_id_for_provenance is None and provenance_id != '':
+            resource_id_for_provenance = provenance_id
 
-        if (one_data[__RESOURCE_ID_FOR_PROVENANCE] != ''
-                and resource_id_for_provenance != one_data[__RESOURCE_ID_FOR_PROVENANCE]):
+        if provenance_id != '' and resource_id_for_provenance != provenance_id:
             raise CaddeException('010000023E')
 
     return resource_id_for_provenance
 
 
+def __submit_in_thread(name, fn, *args) -> Future:
+    """
+    リクエスト毎に新しいスレッドで処理を実行し、結果を設定するFutureを返却する。
+    プロセス内で共有するスレッドプールを使用すると、同時リクエスト数が多い場合に
+    他のリクエストの処理の完了を待つことになり、その時間がタイムアウトに含まれるため、共有しない。
+    スレッドの開始前に取り消された場合は処理を実行しない。
+
+    Args:
+        name str : スレッド名
+        fn Callable : 実行する処理
+        args : 処理の引数
+
+    Returns:
+        Future : 処理の結果、または発生した例外が設定されるFuture
+
+    """
+
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+
+    return future
+
+
+def __wait_ckan_search(future, deadline) -> (str):
+    """
+    並行して実行したCKANの検索結果を期限まで待って返却する。
+
+    Args:
+        future Future : CKANの検索を実行しているFuture
+        deadline float : 期限(time.monotonic()の値)
+
+    Returns:
+        str : CKANから検索した結果の文字列
+
+    Raises:
+        Cadde_excption: 期限内に検索結果が取得できなかった場合      エラーコード: 000001001E
+        Cadde_excption: CKANの検索でエラーが発生した場合は、そのエラー
+
+    """
+
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except FutureTimeoutError:
+        future.cancel()
+        raise CaddeException('000001001E')
+
+
 def __ckan_result_check(
         release_search_results_list,
         detail_search_results_list,
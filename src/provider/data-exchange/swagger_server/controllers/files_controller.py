@@ -6,7 +6,7 @@ import logging
 from swagger_server.utilities.message_map import get_message
 from swagger_server.services.service import data_exchange
 from swagger_server.utilities.external_interface import ExternalInterface
-from swagger_server.utilities.utilities import log_message_none_parameter_replace, get_url_file_name
+from swagger_server.utilities.utilities import log_message_none_parameter_replace, get_url_file_name, remove_hop_by_hop_headers
 
 logger = logging.getLogger(__name__)
 external_interface = ExternalInterface()
@@ -63,9 +63,11 @@ def files(x_cadde_resource_url=None, x_cadde_resource_api_type=None, Authorizati
         options,
         external_interface)
 
+    # 提供者コネクタメインから受信したデータをチャンク単位で逐次送信する
+    # 転送方式は本サーバで設定するため、Transfer-Encoding等の接続に関するヘッダは引き継がない
     response = Response(
-        response=data.content,
-        headers=dict(data.headers),
+        response=external_interface.http_iter_content(data),
+        headers=remove_hop_by_hop_headers(data.headers),
         status=200,
         mimetype='application/json')
 
@@ -19,6 +19,7 @@ def data_exchange(
         external_interface: ExternalInterface = ExternalInterface()) -> Response:
     """
     提供者側コネクタメインにGETリクエストを送信し、取得した情報を返す
+    レスポンスのボディは読み込まずに返却するため、呼び出し元でExternalInterface.http_iter_contentにより読み込むこと
 
     Args:
         resource_url str : リソースURL
@@ -41,7 +42,8 @@ def data_exchange(
         'Authorization': authorization,
         'x-cadde-options': options}
 
-    response = external_interface.http_get(__ACCESS_POINT_URL, headers_dict)
+    response = external_interface.http_get(
+        __ACCESS_POINT_URL, headers_dict, stream=True)
     if (response.status_code < __HTTP_STATUS_CODE_SUCCESS_LOWER_LIMIT
             or __HTTP_STATUS_CODE_SUCCESS_UPPER_LIMIT < response.status_code):
         raise CaddeException(
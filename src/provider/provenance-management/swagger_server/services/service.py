@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import json
-import requests
 from swagger_server.utilities.cadde_exception import CaddeException
 from swagger_server.utilities.external_interface import ExternalInterface
 from swagger_server.utilities.internal_interface import InternalInterface
@@ -31,6 +30,8 @@ def sent_history_registration(
         external_interface: ExternalInterface) -> str:
     """
     来歴管理I/Fに送信履歴登録を依頼する
+    識別情報は利用者側の受信履歴のcdlpreviouseventsに使用されるため、アウトボックスは使用せず、
+    来歴管理I/Fが発行したcdleventidを返却する。
 
     Args:
         provider_id str: CADDEユーザID（提供者）
@@ -42,6 +43,7 @@ def sent_history_registration(
 
     Returns:
         str : 識別情報
+        str : 来歴管理I/FのURL
 
     Raises:
         Cadde_excption : コンフィグファイルからprovenance_management_api_urlを取得できない場合  エラーコード : 010301002E
@@ -79,10 +81,42 @@ def sent_history_registration(
     if authorization is not None:
         headers['Authorization'] = authorization[7:]  # noqa: E501
 
+    identification_information = __post_event_with_hash(
+        server_url + __URL_HISTORY_EVENT_WITH_HASH, headers, body_data, external_interface)
+
+    return identification_information, server_url
+
+
+def __post_event_with_hash(
+        access_url: str,
+        headers: dict,
+        body_data: bytes,
+        external_interface: ExternalInterface = ExternalInterface()) -> str:
+    """
+    来歴管理I/Fに送信履歴を登録し、識別情報を返す。
+    来歴管理I/F毎のkeep-alive接続を再利用する。
+
+    Args:
+        access_url str : 来歴管理I/Fの履歴登録URL
+        headers dict : 設定するヘッダ
+        body_data bytes : 登録するイベント
+        external_interface ExternalInterface : 外部にリクエストを行うインタフェース
+
+    Returns:
+        str : 識別情報
+
+    Raises:
+        Cadde_excption : 来歴管理に登録できなかった場合 エラーコード : 010301003E
+        Cadde_excption : 識別情報が発行されなかった場合 エラーコード : 010301004E
+        Cadde_excption : タイムアウトが発生した場合     エラーコード : 000002001E
+        Cadde_excption : 通信に失敗した場合             エラーコード : 000002002E
+
+    """
+
     upfile = {'request': ('', body_data, 'application/json')}
 
-    response = requests.post(
-        server_url + __URL_HISTORY_EVENT_WITH_HASH, headers=headers, files=upfile)
+    response = external_interface.http_post(
+        access_url, headers=dict(headers), files=upfile)
 
     if response.status_code < 200 or 300 <= response.status_code:
         raise CaddeException(
@@ -96,9 +130,7 @@ def sent_history_registration(
     if 'cdleventid' not in response_text_dict or not response_text_dict['cdleventid']:
         raise CaddeException(message_id='010301004E')
 
-    identification_information = response_text_dict['cdleventid']
-
-    return identification_information, server_url
+    return response_text_dict['cdleventid']
 
 
 def voucher_sent_call(